@@ -21,6 +21,9 @@ from apps.modules.models import ModuleProgress, ResourceProgress
 from apps.analytics.models import LearningSession
 from apps.quiz.models import QuizAttempt
 from apps.assignments.models import Assignment, Submission
+from .counters import pending_focus
+from .daily_stats import daily_stats_enabled, window_totals
+from .singleflight import coalesced
 
 User = get_user_model()
 
@@ -57,10 +60,15 @@ class LearnerIntelligenceEngine:
         
         # Fetch aggregated metrics
         last_session = LearningSession.objects.filter(user=user).order_by('-start_time').first()
-        total_focus = LearningSession.objects.filter(
-            user=user,
-            start_time__gte=last_7d
-        ).aggregate(Sum('focus_duration_seconds'))['focus_duration_seconds__sum'] or 0
+        week = window_totals([user.id], 7)[user.id] if daily_stats_enabled() else None
+        if week is not None:
+            total_focus = week['focus_seconds']
+        else:
+            total_focus = LearningSession.objects.filter(
+                user=user,
+                start_time__gte=last_7d
+            ).aggregate(Sum('focus_duration_seconds'))['focus_duration_seconds__sum'] or 0
+            total_focus += pending_focus([user.id], since=last_7d).get(user.id, 0)
         
         modules_completed = ModuleProgress.objects.filter(
             user=user,
@@ -72,21 +80,26 @@ class LearnerIntelligenceEngine:
             status='in_progress'
         ).count()
         
-        quiz_avg = QuizAttempt.objects.filter(
-            user=user,
-            timestamp__gte=last_7d
-        ).aggregate(Avg('score'))['score__avg'] or 0
-        
-        quiz_pass_rate = QuizAttempt.objects.filter(
-            user=user,
-            timestamp__gte=last_7d,
-            passed=True
-        ).count()
-        
-        total_quizzes = QuizAttempt.objects.filter(
-            user=user,
-            timestamp__gte=last_7d
-        ).count()
+        if week is not None:
+            total_quizzes = week['quiz_attempts']
+            quiz_pass_rate = week['quizzes_passed']
+            quiz_avg = week['quiz_score_sum'] / total_quizzes if total_quizzes else 0
+        else:
+            quiz_avg = QuizAttempt.objects.filter(
+                user=user,
+                timestamp__gte=last_7d
+            ).aggregate(Avg('score'))['score__avg'] or 0
+
+            quiz_pass_rate = QuizAttempt.objects.filter(
+                user=user,
+                timestamp__gte=last_7d,
+                passed=True
+            ).count()
+
+            total_quizzes = QuizAttempt.objects.filter(
+                user=user,
+                timestamp__gte=last_7d
+            ).count()
         
         # Velocity: completions per day in last 7 days
         recent_completions = ModuleProgress.objects.filter(
@@ -146,14 +159,22 @@ class LearnerIntelligenceEngine:
         }
 
     @staticmethod
-    def get_intelligence_overview():
-        """
-        Get intelligence overview for all learners.
-        Returns summary stats + individual learner nodes.
-        """
-        learners = User.objects.filter(is_staff=False, role='learner')
-        
-        nodes = []
+    def build_node(learner, intelligence, last_active):
+        """One learner entry of the overview."""
+        return {
+            "learner_id": learner.id,
+            "name": learner.username,
+            "email": learner.email,
+            "cognitive_state": intelligence['state'],
+            "velocity": intelligence['velocity'],
+            "risk_score": intelligence['risk_score'],
+            "risk_factors": intelligence['risk_factors'],
+            "last_active": last_active.isoformat() if last_active else None,
+            "metrics": intelligence['metrics']
+        }
+
+    @staticmethod
+    def summarize(nodes, computed_at):
         state_counts = {
             CognitiveState.CRITICAL: 0,
             CognitiveState.STRUGGLING: 0,
@@ -162,28 +183,9 @@ class LearnerIntelligenceEngine:
             CognitiveState.SKILL_READY: 0,
             CognitiveState.UNENGAGED: 0
         }
-        
-        for learner in learners:
-            intelligence = LearnerIntelligenceEngine.compute_cognitive_state(learner)
-            
-            # Get last activity
-            last_session = LearningSession.objects.filter(user=learner).order_by('-start_time').first()
-            
-            node = {
-                "learner_id": learner.id,
-                "name": learner.username,
-                "email": learner.email,
-                "cognitive_state": intelligence['state'],
-                "velocity": intelligence['velocity'],
-                "risk_score": intelligence['risk_score'],
-                "risk_factors": intelligence['risk_factors'],
-                "last_active": last_session.start_time.isoformat() if last_session else None,
-                "metrics": intelligence['metrics']
-            }
-            
-            nodes.append(node)
-            state_counts[intelligence['state']] += 1
-        
+        for node in nodes:
+            state_counts[node['cognitive_state']] += 1
+
         return {
             "summary": {
                 "critical": state_counts[CognitiveState.CRITICAL],
@@ -192,9 +194,41 @@ class LearnerIntelligenceEngine:
                 "high_velocity": state_counts[CognitiveState.HIGH_VELOCITY],
                 "skill_ready": state_counts[CognitiveState.SKILL_READY],
                 "unengaged": state_counts[CognitiveState.UNENGAGED],
-                "total_learners": learners.count(),
-                "last_updated": timezone.now().isoformat()
+                "total_learners": len(nodes),
+                "last_updated": computed_at.isoformat()
             },
             "nodes": nodes,
-            "computed_at": timezone.now().isoformat()
+            "computed_at": computed_at.isoformat()
         }
+
+    @staticmethod
+    @coalesced('intelligence-overview')
+    def get_intelligence_overview():
+        """
+        Get intelligence overview for all learners.
+        Returns summary stats + individual learner nodes.
+        With INTELLIGENCE_SNAPSHOTS enabled the stored snapshot is served instead
+        (see intelligence_snapshots.py).
+        """
+        from .intelligence_snapshots import snapshots_enabled, stored_overview
+        if snapshots_enabled():
+            return stored_overview()
+
+        from .cohort import cohort_states
+
+        cohort = User.objects.filter(is_staff=False, role='learner')
+        learners = list(cohort)
+        # The cohort goes into the SQL as a subquery, not an IN list of every id
+        scope = cohort.values('id')
+
+        # Whole cohort at once: grouped queries + vectorized rules (cohort.py)
+        states = cohort_states([l.id for l in learners], scope=scope)
+        last_active = dict(
+            LearningSession.objects.filter(user_id__in=scope)
+            .values('user_id').annotate(at=Max('start_time')).values_list('user_id', 'at')
+        )
+        nodes = [
+            LearnerIntelligenceEngine.build_node(learner, states[learner.id], last_active.get(learner.id))
+            for learner in learners
+        ]
+        return LearnerIntelligenceEngine.summarize(nodes, timezone.now())
@@ -0,0 +1,161 @@
+"""
+Vectorized Cohort States
+
+compute_cognitive_state for a whole cohort at once. Each learner metric is
+loaded for every learner with one grouped query into a NumPy vector aligned
+with the learner order; risk_score, velocity and state are then evaluated
+as boolean masks over those vectors in one pass, with the same thresholds
+and priority order as LearnerIntelligenceEngine.compute_cognitive_state.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.utils import timezone
+
+from apps.modules.models import ModuleProgress
+from apps.quiz.models import QuizAttempt
+
+from .cognitive_intelligence import CognitiveState
+from .counters import pending_focus
+from .daily_stats import daily_stats_enabled, window_totals
+from .models import LearningSession
+
+# (risk points, factor) in the order compute_cognitive_state reports them
+RISK_RULES = (
+    (40, "No activity >72h"),
+    (30, "Low engagement"),
+    (20, "Low quiz scores"),
+    (10, "No completions"),
+)
+
+
+def _vector(user_ids, values, default=0, dtype=np.float64):
+    return np.array([values.get(u, default) or default for u in user_ids], dtype=dtype)
+
+
+def load_metrics(user_ids, now, scope=None):
+    """
+    {metric: vector aligned with user_ids} from a fixed number of grouped queries.
+    scope, a queryset of the same users' ids, replaces the IN list of every id
+    in the SQL; results are aligned with user_ids either way.
+    """
+    scope = user_ids if scope is None else scope
+    last_72h = now - timedelta(hours=72)
+    last_7d = now - timedelta(days=7)
+
+    last_start = dict(
+        LearningSession.objects.filter(user_id__in=scope)
+        .values('user_id').annotate(at=Max('start_time')).values_list('user_id', 'at')
+    )
+    modules = {
+        row.pop('user_id'): row for row in ModuleProgress.objects.filter(user_id__in=scope).values('user_id').annotate(
+            completed=Count('id', filter=Q(status='completed')),
+            in_progress=Count('id', filter=Q(status='in_progress')),
+            recent=Count('id', filter=Q(completed_at__gte=last_7d)),
+        )
+    }
+
+    if daily_stats_enabled():
+        week = window_totals(user_ids, 7, scope=scope)
+        focus = {u: week[u]['focus_seconds'] for u in user_ids}
+        quizzes = {
+            u: {
+                "total": week[u]['quiz_attempts'],
+                "passed": week[u]['quizzes_passed'],
+                "avg": week[u]['quiz_score_sum'] / week[u]['quiz_attempts'] if week[u]['quiz_attempts'] else 0,
+            }
+            for u in user_ids
+        }
+    else:
+        focus = dict(
+            LearningSession.objects.filter(user_id__in=scope, start_time__gte=last_7d)
+            .values('user_id').annotate(n=Sum('focus_duration_seconds')).values_list('user_id', 'n')
+        )
+        for user_id, seconds in pending_focus(user_ids, since=last_7d).items():
+            focus[user_id] = (focus.get(user_id) or 0) + seconds
+        quizzes = {
+            row.pop('user_id'): row for row in QuizAttempt.objects.filter(user_id__in=scope, timestamp__gte=last_7d)
+            .values('user_id').annotate(avg=Avg('score'), passed=Count('id', filter=Q(passed=True)), total=Count('id'))
+        }
+
+    def column(rows, key):
+        return {u: row[key] for u, row in rows.items()}
+
+    return {
+        # No session at all counts as inactive, like a session older than 72h
+        "inactive": np.array([last_start.get(u) is None or last_start[u] < last_72h for u in user_ids], dtype=bool),
+        "total_focus": _vector(user_ids, focus),
+        "modules_completed": _vector(user_ids, column(modules, 'completed'), dtype=np.int64),
+        "modules_in_progress": _vector(user_ids, column(modules, 'in_progress'), dtype=np.int64),
+        "recent_completions": _vector(user_ids, column(modules, 'recent'), dtype=np.int64),
+        "quiz_avg": _vector(user_ids, column(quizzes, 'avg')),
+        "quiz_passed": _vector(user_ids, column(quizzes, 'passed'), dtype=np.int64),
+        "total_quizzes": _vector(user_ids, column(quizzes, 'total'), dtype=np.int64),
+    }
+
+
+def evaluate(m):
+    """Vectorized rules: (risk masks, risk_score, velocity, state) arrays."""
+    masks = np.stack([
+        m["inactive"],
+        (m["modules_in_progress"] > 0) & (m["total_focus"] < 600),
+        (m["total_quizzes"] > 0) & (m["quiz_avg"] < 50),
+        (m["modules_in_progress"] > 3) & (m["modules_completed"] == 0),
+    ])
+    points = np.array([p for p, _ in RISK_RULES])[:, None]
+    risk_score = (masks * points).sum(axis=0)
+    velocity = np.round(m["recent_completions"] / 7, 2)
+
+    # Priority order (most critical first), as in compute_cognitive_state
+    state = np.select(
+        [
+            risk_score >= 70,
+            (m["quiz_avg"] < 60) & (m["total_quizzes"] > 0),
+            (m["modules_completed"] >= 3) & (m["quiz_avg"] >= 80),
+            (velocity >= 1.0) & (m["total_focus"] > 1800),
+            m["total_focus"] > 600,
+        ],
+        [
+            CognitiveState.CRITICAL,
+            CognitiveState.STRUGGLING,
+            CognitiveState.SKILL_READY,
+            CognitiveState.HIGH_VELOCITY,
+            CognitiveState.STABLE,
+        ],
+        default=CognitiveState.UNENGAGED,
+    )
+    return masks, np.minimum(risk_score, 100), velocity, state
+
+
+def cohort_states(user_ids, now=None, scope=None):
+    """{user_id: compute_cognitive_state(user)} for every learner in user_ids (see load_metrics for scope)."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    m = load_metrics(user_ids, now or timezone.now(), scope)
+    masks, risk_score, velocity, state = evaluate(m)
+
+    factors = [[f for (_, f), hit in zip(RISK_RULES, column) if hit] for column in masks.T.tolist()]
+    total_focus = m["total_focus"].tolist()
+    quiz_avg = m["quiz_avg"].tolist()
+    passed, total = m["quiz_passed"].tolist(), m["total_quizzes"].tolist()
+    completed, in_progress = m["modules_completed"].tolist(), m["modules_in_progress"].tolist()
+
+    return {
+        user_id: {
+            "state": str(state[i]),
+            "risk_score": int(risk_score[i]),
+            "velocity": float(velocity[i]),
+            "risk_factors": factors[i],
+            "metrics": {
+                "total_focus_mins": round(total_focus[i] / 60, 1),
+                "modules_completed": completed[i],
+                "modules_in_progress": in_progress[i],
+                "quiz_avg": round(quiz_avg[i], 1),
+                "quiz_pass_rate": round((passed[i] / total[i] * 100) if total[i] > 0 else 0, 1),
+            },
+        }
+        for i, user_id in enumerate(user_ids)
+    }
@@ -0,0 +1,150 @@
+"""
+Sharded Counters
+
+Every open tab of a learner credits focus to the same LearningSession row,
+so concurrent heartbeats queue on that row's lock. With
+TELEMETRY_SHARDED_COUNTERS enabled, focus (and delta-only watch time) is
+added to one of N CounterShard rows picked at random per write instead:
+
+    INSERT ... ON CONFLICT (kind, user_id, object_id, shard) DO UPDATE value = value + n
+
+Readers add the uncompacted shards to the row values, and
+`manage.py compact_counters` periodically folds shards back into
+LearningSession.focus_duration_seconds / end_time and
+ResourceProgress.watch_time_seconds. Run a final compaction before turning
+the setting off; readers ignore shards while it is disabled.
+"""
+
+import random
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+
+from .models import CounterShard, LearningSession
+
+FOCUS = 'focus'
+WATCH = 'watch'
+
+
+def sharded_counters_enabled():
+    from apps.modules.upsert import supports_upsert
+    return getattr(settings, 'TELEMETRY_SHARDED_COUNTERS', False) and supports_upsert()
+
+
+def increment(kind, amounts, now):
+    """Add {(user_id, object_id): n} to a random shard of each counter in one statement."""
+    amounts = {key: n for key, n in amounts.items() if n}
+    if not amounts:
+        return
+    table = connection.ops.quote_name(CounterShard._meta.db_table)
+    col = {f: connection.ops.quote_name(CounterShard._meta.get_field(f).column)
+           for f in ('kind', 'user_id', 'object_id', 'shard', 'value', 'touched_at')}
+    stamp = connection.ops.adapt_datetimefield_value(now)
+
+    rows, params = [], []
+    for (user_id, object_id), n in amounts.items():
+        rows.append('(%s, %s, %s, %s, %s, %s)')
+        params += [kind, user_id, object_id, random.randrange(settings.TELEMETRY_COUNTER_SHARDS), n, stamp]
+    sql = f"""
+        INSERT INTO {table} ({col['kind']}, {col['user_id']}, {col['object_id']}, {col['shard']},
+                             {col['value']}, {col['touched_at']})
+        VALUES {', '.join(rows)}
+        ON CONFLICT ({col['kind']}, {col['user_id']}, {col['object_id']}, {col['shard']}) DO UPDATE SET
+            {col['value']} = {table}.{col['value']} + EXCLUDED.{col['value']},
+            {col['touched_at']} = EXCLUDED.{col['touched_at']}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def discard(kind, keys):
+    """Drop uncompacted shards for {(user_id, object_id)}, e.g. when watch time is overwritten."""
+    if not keys:
+        return
+    match = Q()
+    for user_id, object_id in keys:
+        match |= Q(user_id=user_id, object_id=object_id)
+    CounterShard.objects.filter(match, kind=kind).delete()
+
+
+def totals(kind, user_ids, object_ids=None):
+    """Uncompacted {(user_id, object_id): n}."""
+    shards = CounterShard.objects.filter(kind=kind, user_id__in=user_ids)
+    if object_ids is not None:
+        shards = shards.filter(object_id__in=object_ids)
+    return {
+        (u, o): n for u, o, n in
+        shards.values('user_id', 'object_id').annotate(n=Sum('value')).values_list('user_id', 'object_id', 'n')
+    }
+
+
+def pending_focus(user_ids=None, since=None):
+    """
+    Focus seconds per user not yet in LearningSession.focus_duration_seconds:
+    the write-behind buffer plus uncompacted shards of sessions started since `since`.
+    """
+    from apps.modules.buffer import unflushed_focus
+
+    pending = unflushed_focus(user_ids)
+    if not sharded_counters_enabled():
+        return pending
+    shards = CounterShard.objects.filter(kind=FOCUS)
+    if user_ids is not None:
+        shards = shards.filter(user_id__in=user_ids)
+    if since is not None:
+        shards = shards.filter(object_id__in=LearningSession.objects.filter(start_time__gte=since).values('id'))
+    for user_id, n in shards.values('user_id').annotate(n=Sum('value')).values_list('user_id', 'n'):
+        pending[user_id] = pending.get(user_id, 0) + n
+    return pending
+
+
+def compact(batch_size=1000):
+    """Fold up to `batch_size` shard rows into their owning rows. Returns rows folded."""
+    from apps.modules.models import ResourceProgress
+
+    with transaction.atomic():
+        shards = list(CounterShard.objects.select_for_update().order_by('pk')[:batch_size])
+        if not shards:
+            return 0
+
+        sums = {}
+        for shard in shards:
+            key = (shard.kind, shard.user_id, shard.object_id)
+            value, touched = sums.get(key, (0, shard.touched_at))
+            sums[key] = (value + shard.value, max(touched, shard.touched_at))
+
+        # 1. Focus -> LearningSession (orphans of deleted sessions are dropped)
+        focus = {o: s for (kind, _, o), s in sums.items() if kind == FOCUS}
+        sessions = [
+            LearningSession(
+                pk=pk,
+                focus_duration_seconds=F('focus_duration_seconds') + focus[pk][0],
+                end_time=Case(When(end_time__gte=focus[pk][1], then=F('end_time')), default=Value(focus[pk][1])),
+            )
+            for pk in LearningSession.objects.filter(pk__in=focus).values_list('pk', flat=True)
+        ]
+        LearningSession.objects.bulk_update(sessions, ['focus_duration_seconds', 'end_time'])
+
+        # 2. Watch time -> ResourceProgress
+        watch = {(u, o): s for (kind, u, o), s in sums.items() if kind == WATCH}
+        if watch:
+            rows = ResourceProgress.objects.filter(
+                user_id__in={u for u, _ in watch}, resource_id__in={o for _, o in watch},
+            ).values_list('pk', 'user_id', 'resource_id')
+            ResourceProgress.objects.bulk_update([
+                ResourceProgress(pk=pk, watch_time_seconds=F('watch_time_seconds') + watch[(u, r)][0])
+                for pk, u, r in rows if (u, r) in watch
+            ], ['watch_time_seconds'])
+
+        CounterShard.objects.filter(pk__in=[s.pk for s in shards]).delete()
+    return len(shards)
+
+
+def compact_all(batch_size=1000):
+    total = 0
+    while True:
+        folded = compact(batch_size)
+        total += folded
+        if folded < batch_size:
+            return total
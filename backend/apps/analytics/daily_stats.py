@@ -0,0 +1,210 @@
+"""
+Learner Daily Stats
+
+LearnerDailyStats keeps one row per learner per day: focus and sessions
+(by session start), resources completed, quiz attempts / passes / score sum
+and sum of squares, notes touched and submissions.
+
+`manage.py rollup_daily_stats` recomputes closed days (up to yesterday) from
+the raw tables with one grouped query per table and advances a
+TelemetryCursor holding the last closed day. Each run also recomputes the
+previous `lookback_days`, so late writes (replayed backlogs, sessions running
+past midnight) are picked up.
+
+With LEARNER_DAILY_STATS enabled, and once the rollup has run, the engines
+read day windows through window_totals: closed days from the rollup, days after the cursor (normally
+just today) from the raw tables, plus focus still in the write-behind buffer
+or counter shards. Windows are whole days: "7 days" is today and the six
+days before it.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LearnerDailyStats, LearningSession, TelemetryCursor
+
+logger = logging.getLogger(__name__)
+
+DAILY_STATS_CURSOR = 'daily-stats'
+CHUNK_DAYS = 31
+
+FIELDS = (
+    'focus_seconds', 'sessions', 'resources_completed', 'quiz_attempts', 'quizzes_passed',
+    'quiz_score_sum', 'quiz_score_sq_sum', 'notes_touched', 'submissions',
+)
+
+
+def daily_stats_enabled():
+    """
+    True when LEARNER_DAILY_STATS is on and the rollup has run at least once.
+    Until then every window would come from the raw tables (all-time ones
+    from the earliest activity on), so the engines keep their own queries.
+    """
+    if not getattr(settings, 'LEARNER_DAILY_STATS', False):
+        return False
+    if closed_day() is None:
+        logger.warning("[Analytics] LEARNER_DAILY_STATS is on but rollup_daily_stats has not run; using raw queries")
+        return False
+    return True
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _sources(first_day, last_day, user_ids):
+    """(queryset, timestamp field, user field, {stat: aggregate}) per raw table."""
+    from apps.assignments.models import Submission
+    from apps.modules.models import ResourceProgress
+    from apps.notes.models import Note
+    from apps.quiz.models import QuizAttempt
+
+    def scoped(queryset, stamp, user):
+        queryset = queryset.filter(**{f'{stamp}__gte': _day_start(first_day), f'{stamp}__lt': _day_start(last_day + timedelta(days=1))})
+        if user_ids is not None:
+            queryset = queryset.filter(**{f'{user}__in': user_ids})
+        return queryset
+
+    return [
+        (scoped(LearningSession.objects.all(), 'start_time', 'user_id'), 'start_time', 'user_id',
+         {'focus_seconds': Sum('focus_duration_seconds'), 'sessions': Count('id')}),
+        (scoped(ResourceProgress.objects.filter(completed=True), 'completed_at', 'user_id'), 'completed_at', 'user_id',
+         {'resources_completed': Count('id')}),
+        (scoped(QuizAttempt.objects.all(), 'timestamp', 'user_id'), 'timestamp', 'user_id',
+         {'quiz_attempts': Count('id'), 'quizzes_passed': Count('id', filter=Q(passed=True)),
+          'quiz_score_sum': Sum('score'), 'quiz_score_sq_sum': Sum(F('score') * F('score'))}),
+        (scoped(Note.objects.all(), 'updated_at', 'user_id'), 'updated_at', 'user_id',
+         {'notes_touched': Count('id')}),
+        (scoped(Submission.objects.all(), 'submitted_at', 'assignment__user_id'), 'submitted_at', 'assignment__user_id',
+         {'submissions': Count('id')}),
+    ]
+
+
+def raw_daily(first_day, last_day, user_ids=None):
+    """{(user_id, day): {field: value}} computed from the raw tables, one grouped query per table."""
+    rows = {}
+    for queryset, stamp, user, aggregates in _sources(first_day, last_day, user_ids):
+        grouped = queryset.annotate(stats_day=TruncDate(stamp)).values(user, 'stats_day').annotate(**aggregates)
+        for row in grouped:
+            stats = rows.setdefault((row[user], row['stats_day']), dict.fromkeys(FIELDS, 0))
+            for field in aggregates:
+                stats[field] = row[field] or 0
+    return rows
+
+
+def rollup_days(first_day, last_day):
+    """Recompute LearnerDailyStats for first_day..last_day. Returns rows written."""
+    written = 0
+    while first_day <= last_day:
+        chunk_end = min(last_day, first_day + timedelta(days=CHUNK_DAYS - 1))
+        rows = raw_daily(first_day, chunk_end)
+        with transaction.atomic():
+            LearnerDailyStats.objects.filter(day__gte=first_day, day__lte=chunk_end).delete()
+            LearnerDailyStats.objects.bulk_create(
+                [LearnerDailyStats(user_id=u, day=d, **stats) for (u, d), stats in rows.items()],
+                batch_size=1000,
+            )
+        written += len(rows)
+        first_day = chunk_end + timedelta(days=1)
+    return written
+
+
+def closed_day():
+    """Last day fully rolled up, or None before the first run."""
+    position = TelemetryCursor.objects.filter(name=DAILY_STATS_CURSOR).values_list('position', flat=True).first()
+    return date.fromordinal(position) if position else None
+
+
+def earliest_activity_day():
+    from apps.assignments.models import Submission
+    from apps.modules.models import ResourceProgress
+    from apps.notes.models import Note
+    from apps.quiz.models import QuizAttempt
+
+    stamps = [
+        LearningSession.objects.aggregate(at=Min('start_time'))['at'],
+        ResourceProgress.objects.aggregate(at=Min('completed_at'))['at'],
+        QuizAttempt.objects.aggregate(at=Min('timestamp'))['at'],
+        Note.objects.aggregate(at=Min('updated_at'))['at'],
+        Submission.objects.aggregate(at=Min('submitted_at'))['at'],
+    ]
+    stamps = [s for s in stamps if s is not None]
+    return timezone.localdate(min(stamps)) if stamps else None
+
+
+def refresh_daily_stats(lookback_days=2, backfill=False):
+    """
+    Roll up every day after the cursor (minus lookback) through yesterday.
+    backfill=True recomputes from the earliest activity. Returns rows written.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    last_closed = None if backfill else closed_day()
+    if last_closed is None:
+        first_day = earliest_activity_day()
+        if first_day is None or first_day > yesterday:
+            first_day = yesterday
+    else:
+        first_day = last_closed - timedelta(days=lookback_days - 1)
+
+    written = rollup_days(first_day, yesterday) if first_day <= yesterday else 0
+    TelemetryCursor.objects.update_or_create(name=DAILY_STATS_CURSOR, defaults={'position': yesterday.toordinal()})
+    return written
+
+
+def window_totals(user_ids=None, days=None, scope=None):
+    """
+    {user_id: {field: total}} over the last `days` days including today
+    (all history when days is None), for the given users or everyone.
+    scope, a queryset of the same users' ids, is used in the SQL instead of user_ids.
+    """
+    from .counters import pending_focus
+
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days - 1) if days else None
+    last_closed = closed_day()
+    where = user_ids if scope is None else scope
+
+    totals = {}
+    if user_ids is not None:
+        totals = {u: dict.fromkeys(FIELDS, 0) for u in user_ids}
+
+    # 1. Closed days from the rollup
+    if last_closed is not None:
+        rolled = LearnerDailyStats.objects.filter(day__lte=last_closed)
+        if first_day is not None:
+            rolled = rolled.filter(day__gte=first_day)
+        if where is not None:
+            rolled = rolled.filter(user_id__in=where)
+        for row in rolled.values('user_id').annotate(**{f: Sum(f) for f in FIELDS}):
+            stats = totals.setdefault(row.pop('user_id'), dict.fromkeys(FIELDS, 0))
+            for field, value in row.items():
+                stats[field] += value or 0
+
+    if last_closed is None and first_day is None:
+        logger.warning("[Analytics] window_totals without a rollup scans all raw history; run rollup_daily_stats")
+
+    # 2. Days after the cursor (usually only today) from the raw tables
+    live_from = last_closed + timedelta(days=1) if last_closed is not None else (first_day or earliest_activity_day())
+    if first_day is not None and live_from is not None:
+        live_from = max(live_from, first_day)
+    if live_from is not None and live_from <= today:
+        for (user_id, _), row in raw_daily(live_from, today, where).items():
+            stats = totals.setdefault(user_id, dict.fromkeys(FIELDS, 0))
+            for field, value in row.items():
+                stats[field] += value
+
+    # 3. Focus not yet folded into session rows
+    since = _day_start(first_day) if first_day else None
+    for user_id, seconds in pending_focus(user_ids, since).items():
+        totals.setdefault(user_id, dict.fromkeys(FIELDS, 0))['focus_seconds'] += seconds
+    return totals
+
+
+def window_sum(totals, field):
+    return sum(stats[field] for stats in totals.values())
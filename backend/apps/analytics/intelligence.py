@@ -1,12 +1,67 @@
 import math
-from django.db.models import Count, Avg, Max, Sum, F, StdDev
+from django.db.models import Count, Avg, Max, Sum, F, StdDev, Case, Exists, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
 from apps.modules.models import ModuleProgress, ResourceProgress
 from apps.quiz.models import QuizAttempt
 from apps.assignments.models import Submission, Assignment
 from apps.notes.models import Note
+from .counters import pending_focus
+from .daily_stats import daily_stats_enabled, window_sum, window_totals
 from .models import LearningSession, ManagerAction
+from .singleflight import coalesced
+
+def _grouped(queryset, key, **aggregates):
+    """{key value: {aggregate: value}} from one GROUP BY query."""
+    rows = queryset.values(key).annotate(**aggregates)
+    return {row.pop(key): row for row in rows}
+
+
+def last_activity_subquery():
+    """When the learner's latest session (by end_time, as get_risk_assessment orders it) ended."""
+    return Subquery(
+        LearningSession.objects.filter(user=OuterRef('pk')).order_by('-end_time')
+        .annotate(at=Coalesce('end_time', 'start_time')).values('at')[:1]
+    )
+
+
+def count_high_risk(learners, now):
+    """
+    Learners with at least two get_risk_assessment triggers, counted in one
+    query: each trigger is a 0/1 expression per learner, summed and filtered in SQL.
+    """
+    # days_idle > 3 on whole days means the last activity is at least 4 days old
+    idle = Case(
+        When(Q(last_activity__isnull=True) | Q(last_activity__lte=now - timedelta(days=4)), then=1), default=0,
+    )
+    fails = Coalesce(Subquery(
+        QuizAttempt.objects.filter(user=OuterRef('pk'), passed=False).values('user')
+        .annotate(n=Count('id')).values('n')
+    ), 0)
+    overdue = Exists(Assignment.objects.filter(user=OuterRef('pk'), status='overdue'))
+    return learners.alias(last_activity=last_activity_subquery(), fails=fails, overdue=overdue).annotate(
+        triggers=idle
+        + Case(When(Q(fails__gte=2), then=1), default=0)
+        + Case(When(Q(overdue=True), then=1), default=0),
+    ).aggregate(
+        high=Count('pk', filter=Q(triggers__gte=2)),
+    )['high']
+
+
+def velocity_label(this_week, last_week):
+    if this_week > last_week * 1.2: return "Improving"
+    if this_week < last_week * 0.8: return "Declining"
+    return "Stable"
+
+
+def weekly_actions(stats):
+    return stats['resources_completed'] + stats['quiz_attempts'] * 2
+
+
+def risk_level(trigger_count):
+    return "High" if trigger_count >= 2 else "Medium" if trigger_count == 1 else "Low"
+
 
 class IntelligenceEngine:
     """
@@ -19,9 +74,15 @@ class IntelligenceEngine:
         Engagement Score = (focus_time + sessions + notes) / assigned_days
         Factual measure of effort.
         """
-        sessions = LearningSession.objects.filter(user=user)
-        total_focus_mins = (sessions.aggregate(Sum('focus_duration_seconds'))['focus_duration_seconds__sum'] or 0) / 60
-        session_count = sessions.count()
+        if daily_stats_enabled():
+            totals = window_totals([user.id])[user.id]
+            total_focus_mins = totals['focus_seconds'] / 60
+            session_count = totals['sessions']
+        else:
+            sessions = LearningSession.objects.filter(user=user)
+            total_focus_seconds = sessions.aggregate(Sum('focus_duration_seconds'))['focus_duration_seconds__sum'] or 0
+            total_focus_mins = (total_focus_seconds + pending_focus([user.id]).get(user.id, 0)) / 60
+            session_count = sessions.count()
         # Proxy for notes: aggregate count from a hypothetical 'Note' model or similar
         # For now, we'll use a count of module interactions as a proxy if Note model isn't explored yet
         notes_count = Note.objects.filter(user=user).count()
@@ -37,6 +98,11 @@ class IntelligenceEngine:
         Velocity = Actions this week vs Actions last week.
         Returns: 'Improving', 'Stable', 'Declining'
         """
+        if daily_stats_enabled():
+            this_week = window_totals([user.id], 7)[user.id]
+            fortnight = window_totals([user.id], 14)[user.id]
+            return velocity_label(weekly_actions(this_week), weekly_actions(fortnight) - weekly_actions(this_week))
+
         now = timezone.now()
         this_week_start = now - timedelta(days=7)
         last_week_start = now - timedelta(days=14)
@@ -46,12 +112,7 @@ class IntelligenceEngine:
             quizzes = QuizAttempt.objects.filter(user=user, timestamp__range=(start, end)).count()
             return resources + (quizzes * 2)
 
-        this_week = get_actions(this_week_start, now)
-        last_week = get_actions(last_week_start, this_week_start)
-
-        if this_week > last_week * 1.2: return "Improving"
-        if this_week < last_week * 0.8: return "Declining"
-        return "Stable"
+        return velocity_label(get_actions(this_week_start, now), get_actions(last_week_start, this_week_start))
 
     @staticmethod
     def calculate_knowledge_stability(user):
@@ -59,12 +120,20 @@ class IntelligenceEngine:
         Stability = std deviation of quiz scores (lower is more stable).
         Inverse mapped to 0-100 for UI.
         """
-        scores = list(QuizAttempt.objects.filter(user=user).values_list('score', flat=True))
-        if len(scores) < 2:
-            return 100 # Default to stable for new users
-        
-        mean = sum(scores) / len(scores)
-        variance = sum((s - mean) ** 2 for s in scores) / len(scores)
+        if daily_stats_enabled():
+            totals = window_totals([user.id])[user.id]
+            count = totals['quiz_attempts']
+            if count < 2:
+                return 100
+            mean = totals['quiz_score_sum'] / count
+            variance = max(0.0, totals['quiz_score_sq_sum'] / count - mean ** 2)
+        else:
+            scores = list(QuizAttempt.objects.filter(user=user).values_list('score', flat=True))
+            if len(scores) < 2:
+                return 100 # Default to stable for new users
+
+            mean = sum(scores) / len(scores)
+            variance = sum((s - mean) ** 2 for s in scores) / len(scores)
         std_dev = math.sqrt(variance)
         
         # 0 std dev = 100 stability, 50+ std dev = 0 stability
@@ -72,6 +141,7 @@ class IntelligenceEngine:
         return round(stability, 1)
 
     @staticmethod
+    @coalesced('team-snapshot')
     def get_team_snapshot():
         """
         Snapshot 1: Team-wide metrics for Top Bar.
@@ -84,21 +154,29 @@ class IntelligenceEngine:
         active_24h = LearningSession.objects.filter(start_time__gte=last_24h).values('user').distinct().count()
         inactive_72h = ModuleProgress.objects.filter(last_accessed__lt=last_72h).count()
         
-        avg_focus = (LearningSession.objects.filter(start_time__gte=last_7d).aggregate(Avg('focus_duration_seconds'))['focus_duration_seconds__avg'] or 0) / 60
-        avg_accuracy = QuizAttempt.objects.filter(timestamp__gte=last_7d).aggregate(Avg('score'))['score__avg'] or 0
+        if daily_stats_enabled():
+            week = window_totals(days=7)
+            attempts = window_sum(week, 'quiz_attempts')
+            avg_focus = window_sum(week, 'focus_seconds') / (window_sum(week, 'sessions') or 1) / 60
+            avg_accuracy = window_sum(week, 'quiz_score_sum') / attempts if attempts else 0
+        else:
+            recent_focus = LearningSession.objects.filter(start_time__gte=last_7d).aggregate(
+                total=Sum('focus_duration_seconds'), sessions=Count('id')
+            )
+            # Write-behind and sharded focus not yet folded into the session rows
+            uncommitted_focus = sum(pending_focus(since=last_7d).values())
+            avg_focus = ((recent_focus['total'] or 0) + uncommitted_focus) / (recent_focus['sessions'] or 1) / 60
+            avg_accuracy = QuizAttempt.objects.filter(timestamp__gte=last_7d).aggregate(Avg('score'))['score__avg'] or 0
         
         total_assignments = Assignment.objects.all().count()
         completed_assignments = Submission.objects.filter(status='graded').count()
         assignment_rate = (completed_assignments / total_assignments * 100) if total_assignments > 0 else 0
         
-        # Risk count
+        # Risk count: every learner's triggers evaluated in SQL
         from django.contrib.auth import get_user_model
         User = get_user_model()
         learners = User.objects.filter(is_staff=False, role='learner')
-        risk_count = 0
-        for l in learners:
-            if IntelligenceEngine.get_risk_assessment(l)['level'] == "High":
-                risk_count += 1
+        risk_count = count_high_risk(learners, now)
 
         return {
             "active_24h": active_24h,
@@ -201,7 +279,7 @@ class IntelligenceEngine:
         if overdue > 0:
             triggers.append({"code": "OVERDUE", "msg": f"{overdue} Overdue Assignments", "detected": timezone.now()})
 
-        level = "High" if len(triggers) >= 2 else "Medium" if len(triggers) == 1 else "Low"
+        level = risk_level(len(triggers))
         return {
             "level": level,
             "triggers": triggers
@@ -214,14 +292,22 @@ class IntelligenceEngine:
         """
         last_progress = ModuleProgress.objects.filter(user=user).order_by('-last_accessed').first()
         risk = IntelligenceEngine.get_risk_assessment(user)
-        
+        if daily_stats_enabled():
+            focus_7d = window_totals([user.id], 7)[user.id]['focus_seconds']
+        else:
+            last_7d = timezone.now() - timedelta(days=7)
+            focus_7d = (
+                (LearningSession.objects.filter(user=user, start_time__gte=last_7d).aggregate(Sum('focus_duration_seconds'))['focus_duration_seconds__sum'] or 0)
+                + pending_focus([user.id], since=last_7d).get(user.id, 0)
+            )
+
         return {
             "id": user.id,
             "name": user.username,
             "last_active": last_progress.last_accessed if last_progress else None,
             "current_module": last_progress.module.title if last_progress else "None",
             "status": "Stuck" if risk['level'] == "High" else "Idle" if risk['level'] == "Medium" else "Active",
-            "focus_time_7d": (LearningSession.objects.filter(user=user, start_time__gte=timezone.now()-timedelta(days=7)).aggregate(Sum('focus_duration_seconds'))['focus_duration_seconds__sum'] or 0) / 60,
+            "focus_time_7d": focus_7d / 60,
             "quiz_avg": QuizAttempt.objects.filter(user=user).aggregate(Avg('score'))['score__avg'] or 0,
             "quiz_attempts": QuizAttempt.objects.filter(user=user).count(),
             "assignment_pct": (Submission.objects.filter(assignment__user=user, status='graded').count() / (Assignment.objects.filter(user=user).count() or 1)) * 100,
@@ -229,3 +315,107 @@ class IntelligenceEngine:
             "risk_level": risk['level'],
             "action_needed": "Yes" if risk['level'] == "High" else "No"
         }
+
+    @staticmethod
+    def get_learner_snapshots(learners):
+        """
+        get_learner_snapshot for many learners at once: a fixed number of
+        grouped queries joined in memory, independent of the learner count.
+        """
+        now = timezone.now()
+        last_7d = now - timedelta(days=7)
+        last_14d = now - timedelta(days=14)
+
+        users = list(learners.annotate(
+            last_activity=last_activity_subquery(),
+            last_progress_id=Subquery(
+                ModuleProgress.objects.filter(user=OuterRef('pk')).order_by('-last_accessed').values('pk')[:1]
+            ),
+        ))
+        user_ids = [u.id for u in users]
+
+        # 1. Current module (latest accessed progress row)
+        last_progress = {
+            mp.pk: mp for mp in ModuleProgress.objects.filter(
+                pk__in=[u.last_progress_id for u in users if u.last_progress_id],
+            ).select_related('module')
+        }
+
+        # 2. Risk triggers
+        fails = _grouped(QuizAttempt.objects.filter(user_id__in=user_ids, passed=False), 'user_id', n=Count('id'))
+        overdue = _grouped(Assignment.objects.filter(user_id__in=user_ids, status='overdue'), 'user_id', n=Count('id'))
+
+        # 3. Quizzes (all time)
+        quizzes = _grouped(QuizAttempt.objects.filter(user_id__in=user_ids), 'user_id', avg=Avg('score'), attempts=Count('id'))
+
+        # 4. Focus (committed sessions plus write-behind / shards) and weekly actions for velocity
+        if daily_stats_enabled():
+            week, fortnight = window_totals(user_ids, 7), window_totals(user_ids, 14)
+            focus = {uid: week[uid]['focus_seconds'] for uid in user_ids}
+            actions = {
+                uid: (weekly_actions(week[uid]), weekly_actions(fortnight[uid]) - weekly_actions(week[uid]))
+                for uid in user_ids
+            }
+        else:
+            focus = _grouped(
+                LearningSession.objects.filter(user_id__in=user_ids, start_time__gte=last_7d),
+                'user_id', n=Sum('focus_duration_seconds'),
+            )
+            uncommitted = pending_focus(user_ids, since=last_7d)
+            focus = {uid: (focus.get(uid, {}).get('n') or 0) + uncommitted.get(uid, 0) for uid in user_ids}
+            weekly_quizzes = _grouped(
+                QuizAttempt.objects.filter(user_id__in=user_ids, timestamp__range=(last_14d, now)), 'user_id',
+                this_week=Count('id', filter=Q(timestamp__range=(last_7d, now))),
+                last_week=Count('id', filter=Q(timestamp__range=(last_14d, last_7d))),
+            )
+            resources = _grouped(
+                ResourceProgress.objects.filter(user_id__in=user_ids, completed=True, updated_at__range=(last_14d, now)),
+                'user_id',
+                this_week=Count('id', filter=Q(updated_at__range=(last_7d, now))),
+                last_week=Count('id', filter=Q(updated_at__range=(last_14d, last_7d))),
+            )
+            actions = {}
+            for uid in user_ids:
+                done, quiz = resources.get(uid, {}), weekly_quizzes.get(uid, {})
+                actions[uid] = (
+                    done.get('this_week', 0) + quiz.get('this_week', 0) * 2,
+                    done.get('last_week', 0) + quiz.get('last_week', 0) * 2,
+                )
+
+        # 5. Assignments
+        graded = _grouped(
+            Submission.objects.filter(assignment__user_id__in=user_ids, status='graded'),
+            'assignment__user_id', n=Count('id'),
+        )
+        assigned = _grouped(Assignment.objects.filter(user_id__in=user_ids), 'user_id', n=Count('id'))
+
+        snapshots = []
+        for user in users:
+            uid = user.id
+            triggers = 0
+            if user.last_activity is None or (now - user.last_activity).days > 3:
+                triggers += 1
+            if fails.get(uid, {}).get('n', 0) >= 2:
+                triggers += 1
+            if overdue.get(uid, {}).get('n', 0) > 0:
+                triggers += 1
+            level = risk_level(triggers)
+
+            quiz = quizzes.get(uid, {})
+            progress = last_progress.get(user.last_progress_id)
+
+            snapshots.append({
+                "id": uid,
+                "name": user.username,
+                "last_active": progress.last_accessed if progress else None,
+                "current_module": progress.module.title if progress else "None",
+                "status": "Stuck" if level == "High" else "Idle" if level == "Medium" else "Active",
+                "focus_time_7d": focus[uid] / 60,
+                "quiz_avg": quiz.get('avg') or 0,
+                "quiz_attempts": quiz.get('attempts', 0),
+                "assignment_pct": (graded.get(uid, {}).get('n', 0) / (assigned.get(uid, {}).get('n', 0) or 1)) * 100,
+                "velocity": velocity_label(*actions[uid]),
+                "risk_level": level,
+                "action_needed": "Yes" if level == "High" else "No"
+            })
+        return snapshots
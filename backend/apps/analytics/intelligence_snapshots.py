@@ -0,0 +1,109 @@
+"""
+Precomputed Intelligence Snapshots
+
+Even computed cohort-wide (cohort.py), the intelligence overview scans the
+raw activity tables, and the manager dashboard polls it every minute. With INTELLIGENCE_SNAPSHOTS enabled,
+`manage.py recompute_intelligence --loop` (or any scheduler running it
+periodically) recomputes every learner's cognitive state in the background
+and stores it in LearnerIntelligenceSnapshot; the endpoint then serves the
+stored rows in a fixed number of queries, with the real `computed_at` and
+`data_age_seconds`.
+
+Learners without a snapshot yet (just registered) are computed on request,
+so the overview is always complete.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cognitive_intelligence import LearnerIntelligenceEngine
+from .cohort import cohort_states
+from .models import LearnerIntelligenceSnapshot, LearningSession
+
+User = get_user_model()
+
+SNAPSHOT_FIELDS = ['state', 'risk_score', 'velocity', 'risk_factors', 'metrics', 'last_active', 'computed_at']
+
+
+def snapshots_enabled():
+    return getattr(settings, 'INTELLIGENCE_SNAPSHOTS', False)
+
+
+def learners():
+    return User.objects.filter(is_staff=False, role='learner')
+
+
+def compute_snapshots(users, now=None):
+    """Unsaved LearnerIntelligenceSnapshot rows for the given learners."""
+    now = now or timezone.now()
+    users = list(users)
+    last_active = dict(
+        LearningSession.objects.filter(user_id__in=[u.id for u in users])
+        .values('user_id').annotate(at=Max('start_time')).values_list('user_id', 'at')
+    )
+    states = cohort_states([u.id for u in users], now)
+    snapshots = []
+    for user in users:
+        intelligence = states[user.id]
+        snapshots.append(LearnerIntelligenceSnapshot(
+            user=user,
+            state=intelligence['state'],
+            risk_score=intelligence['risk_score'],
+            velocity=intelligence['velocity'],
+            risk_factors=intelligence['risk_factors'],
+            metrics=intelligence['metrics'],
+            last_active=last_active.get(user.id),
+            computed_at=now,
+        ))
+    return snapshots
+
+
+def recompute_snapshots(batch_size=500):
+    """Recompute and store every learner's snapshot in batches. Returns learners processed."""
+    processed, last_id = 0, 0
+    while True:
+        batch = list(learners().filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            break
+        snapshots = compute_snapshots(batch)
+        with transaction.atomic():
+            LearnerIntelligenceSnapshot.objects.bulk_create(
+                snapshots, update_conflicts=True, unique_fields=['user'], update_fields=SNAPSHOT_FIELDS,
+            )
+        processed += len(batch)
+        last_id = batch[-1].id
+
+    # Former learners (role changed, promoted to staff)
+    LearnerIntelligenceSnapshot.objects.exclude(user__in=learners()).delete()
+    return processed
+
+
+def stored_overview():
+    """The intelligence overview served from stored snapshots."""
+    now = timezone.now()
+    stored = {
+        s.user_id: s for s in LearnerIntelligenceSnapshot.objects.filter(user__in=learners())
+    }
+    users = list(learners())
+    fresh = {s.user_id: s for s in compute_snapshots([u for u in users if u.id not in stored], now)}
+
+    nodes = []
+    for user in users:
+        snapshot = stored.get(user.id) or fresh[user.id]
+        nodes.append(LearnerIntelligenceEngine.build_node(user, {
+            "state": snapshot.state,
+            "velocity": snapshot.velocity,
+            "risk_score": snapshot.risk_score,
+            "risk_factors": snapshot.risk_factors,
+            "metrics": snapshot.metrics,
+        }, snapshot.last_active))
+
+    # The overview is as old as its oldest stored row
+    oldest = min((s.computed_at for s in stored.values()), default=now)
+    overview = LearnerIntelligenceEngine.summarize(nodes, oldest)
+    overview["data_age_seconds"] = round((now - oldest).total_seconds(), 1)
+    return overview
+
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.analytics.counters import compact_all
+
+
+class Command(BaseCommand):
+    help = 'Folds sharded focus / watch-time counters back into LearningSession and ResourceProgress.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Shard rows folded per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running, compacting every --interval seconds')
+        parser.add_argument('--interval', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        while True:
+            folded = compact_all(options['batch_size'])
+            if folded:
+                self.stdout.write(f'[Counters] Compacted {folded} shard rows')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Counter Compaction Complete ---'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.analytics.intelligence_snapshots import recompute_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Precomputes every learner\'s cognitive state into LearnerIntelligenceSnapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Learners written per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running, every --interval seconds')
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            processed = recompute_snapshots(options['batch_size'])
+            self.stdout.write(f'[Intelligence] Recomputed {processed} learners in {time.monotonic() - started:.1f}s')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Intelligence Recompute Complete ---'))
@@ -1,67 +1,96 @@
-import math
-from django.core.management.base import BaseCommand
-from django.db.models import Sum, F
-from django.utils import timezone
-from apps.modules.models import ModuleProgress, ResourceProgress
-from apps.analytics.models import LearningSession
-from django.contrib.auth import get_user_model
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.analytics.reconciliation import EMPTY_REPORT, init_worker, reconcile_shard, run_shard, user_shards
 
-User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Reconciles telemetry data to ensure trust and accuracy across the matrix.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--heal', action='store_true',
+                            help='Create missing ModuleProgress rows and fix completion drift in bulk')
+        parser.add_argument('--shard-size', type=int, default=1000, help='User ids per shard')
+        parser.add_argument('--workers', type=int, default=1, help='Processes working on shards in parallel')
+        parser.add_argument('--checkpoint', default=None,
+                            help='JSON file recording finished shards; rerunning resumes after them')
+        parser.add_argument('--focus-days', type=int, default=7,
+                            help='Window for the focus cross-check when the event log is on')
+        parser.add_argument('--focus-tolerance', type=float, default=0.1,
+                            help='Relative focus difference reported as drift')
+
+    def _load_checkpoint(self, path, shard_size):
+        if not path or not os.path.exists(path):
+            return {"shard_size": shard_size, "done": [], "totals": dict(EMPTY_REPORT)}
+        with open(path) as handle:
+            checkpoint = json.load(handle)
+        if checkpoint["shard_size"] != shard_size:
+            raise CommandError(f'Checkpoint was written with --shard-size {checkpoint["shard_size"]}')
+        return checkpoint
+
+    def _save_checkpoint(self, path, checkpoint):
+        if not path:
+            return
+        with open(f'{path}.tmp', 'w') as handle:
+            json.dump(checkpoint, handle)
+        os.replace(f'{path}.tmp', path)
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('--- [LMS] Initiating Global Analytics Reconciliation ---'))
-        
-        # 1. Check for Duplicate ModuleProgress or Assignments (Sanity)
-        # (Database constraints already exist, but we check for logic-level fragmentation)
-        self.stdout.write('[1/4] Auditing Constraint Integrity...')
-        # unique_together on user/module should prevent this, but we'll count unique pairs vs total
-        
-        # 2. Reconcile Module Progress vs Resources
-        self.stdout.write('[2/4] Verifying Module Completion Authority...')
-        inconsistent_modules = 0
-        all_progress = ModuleProgress.objects.all()
-        for mp in all_progress:
-            resources = mp.module.resources.all()
-            total_res = resources.count()
-            completed_res = ResourceProgress.objects.filter(user=mp.user, resource__in=resources, completed=True).count()
-            
-            logic_should_be_completed = (total_res == 0 or completed_res >= total_res)
-            
-            # Additional checks for quiz/assignment if required
-            if mp.module.has_quiz:
-                from apps.quiz.models import QuizAttempt, Quiz
-                quiz = Quiz.objects.filter(module=mp.module).first()
-                if quiz and not QuizAttempt.objects.filter(user=mp.user, quiz=quiz, passed=True).exists():
-                    logic_should_be_completed = False
+        shard_size = options['shard_size']
+        checkpoint = self._load_checkpoint(options['checkpoint'], shard_size)
+        done = set(checkpoint["done"])
+        totals = checkpoint["totals"]
 
-            if mp.module.has_assignment:
-                from apps.assignments.models import Assignment, Submission
-                assignment = Assignment.objects.filter(user=mp.user, module=mp.module).first()
-                if not assignment or not Submission.objects.filter(assignment=assignment).exists():
-                    logic_should_be_completed = False
+        shards = [s for s in user_shards(shard_size) if s[0] not in done]
+        total_shards = len(shards) + len(done)
+        if done:
+            self.stdout.write(f'Resuming after {len(done)} finished shards')
+        kwargs = dict(heal=options['heal'], focus_days=options['focus_days'], focus_tolerance=options['focus_tolerance'])
 
-            if logic_should_be_completed and mp.status != 'completed':
-                self.stdout.write(self.style.WARNING(f'Inconsistency: User {mp.user.username} - Module {mp.module.title} should be COMPLETED but is {mp.status}'))
-                # Auto-heal if necessary:
-                # mp.status = 'completed'
-                # mp.save()
-                inconsistent_modules += 1
+        def record(shard, report):
+            for key, value in report.items():
+                totals[key] = totals.get(key, 0) + value
+            done.add(shard[0])
+            checkpoint["done"] = sorted(done)
+            self._save_checkpoint(options['checkpoint'], checkpoint)
+            self.stdout.write(
+                f'[{len(done)}/{total_shards}] users {shard[0]}-{shard[1] - 1}: '
+                f'{report["progress_rows"]} rows, {report["orphans"]} orphan enrollments, '
+                f'{report["inconsistent"]} completion drift, '
+                f'{report["focus_drift"]} focus drift'
+            )
 
-        # 3. Focus-Time Aggregation Correctness
-        self.stdout.write('[3/4] Cross-Referencing Learning Sessions vs Resource Heartbeats...')
-        # Total focus time in modules should roughly match LearningSession focus duration
-        # Focus time is an aggregate of pulse_delta.
-        
-        # 4. Orphan Analytics Check
-        self.stdout.write('[4/4] Detecting Orphan Neural Nodes...')
-        # Check for ResourceProgress without ModuleProgress
-        orphans = ResourceProgress.objects.exclude(user__module_progress__module=F('resource__module')).count()
-        if orphans > 0:
-            self.stdout.write(self.style.ERROR(f'Critical: Detected {orphans} orphan resource progress records (no parent module enrollment).'))
+        if options['workers'] > 1 and shards:
+            # Children must open their own connections, never inherit the parent's sockets
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+                futures = [pool.submit(run_shard, shard, **kwargs) for shard in shards]
+                for future in as_completed(futures):
+                    record(*future.result())
+        else:
+            for shard in shards:
+                record(shard, reconcile_shard(*shard, **kwargs))
 
+        inconsistent = totals["inconsistent"]
         self.stdout.write(self.style.SUCCESS('--- [LMS] Reconciliation Sequence Complete ---'))
-        self.stdout.write(f'Inconsistent Modules Found: {inconsistent_modules}')
-        self.stdout.write(f'System Confidence Level: {100.0 - (inconsistent_modules / (all_progress.count() or 1)) * 100:.2f}%')
+        if totals["orphans"]:
+            self.stdout.write(self.style.ERROR(
+                f'Critical: Detected {totals["orphans"]} orphan enrollments (user/module pairs with resource progress '
+                f'but no parent module enrollment).'
+            ))
+        if totals["focus_drift"]:
+            self.stdout.write(self.style.WARNING(
+                f'Focus drift: {totals["focus_drift"]} of {totals["focus_checked"]} learners differ between sessions and heartbeats.'
+            ))
+        self.stdout.write(f'Inconsistent Modules Found: {inconsistent}')
+        if options['heal']:
+            self.stdout.write(f'Records Healed: {totals["healed"]}')
+        self.stdout.write(f'System Confidence Level: {100.0 - (inconsistent / (totals["progress_rows"] or 1)) * 100:.2f}%')
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            # A complete run starts from scratch next time
+            os.remove(options['checkpoint'])
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.analytics.daily_stats import refresh_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Rolls raw learner activity up into one LearnerDailyStats row per learner per day.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', help='Recompute every day since the first activity')
+        parser.add_argument('--lookback-days', type=int, default=2,
+                            help='Closed days recomputed each run to pick up late writes')
+        parser.add_argument('--loop', action='store_true', help='Keep running, every --interval seconds')
+        parser.add_argument('--interval', type=float, default=600.0)
+
+    def handle(self, *args, **options):
+        backfill = options['backfill']
+        while True:
+            written = refresh_daily_stats(options['lookback_days'], backfill=backfill)
+            self.stdout.write(f'[DailyStats] Wrote {written} learner-day rows')
+            backfill = False
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Daily Stats Rollup Complete ---'))
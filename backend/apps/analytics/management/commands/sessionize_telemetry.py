@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from apps.analytics.sessionization import inline_sessions_enabled, sessionize_all
+
+
+class Command(BaseCommand):
+    help = 'Builds LearningSession rows from the telemetry event log by idle gap.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Events sessionized per transaction')
+        parser.add_argument('--lag', type=float, default=settings.TELEMETRY_ROLLUP_LAG_SECONDS,
+                            help='Only take events received at least this many seconds ago')
+        parser.add_argument('--loop', action='store_true', help='Keep running, every --interval seconds')
+        parser.add_argument('--interval', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if inline_sessions_enabled():
+            raise CommandError(
+                "Sessions are written inline; set TELEMETRY_SESSION_MODE='events' with TELEMETRY_EVENT_LOG on"
+            )
+        while True:
+            consumed = sessionize_all(options['batch_size'], options['lag'])
+            if consumed:
+                self.stdout.write(f'[Sessions] Sessionized {consumed} telemetry events')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Sessionization Complete ---'))
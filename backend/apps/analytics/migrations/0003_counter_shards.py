@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_telemetry_event_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('focus', 'LearningSession focus seconds'), ('watch', 'ResourceProgress watch seconds')], max_length=10)),
+                ('user_id', models.BigIntegerField()),
+                ('object_id', models.BigIntegerField()),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('value', models.BigIntegerField(default=0)),
+                ('touched_at', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('kind', 'user_id', 'object_id', 'shard')},
+            },
+        ),
+    ]
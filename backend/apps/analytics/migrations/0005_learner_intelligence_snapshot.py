@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_learner_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearnerIntelligenceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(max_length=20)),
+                ('risk_score', models.PositiveSmallIntegerField(default=0)),
+                ('velocity', models.FloatField(default=0)),
+                ('risk_factors', models.JSONField(default=list)),
+                ('metrics', models.JSONField(default=dict)),
+                ('last_active', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField(db_index=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='intelligence_snapshot', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_learner_intelligence_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telemetryevent',
+            index=models.Index(condition=models.Q(('applied', False)), fields=['id'], name='telemetry_event_unapplied'),
+        ),
+    ]
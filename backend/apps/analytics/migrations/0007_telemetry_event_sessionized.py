@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_sessionized(apps, schema_editor):
+    """Events the id cursor already passed, or whose sessions were credited inline."""
+    TelemetryEvent = apps.get_model('analytics', 'TelemetryEvent')
+    TelemetryCursor = apps.get_model('analytics', 'TelemetryCursor')
+    events = TelemetryEvent.objects.all()
+    if (getattr(settings, 'TELEMETRY_SESSION_MODE', 'inline') == 'events'
+            and getattr(settings, 'TELEMETRY_EVENT_LOG', 'off') != 'off'):
+        position = TelemetryCursor.objects.filter(name='sessionize').values_list('position', flat=True).first() or 0
+        events = events.filter(id__lte=position)
+    events.update(sessionized=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_telemetry_event_unapplied_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telemetryevent',
+            name='sessionized',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_sessionized, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='telemetryevent',
+            index=models.Index(condition=models.Q(('sessionized', False)), fields=['id'], name='telemetry_event_unsessionized'),
+        ),
+    ]
@@ -25,3 +25,98 @@ class ManagerAction(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+
+class TelemetryEvent(models.Model):
+    """
+    Append-only log of accepted pulses. Rows are only ever inserted; the
+    rollup folds them into ResourceProgress / ModuleProgress / LearningSession
+    and old days are pruned by bucket.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='telemetry_events')
+    module_id = models.PositiveIntegerField()
+    resource_id = models.PositiveIntegerField()
+    day = models.DateField()  # Bucket for pruning and per-day scans
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    duration_delta = models.PositiveIntegerField(default=0)
+    watch_time = models.IntegerField(null=True, blank=True)
+    last_position = models.IntegerField(null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    applied = models.BooleanField(default=False)  # True when written through the direct path at ingest
+    sessionized = models.BooleanField(default=False)  # True once LearningSession accounts for it (inline or sessionize)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['day', 'id']),
+            models.Index(fields=['user', 'occurred_at']),
+            # Rollup scans only the unapplied tail
+            models.Index(fields=['id'], condition=models.Q(applied=False), name='telemetry_event_unapplied'),
+            models.Index(fields=['id'], condition=models.Q(sessionized=False), name='telemetry_event_unsessionized'),
+        ]
+
+class TelemetryCursor(models.Model):
+    """High-water mark (last processed TelemetryEvent id) for a named consumer."""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class CounterShard(models.Model):
+    """
+    One of TELEMETRY_COUNTER_SHARDS partial sums of a hot counter. Writers
+    increment a random shard instead of the owning row; readers add the
+    shards and compaction folds them back (see analytics/counters.py).
+
+    focus: object_id is a LearningSession id. watch: object_id is a Resource id.
+    """
+    KIND_CHOICES = (
+        ('focus', 'LearningSession focus seconds'),
+        ('watch', 'ResourceProgress watch seconds'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    user_id = models.BigIntegerField()
+    object_id = models.BigIntegerField()
+    shard = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)
+    touched_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('kind', 'user_id', 'object_id', 'shard')
+
+class LearnerDailyStats(models.Model):
+    """
+    One row per learner per day, rolled up from the raw activity tables by
+    `manage.py rollup_daily_stats` (see analytics/daily_stats.py). Engines
+    read windows from these rows instead of rescanning history.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    focus_seconds = models.BigIntegerField(default=0)  # Sessions started that day
+    sessions = models.PositiveIntegerField(default=0)
+    resources_completed = models.PositiveIntegerField(default=0)
+    quiz_attempts = models.PositiveIntegerField(default=0)
+    quizzes_passed = models.PositiveIntegerField(default=0)
+    quiz_score_sum = models.FloatField(default=0)
+    quiz_score_sq_sum = models.FloatField(default=0)  # With the sum: variance without the raw scores
+    notes_touched = models.PositiveIntegerField(default=0)
+    submissions = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'day')
+        indexes = [models.Index(fields=['day'])]
+
+class LearnerIntelligenceSnapshot(models.Model):
+    """
+    Latest precomputed cognitive state per learner, written by
+    `manage.py recompute_intelligence` and served by the intelligence overview
+    (see analytics/intelligence_snapshots.py).
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='intelligence_snapshot')
+    state = models.CharField(max_length=20)
+    risk_score = models.PositiveSmallIntegerField(default=0)
+    velocity = models.FloatField(default=0)
+    risk_factors = models.JSONField(default=list)
+    metrics = models.JSONField(default=dict)
+    last_active = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,151 @@
+"""
+Analytics Reconciliation
+
+Set-based integrity checks behind `manage.py reconcile_analytics`. Work is
+split into shards of user ids; each shard costs a constant number of grouped
+queries regardless of how many progress rows it holds:
+
+    1. Orphans: ResourceProgress without a ModuleProgress for its module
+    2. Completion: stored counters and status vs. the source tables
+       (apps/modules/completion.evaluate_completion)
+    3. Focus: LearningSession focus vs. heartbeat time per learner, from the
+       event log when it is on, otherwise from ResourceProgress watch time
+
+With heal=True orphans get their ModuleProgress rows (bulk_create) and
+completion drift is fixed with bulk updates; focus drift is only reported,
+as neither side is authoritative.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from apps.modules.completion import evaluate_completion
+from apps.modules.models import ModuleProgress, ResourceProgress
+
+from .models import LearningSession
+
+EMPTY_REPORT = {
+    "progress_rows": 0,
+    "orphans": 0,
+    "counters_drift": 0,
+    "completion_drift": 0,
+    "inconsistent": 0,
+    "focus_checked": 0,
+    "focus_drift": 0,
+    "healed": 0,
+}
+
+
+def user_shards(shard_size):
+    """[(first_id, last_id_exclusive), ...] covering every user with module or resource progress."""
+    bounds = [
+        model.objects.aggregate(lo=Min('user_id'), hi=Max('user_id'))
+        for model in (ModuleProgress, ResourceProgress)
+    ]
+    bounds = [b for b in bounds if b['lo'] is not None]
+    if not bounds:
+        return []
+    first, last = min(b['lo'] for b in bounds), max(b['hi'] for b in bounds)
+    return [(lo, lo + shard_size) for lo in range(first, last + 1, shard_size)]
+
+
+def find_orphans(first_id, last_id):
+    """(user_id, module_id) pairs with resource progress but no ModuleProgress."""
+    touched = set(ResourceProgress.objects.filter(
+        user_id__gte=first_id, user_id__lt=last_id,
+    ).values_list('user_id', 'resource__module_id').distinct())
+    enrolled = set(ModuleProgress.objects.filter(
+        user_id__gte=first_id, user_id__lt=last_id,
+    ).values_list('user_id', 'module_id'))
+    return touched - enrolled
+
+
+def focus_drift(first_id, last_id, days=None, tolerance=0.1, floor_seconds=60):
+    """
+    Compare per-learner session focus with heartbeat time. Returns (learners checked,
+    {user_id: (session_focus, heartbeat_focus)}) for totals differing by more than
+    `tolerance` and at least `floor_seconds`.
+    """
+    from apps.modules.eventlog import event_log_mode, focus_by_user
+
+    from .counters import pending_focus
+
+    sessions = LearningSession.objects.filter(user_id__gte=first_id, user_id__lt=last_id)
+    if event_log_mode() != 'off':
+        # Exact: the log holds every credited delta; compare over a recent window
+        since = timezone.now() - timedelta(days=days or 7)
+        sessions = sessions.filter(start_time__gte=since)
+        recorded = dict(sessions.values('user_id').annotate(n=Sum('focus_duration_seconds')).values_list('user_id', 'n'))
+        for user_id, n in pending_focus(list(recorded), since).items():
+            recorded[user_id] = recorded.get(user_id, 0) + n
+        heartbeat = focus_by_user(since, user_range=(first_id, last_id))
+    else:
+        # Approximate: watch time can be overwritten by the player's absolute position
+        recorded = dict(sessions.values('user_id').annotate(n=Sum('focus_duration_seconds')).values_list('user_id', 'n'))
+        for user_id, n in pending_focus(list(recorded)).items():
+            recorded[user_id] = recorded.get(user_id, 0) + n
+        heartbeat = dict(ResourceProgress.objects.filter(
+            user_id__gte=first_id, user_id__lt=last_id,
+        ).values('user_id').annotate(n=Sum('watch_time_seconds')).values_list('user_id', 'n'))
+
+    drifted = {}
+    for user_id in recorded.keys() | heartbeat.keys():
+        a, b = recorded.get(user_id) or 0, heartbeat.get(user_id) or 0
+        if abs(a - b) > max(floor_seconds, tolerance * max(a, b)):
+            drifted[user_id] = (a, b)
+    return len(recorded.keys() | heartbeat.keys()), drifted
+
+
+def reconcile_shard(first_id, last_id, heal=False, focus_days=None, focus_tolerance=0.1):
+    """Check (and optionally heal) users first_id <= id < last_id. Returns a report dict."""
+    report = dict(EMPTY_REPORT)
+
+    # 1. Orphan resource progress
+    orphans = find_orphans(first_id, last_id)
+    report["orphans"] = len(orphans)
+    if heal and orphans:
+        with transaction.atomic():
+            ModuleProgress.objects.bulk_create(
+                [ModuleProgress(user_id=u, module_id=m, status='in_progress') for u, m in orphans],
+                ignore_conflicts=True,
+            )
+        report["healed"] += len(orphans)
+
+    # 2. Completion counters and status (healed orphans are evaluated too)
+    pairs = set(ModuleProgress.objects.filter(
+        user_id__gte=first_id, user_id__lt=last_id,
+    ).values_list('user_id', 'module_id'))
+    completion = evaluate_completion(pairs, apply=heal)
+    report["progress_rows"] = completion["evaluated"]
+    report["counters_drift"] = completion["counters_updated"]
+    report["completion_drift"] = completion["completed"]
+    report["inconsistent"] = completion["changed"]
+    if heal:
+        report["healed"] += completion["counters_updated"] + completion["completed"]
+
+    # 3. Focus time cross-check
+    checked, drifted = focus_drift(first_id, last_id, focus_days, focus_tolerance)
+    report["focus_checked"] = checked
+    report["focus_drift"] = len(drifted)
+    return report
+
+
+def run_shard(shard, heal, focus_days, focus_tolerance):
+    """Process-pool entry point: fresh connections per shard."""
+    from django.db import close_old_connections
+    close_old_connections()
+    try:
+        return shard, reconcile_shard(*shard, heal=heal, focus_days=focus_days, focus_tolerance=focus_tolerance)
+    finally:
+        close_old_connections()
+
+
+def init_worker():
+    """Process-pool initializer; the parent closes its connections before the pool forks."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
@@ -0,0 +1,167 @@
+"""
+Manager Analytics Result Cache
+
+Every manager tab polls team-summary, learners, details, risk and
+intelligence-overview, and each poll used to recompute the payload from the
+activity tables. With MANAGER_ANALYTICS_CACHE enabled, payloads are kept in
+the shared Django cache, stale-while-revalidate:
+
+1. Younger than the endpoint's TTL and computed under the current version
+   tokens: served as is.
+2. Older, or computed before a write changed its version tokens, but within
+   MANAGER_ANALYTICS_CACHE_MAX_STALE past the TTL: served marked stale while
+   one background refresh (claimed with cache.add, so one per key across all
+   workers) recomputes it.
+3. Missing or too old: computed in the request.
+
+Serving stale and coalescing refreshes across workers both need a cache the
+workers share (apps/analytics/shared_cache.py). With a process-local cache a
+worker never sees the version tokens other workers bump, so it logs a warning
+and falls back to per-worker behaviour: payloads past their TTL are
+recomputed in the request rather than served stale, and the refresh claim
+only coalesces refreshes within the worker.
+
+Each endpoint keeps its last payload under one version-independent key,
+tagged with the tokens it was computed under, so a write never turns the
+next poll into a synchronous recomputation. Responses report the payload's
+real age in `data_freshness_seconds` and whether it is being refreshed in
+`data_stale` (and the X-Data-Freshness-Seconds / X-Data-Stale headers, for
+list payloads).
+
+Writes that change what a manager sees about one learner (progress, quiz
+attempts, assignments, new sessions) bump that learner's token; cohort-wide
+payloads pick them up within their TTL instead of on every write. Cohort
+membership changes bump the cohort token; curriculum edits bump everything.
+Focus time accrued by heartbeats is not a trigger, it shows up within a TTL.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .shared_cache import cache_is_shared, warn_process_local
+
+logger = logging.getLogger(__name__)
+
+# Seconds a payload is served without refreshing (MANAGER_ANALYTICS_CACHE_TTLS overrides)
+DEFAULT_TTLS = {
+    'team-summary': 30,
+    'learners': 60,
+    'details': 30,
+    'risk': 30,
+    'intelligence-overview': 60,
+}
+
+_EPOCH_KEY = 'lms:manager-analytics-version:epoch'
+_COHORT_KEY = 'lms:manager-analytics-version:cohort'
+_LEARNER_KEY = 'lms:manager-analytics-version:learner:{}'
+_RESULT_KEY = 'lms:manager-analytics:{}:{}'
+_REFRESH_KEY = '{}:refreshing'
+# Released when the refresh ends; expiry only matters if its worker dies
+REFRESH_CLAIM_SECONDS = 60
+
+
+def result_cache_enabled():
+    return getattr(settings, 'MANAGER_ANALYTICS_CACHE', False)
+
+
+def ttl_for(endpoint):
+    return getattr(settings, 'MANAGER_ANALYTICS_CACHE_TTLS', {}).get(endpoint, DEFAULT_TTLS[endpoint])
+
+
+def max_stale():
+    return getattr(settings, 'MANAGER_ANALYTICS_CACHE_MAX_STALE', 300)
+
+
+def result_key(endpoint, learner_id=None):
+    """Cache key of an endpoint's last payload, whatever version it was computed under."""
+    return _RESULT_KEY.format(endpoint, 'cohort' if learner_id is None else learner_id)
+
+
+def current_version(learner_id=None):
+    """The version tokens a fresh payload must have been computed under."""
+    if learner_id is None:
+        return str(cache.get(_COHORT_KEY, 0))
+    learner_key = _LEARNER_KEY.format(learner_id)
+    tokens = cache.get_many([_EPOCH_KEY, learner_key])
+    return f"{tokens.get(_EPOCH_KEY, 0)}.{tokens.get(learner_key, 0)}"
+
+
+def store(key, endpoint, version, payload):
+    entry = (time.time(), version, payload)
+    cache.set(key, entry, ttl_for(endpoint) + max_stale())
+    return entry
+
+
+def refresh(key, endpoint, learner_id, compute):
+    """Recompute and store one entry, then release its refresh claim."""
+    try:
+        # Read before computing: a write landing meanwhile leaves the entry stale
+        version = current_version(learner_id)
+        store(key, endpoint, version, compute())
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+    finally:
+        cache.delete(_REFRESH_KEY.format(key))
+        connection.close()
+
+
+def start_refresh(key, endpoint, learner_id, compute):
+    threading.Thread(target=refresh, args=(key, endpoint, learner_id, compute), daemon=True).start()
+
+
+def cached_result(endpoint, compute, learner_id=None):
+    """(payload, age in seconds, stale) for an endpoint, served stale-while-revalidate."""
+    if not result_cache_enabled():
+        return compute(), 0, False
+
+    shared = cache_is_shared()
+    if not shared:
+        warn_process_local('Manager analytics result cache')
+
+    key = result_key(endpoint, learner_id)
+    version = current_version(learner_id)
+    entry = cache.get(key)
+    if entry is not None and not shared and time.time() - entry[0] > ttl_for(endpoint):
+        # Other workers' writes never reach this worker's tokens, so no stale serving past the TTL
+        entry = None
+    if entry is None:
+        return store(key, endpoint, version, compute())[2], 0.0, False
+
+    computed_at, computed_version, payload = entry
+    age = time.time() - computed_at
+    stale = age > ttl_for(endpoint) or computed_version != version
+    if stale and cache.add(_REFRESH_KEY.format(key), 1, REFRESH_CLAIM_SECONDS):
+        start_refresh(key, endpoint, learner_id, compute)
+    return payload, round(age, 1), stale
+
+
+def invalidate(learner_ids=None, cohort=False):
+    """
+    Bump version tokens now and again once the transaction commits (so a read
+    racing the commit cannot keep pre-commit data). learner_ids bumps only
+    those learners' tokens, plus the cohort token when cohort=True (membership
+    changes). None invalidates everything.
+    """
+    if not result_cache_enabled():
+        return
+    learner_ids = set(learner_ids) if learner_ids is not None else None
+    if learner_ids is not None and not learner_ids:
+        return
+
+    def bump():
+        token = time.time_ns()
+        tokens = {}
+        if learner_ids is None:
+            tokens[_EPOCH_KEY] = tokens[_COHORT_KEY] = token
+        else:
+            tokens.update({_LEARNER_KEY.format(u): token for u in learner_ids})
+            if cohort:
+                tokens[_COHORT_KEY] = token
+        cache.set_many(tokens, None)
+    bump()
+    transaction.on_commit(bump)
@@ -0,0 +1,156 @@
+"""
+Gap-Based Sessionization
+
+Builds LearningSession rows from the telemetry event log instead of
+deciding sessions at write time. A learner's events, in time order, belong
+to one session until the learner is idle for more than
+TELEMETRY_SESSION_GAP_SECONDS; each event extends its session's end and
+adds its duration_delta to the session's focus.
+
+Runs incrementally: each pass takes events not yet `sessionized` (a
+per-event marker, like the rollup's `applied`, so an event whose insert
+commits after higher ids were consumed is still picked up), sorts them per
+user and walks them once against that user's nearby sessions, so late
+(replayed) events land in the session they belong to. Sessions are written
+with bulk_create/bulk_update and the events flagged in the same transaction;
+concurrent passes serialize on a TelemetryCursor row.
+
+With TELEMETRY_SESSION_MODE='events' (and the event log on) the pulse write
+path skips session lookups entirely and this job owns LearningSession.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import LearningSession, TelemetryCursor, TelemetryEvent
+from .result_cache import invalidate as invalidate_results
+
+SESSIONIZE_CURSOR = 'sessionize'
+
+
+def session_gap():
+    return timedelta(seconds=settings.TELEMETRY_SESSION_GAP_SECONDS)
+
+
+def inline_sessions_enabled():
+    """False when sessions are built from the event log rather than by the write path."""
+    return not (
+        getattr(settings, 'TELEMETRY_SESSION_MODE', 'inline') == 'events'
+        and getattr(settings, 'TELEMETRY_EVENT_LOG', 'off') != 'off'
+    )
+
+
+def _session_end(session):
+    return session.end_time or session.start_time
+
+
+def sessionize_user(events, sessions, gap):
+    """
+    One sorted pass over a user's events (sorted by occurred_at) against their
+    existing sessions near that time range (sorted by start_time).
+    Mutates and returns the touched sessions; new ones have no pk.
+    """
+    touched = {}
+    current = None
+    index = 0
+    for event in events:
+        at = event.occurred_at
+        if current is None or not (current.start_time - gap <= at <= _session_end(current) + gap):
+            # Skip sessions that ended more than a gap before this event
+            while index < len(sessions) and _session_end(sessions[index]) + gap < at:
+                index += 1
+            if index < len(sessions) and sessions[index].start_time - gap <= at:
+                current = sessions[index]
+            else:
+                # The pulse reports time already spent, so the session starts delta seconds earlier
+                start = at - timedelta(seconds=event.duration_delta)
+                current = LearningSession(user_id=event.user_id, start_time=start, end_time=at, focus_duration_seconds=0)
+                sessions.insert(index, current)
+
+        current.start_time = min(current.start_time, at - timedelta(seconds=event.duration_delta))
+        current.end_time = max(_session_end(current), at)
+        current.focus_duration_seconds += event.duration_delta
+        touched[id(current)] = current
+    return list(touched.values())
+
+
+def sessionize(batch_size=5000, lag_seconds=None):
+    """
+    Sessionize the next batch of unsessionized events. Concurrent runs serialize on the cursor.
+    Returns the number of events consumed.
+
+    A no-op unless sessions are event-built: with inline sessions the write
+    path already credits LearningSession, and sessionizing the same pulses
+    again would double every learner's focus time.
+    """
+    if inline_sessions_enabled():
+        return 0
+    if lag_seconds is None:
+        lag_seconds = settings.TELEMETRY_ROLLUP_LAG_SECONDS
+    gap = session_gap()
+    now = timezone.now()
+
+    with transaction.atomic():
+        cursor, _ = TelemetryCursor.objects.get_or_create(name=SESSIONIZE_CURSOR)
+        cursor = TelemetryCursor.objects.select_for_update().get(pk=cursor.pk)
+
+        events = list(
+            TelemetryEvent.objects.filter(
+                sessionized=False, received_at__lte=now - timedelta(seconds=lag_seconds),
+            ).order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        # 1. Group per user, time-ordered (only focus-bearing events form sessions)
+        by_user = {}
+        for event in events:
+            if event.duration_delta:
+                by_user.setdefault(event.user_id, []).append(event)
+        for user_events in by_user.values():
+            user_events.sort(key=lambda e: e.occurred_at)
+
+        # 2. One query for every user's sessions around the batch's time range
+        existing = {}
+        if by_user:
+            earliest = min(e[0].occurred_at for e in by_user.values()) - gap
+            latest = max(e[-1].occurred_at for e in by_user.values()) + gap
+            for session in LearningSession.objects.filter(
+                Q(end_time__gte=earliest) | Q(end_time__isnull=True, start_time__gte=earliest),
+                user_id__in=by_user, start_time__lte=latest,
+            ).order_by('start_time'):
+                existing.setdefault(session.user_id, []).append(session)
+
+        # 3. Sorted pass per user, then bulk writes
+        touched = []
+        for user_id, user_events in by_user.items():
+            touched += sessionize_user(user_events, existing.get(user_id, []), gap)
+
+        fields = ['start_time', 'end_time', 'focus_duration_seconds']
+        created = [s for s in touched if s.pk is None]
+        if created:
+            # start_time is auto_now_add, which bulk_create stamps over; bulk_update restores the real start
+            starts = [s.start_time for s in created]
+            LearningSession.objects.bulk_create(created)
+            invalidate_results({s.user_id for s in created})
+            for session, start in zip(created, starts):
+                session.start_time = start
+        LearningSession.objects.bulk_update(touched, fields)
+        TelemetryEvent.objects.filter(pk__in=[e.pk for e in events]).update(sessionized=True)
+
+        cursor.position = max(cursor.position, events[-1].id)
+        cursor.save(update_fields=['position', 'updated_at'])
+    return len(events)
+
+
+def sessionize_all(batch_size=5000, lag_seconds=None):
+    total = 0
+    while True:
+        consumed = sessionize(batch_size, lag_seconds)
+        total += consumed
+        if consumed < batch_size:
+            return total
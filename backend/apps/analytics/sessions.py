@@ -0,0 +1,49 @@
+"""
+Open Session Index
+
+Keeps each user's currently open LearningSession id and its expiry in the
+Django cache, so the pulse write path can credit focus time without the
+"latest session in the last hour" query. Entries are replaced when a new
+session starts, expire with the session window, and a miss simply falls
+back to the database.
+"""
+
+from datetime import timedelta
+
+from django.core.cache import cache
+
+# A session stays open for pulses during this long after it started
+SESSION_WINDOW = timedelta(hours=1)
+
+_KEY = 'lms:open-session:{}'
+
+
+class OpenSessionIndex:
+    """user_id -> (session_id, expires_at timestamp)"""
+
+    @staticmethod
+    def lookup(user_ids, now):
+        """Return {user_id: session_id} for users with a known, unexpired open session."""
+        keys = {_KEY.format(user_id): user_id for user_id in user_ids}
+        found = {}
+        for key, (session_id, expires_at) in cache.get_many(keys.keys()).items():
+            if expires_at > now.timestamp():
+                found[keys[key]] = session_id
+        return found
+
+    @staticmethod
+    def remember(sessions, now):
+        """Record sessions as their users' open session until the window closes."""
+        entries = {}
+        for session in sessions:
+            expires_at = (session.start_time + SESSION_WINDOW).timestamp()
+            ttl = expires_at - now.timestamp()
+            if ttl > 0:
+                # set_many takes one timeout, so entries carry their own expiry as well
+                entries[_KEY.format(session.user_id)] = (session.pk, expires_at)
+        if entries:
+            cache.set_many(entries, timeout=SESSION_WINDOW.total_seconds())
+
+    @staticmethod
+    def forget(user_ids):
+        cache.delete_many([_KEY.format(user_id) for user_id in user_ids])
@@ -0,0 +1,38 @@
+"""
+Shared Cache Detection
+
+Version tokens (module requirements, manager result cache) and cross-worker
+locks only coordinate gunicorn workers when the default Django cache is
+shared between them. LocMemCache (the default without CACHE_BACKEND) and
+DummyCache live inside one process, so callers check here and fall back to
+process-local behaviour instead of trusting them across workers.
+"""
+
+import logging
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+_warned = set()
+
+
+def cache_is_shared(alias='default'):
+    """True unless the cache backend is private to this process."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def warn_process_local(feature):
+    """Log, once per feature and process, that it runs without a shared cache."""
+    if feature in _warned:
+        return
+    _warned.add(feature)
+    logger.warning(
+        "[Cache] %s: the default cache is process-local, falling back to per-worker behaviour. "
+        "Set CACHE_BACKEND / CACHE_LOCATION to a shared backend when running several workers.",
+        feature,
+    )
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.assignments.models import Assignment, Submission
+from apps.modules.models import Module, ModuleProgress, Resource
+from apps.quiz.models import Quiz, QuizAttempt
+from . import result_cache
+from .models import LearningSession
+from .sessions import OpenSessionIndex
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=LearningSession)
+def index_new_session(sender, instance, created, **kwargs):
+    """A newly started session replaces whatever the index held for that user."""
+    if created:
+        OpenSessionIndex.forget([instance.user_id])
+        OpenSessionIndex.remember([instance], timezone.now())
+        result_cache.invalidate([instance.user_id])
+
+
+@receiver(post_delete, sender=LearningSession)
+def unindex_deleted_session(sender, instance, **kwargs):
+    OpenSessionIndex.forget([instance.user_id])
+
+
+@receiver(post_save, sender=ModuleProgress)
+@receiver(post_delete, sender=ModuleProgress)
+@receiver(post_save, sender=QuizAttempt)
+@receiver(post_delete, sender=QuizAttempt)
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def invalidate_learner_results(sender, instance, **kwargs):
+    result_cache.invalidate([instance.user_id])
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def invalidate_submission_results(sender, instance, **kwargs):
+    result_cache.invalidate([instance.assignment.user_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cohort_results(sender, instance, **kwargs):
+    # Joining, leaving or changing role changes the cohort
+    result_cache.invalidate([instance.pk], cohort=True)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_all_results(sender, instance, **kwargs):
+    result_cache.invalidate()
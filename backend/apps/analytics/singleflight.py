@@ -0,0 +1,151 @@
+"""
+Single-Flight Computations
+
+When several managers open the dashboard at once, each request used to run
+its own get_team_snapshot / get_intelligence_overview, all scanning the same
+tables. With ANALYTICS_SINGLE_FLIGHT enabled, calls are coalesced per
+(computation, parameters):
+
+1. In a worker: the first caller computes; concurrent callers wait on it and
+   get a copy of its result (or its exception).
+2. Across workers: the computing caller holds a lock in the Django cache
+   (cache.add). Callers in other workers poll for the result it publishes
+   under the lock's token, backing off exponentially with jitter (capped at
+   MAX_POLL_INTERVAL) so waiters do not hammer the cache, and compute
+   themselves only if the holder disappears or SINGLE_FLIGHT_WAIT runs out.
+   The wait stays well under gunicorn's 30s worker timeout.
+
+Step 2 needs a cache every worker shares (CACHE_BACKEND in settings). With
+the process-local LocMem default each worker would hold its own "lock", so
+flights are only coalesced within the worker and a warning is logged.
+
+Results are shared, not cached: once a flight lands the next call computes
+again (result_cache.py is the caching layer).
+"""
+
+import copy
+import functools
+import hashlib
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .shared_cache import cache_is_shared, warn_process_local
+
+# Lock expiry, in case its holder dies mid-computation
+LOCK_SECONDS = 60
+# How long a published result stays readable by waiting workers
+RESULT_SECONDS = 10
+SINGLE_FLIGHT_WAIT = 10
+# First poll delay, doubled after each miss up to MAX_POLL_INTERVAL
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+
+_LOCK_KEY = 'lms:single-flight:{}'
+_RESULT_KEY = 'lms:single-flight:{}:result:{}'
+
+
+def single_flight_enabled():
+    return getattr(settings, 'ANALYTICS_SINGLE_FLIGHT', False)
+
+
+def flight_key(name, args=(), kwargs=None):
+    params = repr((args, sorted((kwargs or {}).items())))
+    return f"{name}:{hashlib.sha1(params.encode()).hexdigest()}"
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _await_other_worker(key, token):
+    """Result published by the worker holding the lock, or None once it is gone."""
+    result_key, lock_key = _RESULT_KEY.format(key, token), _LOCK_KEY.format(key)
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+    interval = POLL_INTERVAL
+    while True:
+        found = cache.get_many([result_key, lock_key])
+        if found.get(result_key) is not None:
+            return found[result_key]
+        if found.get(lock_key) != token:
+            # Released: one last look in case it published just before
+            return cache.get(result_key)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        # Jittered so workers that started waiting together spread out
+        time.sleep(min(remaining, random.uniform(interval / 2, interval)))
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+
+def _compute_across_workers(key, compute):
+    lock_key = _LOCK_KEY.format(key)
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, LOCK_SECONDS):
+        holder = cache.get(lock_key)
+        published = _await_other_worker(key, holder) if holder else None
+        if published is not None:
+            return published[0]
+        return compute()
+
+    try:
+        result = compute()
+        # Wrapped so a None result still reads as published
+        cache.set(_RESULT_KEY.format(key, token), (result,), RESULT_SECONDS)
+        return result
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def single_flight(key, compute):
+    """compute(), shared with every concurrent call under the same key."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return copy.deepcopy(flight.result)
+
+    try:
+        if cache_is_shared():
+            flight.result = _compute_across_workers(key, compute)
+        else:
+            warn_process_local('Analytics single-flight')
+            flight.result = compute()
+        return flight.result
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def coalesced(name):
+    """Decorator: run the function single-flight, keyed by name and call arguments."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not single_flight_enabled():
+                return func(*args, **kwargs)
+            return single_flight(flight_key(name, args, kwargs), lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,83 @@
+"""
+Learner Daily Stats Tests
+
+Rollup rows per learner per day, incremental refresh and day-window reads.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.analytics.daily_stats import refresh_daily_stats, window_totals
+from apps.analytics.intelligence import IntelligenceEngine
+from apps.analytics.models import LearnerDailyStats, LearningSession
+from apps.modules.models import Module
+from apps.quiz.models import Quiz, QuizAttempt
+
+User = get_user_model()
+
+
+class LearnerDailyStatsTests(TestCase):
+
+    def setUp(self):
+        self.learner = User.objects.create_user(username='ds_learner', password='pass', role='learner')
+        self.quiz = Quiz.objects.create(module=Module.objects.create(title='DS', description='Desc', duration=10), title='Q')
+        self.now = timezone.now()
+        for days_ago, focus in ((10, 600), (3, 300), (3, 120), (0, 60)):
+            self._session(days_ago, focus)
+        for days_ago, score, passed in ((10, 40, False), (3, 80, True), (0, 90, True)):
+            attempt = QuizAttempt.objects.create(user=self.learner, quiz=self.quiz, score=score, passed=passed)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(timestamp=self.now - timedelta(days=days_ago))
+
+    def _session(self, days_ago, focus):
+        at = self.now - timedelta(days=days_ago)
+        session = LearningSession.objects.create(user=self.learner, focus_duration_seconds=focus)
+        LearningSession.objects.filter(pk=session.pk).update(start_time=at, end_time=at)
+
+    def test_rollup_writes_one_row_per_learner_day(self):
+        self.assertEqual(refresh_daily_stats(), 2)
+        three_days_ago = LearnerDailyStats.objects.get(user=self.learner, day=timezone.localdate(self.now - timedelta(days=3)))
+        self.assertEqual((three_days_ago.focus_seconds, three_days_ago.sessions), (420, 2))
+        self.assertEqual((three_days_ago.quiz_attempts, three_days_ago.quizzes_passed), (1, 1))
+        self.assertEqual(three_days_ago.quiz_score_sq_sum, 6400)
+        # Today stays live
+        self.assertFalse(LearnerDailyStats.objects.filter(day=timezone.localdate()).exists())
+
+    def test_windows_combine_rollup_and_today(self):
+        refresh_daily_stats()
+        week = window_totals([self.learner.id], 7)[self.learner.id]
+        self.assertEqual((week['focus_seconds'], week['sessions'], week['quiz_attempts']), (480, 3, 2))
+        everything = window_totals([self.learner.id])[self.learner.id]
+        self.assertEqual((everything['focus_seconds'], everything['quiz_score_sum']), (1080, 210))
+
+    def test_refresh_picks_up_late_writes_within_lookback(self):
+        refresh_daily_stats()
+        # A replayed backlog lands a session on yesterday after it was rolled up
+        self._session(1, 900)
+        refresh_daily_stats(lookback_days=2)
+        self.assertEqual(window_totals([self.learner.id], 7)[self.learner.id]['focus_seconds'], 1380)
+
+    def test_engines_read_the_rollup(self):
+        with override_settings(LEARNER_DAILY_STATS=False):
+            stability = IntelligenceEngine.calculate_knowledge_stability(self.learner)
+            engagement = IntelligenceEngine.calculate_engagement_score(self.learner)
+        refresh_daily_stats()
+        with override_settings(LEARNER_DAILY_STATS=True):
+            self.assertAlmostEqual(IntelligenceEngine.calculate_knowledge_stability(self.learner), stability)
+            self.assertEqual(IntelligenceEngine.calculate_engagement_score(self.learner), engagement)
+            snapshot = IntelligenceEngine.get_learner_snapshot(self.learner)
+            self.assertEqual(snapshot['focus_time_7d'], 8.0)
+            learners = User.objects.filter(pk=self.learner.pk)
+            self.assertEqual(IntelligenceEngine.get_learner_snapshots(learners), [snapshot])
+
+    def test_engines_keep_raw_queries_until_first_rollup(self):
+        with override_settings(LEARNER_DAILY_STATS=False):
+            engagement = IntelligenceEngine.calculate_engagement_score(self.learner)
+        with override_settings(LEARNER_DAILY_STATS=True), \
+                mock.patch('apps.analytics.intelligence.window_totals') as totals, \
+                self.assertLogs('apps.analytics.daily_stats', 'WARNING'):
+            self.assertEqual(IntelligenceEngine.calculate_engagement_score(self.learner), engagement)
+        totals.assert_not_called()
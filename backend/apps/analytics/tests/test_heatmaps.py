@@ -0,0 +1,75 @@
+"""
+Engagement Heatmap Tests
+
+Coverage bitmaps -> per-segment viewer counts, caching and invalidation.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.analytics.heatmaps import coverage_matrix, get_heatmap
+from apps.modules.coverage import segment_mask, to_bitmap
+from apps.modules.models import Module, Resource, ResourceProgress
+
+User = get_user_model()
+
+
+class ResourceHeatmapTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='hm_manager', password='pass', role='manager', is_staff=True)
+        self.learners = [
+            User.objects.create_user(username=f'hm_learner{i}', password='pass', role='learner') for i in range(3)
+        ]
+        self.module = Module.objects.create(title='Heatmap Module', description='Desc', duration=10)
+        self.resource = Resource.objects.create(module=self.module, title='Video', type='video', url='http://y.t/v')
+        self.client = APIClient()
+
+    def _watch(self, learner, *ranges):
+        mask = 0
+        for start, end in ranges:
+            mask |= segment_mask(start, end)
+        ResourceProgress.objects.update_or_create(
+            user=learner, resource=self.resource, defaults={'coverage': to_bitmap(mask)},
+        )
+
+    def test_matrix_sums_per_segment(self):
+        matrix = coverage_matrix([to_bitmap(segment_mask(0, 10)), to_bitmap(segment_mask(5, 40)), b''])
+        self.assertEqual(matrix.shape, (3, 8))
+        self.assertEqual(matrix.sum(axis=0).tolist(), [1, 2, 1, 1, 1, 1, 1, 1])
+
+    def test_heatmap_reports_drop_off(self):
+        self._watch(self.learners[0], (0, 30))
+        self._watch(self.learners[1], (0, 30))
+        self._watch(self.learners[2], (0, 10), (20, 30))
+
+        heatmap = get_heatmap(self.resource.id)
+        self.assertEqual(heatmap['learners'], 3)
+        self.assertEqual(heatmap['viewers'], [3, 3, 2, 2, 3, 3])
+        self.assertEqual(heatmap['drop_off_seconds'], 10)
+
+    def test_pulses_invalidate_cached_heatmap(self):
+        self._watch(self.learners[0], (0, 10))
+        self.assertEqual(get_heatmap(self.resource.id)['viewers'], [1, 1])
+
+        self.client.force_authenticate(user=self.learners[1])
+        url = f'/api/modules/{self.module.id}/resources/{self.resource.id}/complete/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'duration_delta': 15, 'last_position': 15}, format='json')
+
+        self.assertEqual(get_heatmap(self.resource.id)['viewers'], [2, 2, 1])
+
+    def test_endpoint_is_manager_only(self):
+        self._watch(self.learners[0], (0, 10))
+        url = f'/api/analytics/manager/resources/{self.resource.id}/heatmap/'
+
+        self.client.force_authenticate(user=self.learners[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['viewers'], [1, 1])
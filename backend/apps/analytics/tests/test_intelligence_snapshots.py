@@ -0,0 +1,72 @@
+"""
+Intelligence Snapshot Tests
+
+Background recompute into LearnerIntelligenceSnapshot and serving the
+overview from the stored rows.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.analytics.cognitive_intelligence import LearnerIntelligenceEngine
+from apps.analytics.intelligence_snapshots import recompute_snapshots
+from apps.analytics.models import LearnerIntelligenceSnapshot, LearningSession
+
+User = get_user_model()
+
+
+class IntelligenceSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.manager = User.objects.create_user(username='is_manager', password='pass', role='manager', is_staff=True)
+        self.learners = [
+            User.objects.create_user(username=f'is_learner{i}', password='pass', role='learner') for i in range(3)
+        ]
+        LearningSession.objects.create(user=self.learners[0], focus_duration_seconds=1200)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def _overview(self):
+        response = self.client.get('/api/analytics/manager/intelligence-overview/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_stored_overview_matches_live(self):
+        live = LearnerIntelligenceEngine.get_intelligence_overview()
+        self.assertEqual(recompute_snapshots(), 3)
+
+        with override_settings(INTELLIGENCE_SNAPSHOTS=True):
+            stored = self._overview()
+        self.assertEqual(stored['nodes'], live['nodes'])
+        self.assertEqual(stored['summary']['stable'], live['summary']['stable'])
+        self.assertIn('data_age_seconds', stored)
+
+    def test_serves_real_age_and_fills_in_new_learners(self):
+        recompute_snapshots()
+        computed = timezone.now() - timedelta(minutes=5)
+        LearnerIntelligenceSnapshot.objects.update(computed_at=computed)
+        User.objects.create_user(username='is_newcomer', password='pass', role='learner')
+
+        with override_settings(INTELLIGENCE_SNAPSHOTS=True):
+            overview = self._overview()
+        self.assertEqual(overview['computed_at'], computed.isoformat())
+        self.assertGreaterEqual(overview['data_age_seconds'], 300)
+        self.assertEqual(overview['summary']['total_learners'], 4)
+
+    def test_polling_cost_is_independent_of_learner_count(self):
+        recompute_snapshots()
+        with override_settings(INTELLIGENCE_SNAPSHOTS=True):
+            with CaptureQueriesContext(connection) as few:
+                self._overview()
+            for i in range(5):
+                User.objects.create_user(username=f'is_extra{i}', password='pass', role='learner')
+            recompute_snapshots()
+            with CaptureQueriesContext(connection) as many:
+                self._overview()
+        self.assertEqual(len(many), len(few))
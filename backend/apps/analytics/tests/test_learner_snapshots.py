@@ -0,0 +1,93 @@
+"""
+Bulk Learner Snapshot Tests
+
+get_learner_snapshots must match get_learner_snapshot row for row and the team
+snapshot must count High risk like get_risk_assessment, with query counts that
+do not grow with the number of learners.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.analytics.intelligence import IntelligenceEngine
+from apps.analytics.models import LearningSession
+from apps.assignments.models import Assignment, Submission
+from apps.modules.models import Module, ModuleProgress, Resource, ResourceProgress
+from apps.quiz.models import Quiz, QuizAttempt
+
+User = get_user_model()
+
+
+class LearnerSnapshotTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.modules = [Module.objects.create(title=f'Snapshot Module {i}', description='Desc', duration=10) for i in range(2)]
+        resource = Resource.objects.create(module=self.modules[0], title='Video', type='video', url='http://y.t/v')
+        quiz = Quiz.objects.create(module=self.modules[0], title='Q')
+
+        # Active: recent session, passing quizzes, graded work
+        active = User.objects.create_user(username='snap_active', password='pass', role='learner')
+        LearningSession.objects.create(user=active, end_time=now, focus_duration_seconds=900)
+        ModuleProgress.objects.create(user=active, module=self.modules[0])
+        ModuleProgress.objects.create(user=active, module=self.modules[1])
+        ResourceProgress.objects.create(user=active, resource=resource, completed=True)
+        QuizAttempt.objects.create(user=active, quiz=quiz, score=90, passed=True)
+        QuizAttempt.objects.create(user=active, quiz=quiz, score=70, passed=True)
+        assignment = Assignment.objects.create(user=active, module=self.modules[0])
+        Submission.objects.create(assignment=assignment, content='Done', status='graded')
+
+        # Stuck: idle for a week, two fails, overdue work
+        stuck = User.objects.create_user(username='snap_stuck', password='pass', role='learner')
+        old = LearningSession.objects.create(user=stuck, focus_duration_seconds=600)
+        LearningSession.objects.filter(pk=old.pk).update(start_time=now - timedelta(days=8), end_time=now - timedelta(days=8))
+        for score in (20, 30):
+            QuizAttempt.objects.create(user=stuck, quiz=quiz, score=score, passed=False)
+        Assignment.objects.create(user=stuck, module=self.modules[1], status='overdue')
+
+        # Idle: never started a session
+        User.objects.create_user(username='snap_new', password='pass', role='learner')
+
+        self.learners = User.objects.filter(is_staff=False, role='learner').order_by('id')
+
+    def test_matches_per_learner_snapshot(self):
+        expected = [IntelligenceEngine.get_learner_snapshot(l) for l in self.learners]
+        self.assertEqual(IntelligenceEngine.get_learner_snapshots(self.learners), expected)
+        self.assertEqual([s['risk_level'] for s in expected], ['Low', 'High', 'Medium'])
+
+    def test_query_count_is_independent_of_learner_count(self):
+        with CaptureQueriesContext(connection) as few:
+            IntelligenceEngine.get_learner_snapshots(self.learners)
+
+        for i in range(10):
+            learner = User.objects.create_user(username=f'snap_extra{i}', password='pass', role='learner')
+            LearningSession.objects.create(user=learner, focus_duration_seconds=60)
+            ModuleProgress.objects.create(user=learner, module=self.modules[i % 2])
+
+        with CaptureQueriesContext(connection) as many:
+            IntelligenceEngine.get_learner_snapshots(self.learners)
+        self.assertEqual(len(many), len(few))
+
+    def test_team_snapshot_counts_high_risk_in_sql(self):
+        expected = sum(IntelligenceEngine.get_risk_assessment(l)['level'] == 'High' for l in self.learners)
+        with CaptureQueriesContext(connection) as few:
+            snapshot = IntelligenceEngine.get_team_snapshot()
+        self.assertEqual(snapshot['at_risk_count'], expected)
+
+        # Idle for 4 days with two fails: a second High-risk learner
+        learner = User.objects.create_user(username='snap_idle', password='pass', role='learner')
+        session = LearningSession.objects.create(user=learner, focus_duration_seconds=60)
+        LearningSession.objects.filter(pk=session.pk).update(end_time=timezone.now() - timedelta(days=4, minutes=1))
+        quiz = Quiz.objects.get()
+        for _ in range(2):
+            QuizAttempt.objects.create(user=learner, quiz=quiz, score=10, passed=False)
+
+        with CaptureQueriesContext(connection) as many:
+            snapshot = IntelligenceEngine.get_team_snapshot()
+        self.assertEqual(snapshot['at_risk_count'], expected + 1)
+        self.assertEqual(len(many), len(few))
@@ -0,0 +1,83 @@
+"""
+Reconciliation Tests
+
+Sharded, set-based reconcile_analytics: detection, --heal and checkpoints.
+"""
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from apps.analytics.models import LearningSession
+from apps.analytics.reconciliation import reconcile_shard
+from apps.modules.models import Module, ModuleProgress, Resource, ResourceProgress
+
+User = get_user_model()
+
+
+class ReconcileAnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.learners = [
+            User.objects.create_user(username=f'rc_learner{i}', password='pass', role='learner') for i in range(3)
+        ]
+        self.module = Module.objects.create(title='Reconcile Module', description='Desc', duration=10)
+        self.resource = Resource.objects.create(module=self.module, title='Video', type='video', url='http://y.t/v')
+
+        # 0: completed its only resource, but the row was imported without counters
+        ModuleProgress.objects.bulk_create([ModuleProgress(user=self.learners[0], module=self.module)])
+        # 1: resource progress without any ModuleProgress (orphan)
+        ResourceProgress.objects.bulk_create([
+            ResourceProgress(user=self.learners[0], resource=self.resource, completed=True, watch_time_seconds=30),
+            ResourceProgress(user=self.learners[1], resource=self.resource, completed=True, watch_time_seconds=30),
+        ])
+        # 0's sessions say 30 minutes, heartbeats say 30 seconds
+        LearningSession.objects.create(user=self.learners[0], focus_duration_seconds=1800)
+
+    def _run(self, *args):
+        out = StringIO()
+        call_command('reconcile_analytics', *args, stdout=out)
+        return out.getvalue()
+
+    def test_detects_without_writing(self):
+        report = reconcile_shard(self.learners[0].id, self.learners[-1].id + 1)
+        self.assertEqual(report['orphans'], 1)
+        self.assertEqual(report['counters_drift'], 1)
+        self.assertEqual(report['completion_drift'], 1)
+        self.assertEqual(report['focus_drift'], 1)
+        self.assertEqual(ModuleProgress.objects.get(user=self.learners[0]).status, 'not_started')
+        self.assertFalse(ModuleProgress.objects.filter(user=self.learners[1]).exists())
+
+    def test_orphans_are_reported_as_enrollments(self):
+        output = self._run()
+        self.assertIn('1 orphan enrollments', output)
+        self.assertIn('Critical: Detected 1 orphan enrollments (user/module pairs', output)
+
+    def test_heal_applies_fixes(self):
+        output = self._run('--heal', '--shard-size', '2')
+        self.assertIn('Inconsistent Modules Found: 2', output)
+
+        for learner in self.learners[:2]:
+            row = ModuleProgress.objects.get(user=learner, module=self.module)
+            self.assertEqual((row.status, row.completed_resources), ('completed', 1))
+
+        self.assertIn('Inconsistent Modules Found: 0', self._run('--shard-size', '2'))
+
+    def test_checkpoint_resumes_after_finished_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reconcile.json')
+            first = self.learners[0].id
+            # A previous run finished the first shard (learners 0 and 1) before stopping
+            totals = {key: 0 for key in reconcile_shard(first, first).keys()}
+            with open(path, 'w') as handle:
+                json.dump({"shard_size": 2, "done": [first], "totals": totals}, handle)
+
+            output = self._run('--heal', '--shard-size', '2', '--checkpoint', path)
+            self.assertIn('Resuming after 1 finished shards', output)
+            self.assertEqual(ModuleProgress.objects.get(user=self.learners[0]).status, 'not_started')
+            self.assertFalse(os.path.exists(path))
@@ -0,0 +1,116 @@
+"""
+Manager Analytics Result Cache Tests
+
+Stale-while-revalidate payloads, real data age and invalidation on writes.
+"""
+
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.analytics.models import LearningSession
+from apps.analytics.result_cache import current_version, refresh, result_key
+from apps.modules.models import Module
+from apps.quiz.models import Quiz, QuizAttempt
+
+User = get_user_model()
+
+SHARED_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'lms-result-cache-tests'),
+}}
+
+
+@override_settings(MANAGER_ANALYTICS_CACHE=True, MANAGER_ANALYTICS_CACHE_TTLS={}, CACHES=SHARED_CACHE)
+class ManagerResultCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='rc_manager', password='pass', role='manager', is_staff=True)
+        self.learner = User.objects.create_user(username='rc_learner', password='pass', role='learner')
+        LearningSession.objects.create(user=self.learner, focus_duration_seconds=600)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def _get(self, path):
+        response = self.client.get(f'/api/analytics/manager/{path}/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeated_polls_cost_one_computation(self):
+        first = self._get('team-summary').data
+        with CaptureQueriesContext(connection) as queries:
+            second = self._get('team-summary').data
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second['computed_at'], first['computed_at'])
+
+    def test_reports_real_age_of_cached_payload(self):
+        self._get('team-summary')
+        key = result_key('team-summary')
+        computed_at, version, payload = cache.get(key)
+        cache.set(key, (computed_at - 20, version, payload))
+
+        response = self._get('team-summary')
+        self.assertGreaterEqual(response.data['data_freshness_seconds'], 20)
+        self.assertGreaterEqual(float(response['X-Data-Freshness-Seconds']), 20)
+
+    @override_settings(MANAGER_ANALYTICS_CACHE_TTLS={'learners': 0})
+    def test_serves_stale_while_one_refresh_runs(self):
+        with mock.patch('apps.analytics.result_cache.start_refresh') as start_refresh:
+            first = self._get('learners').data
+            time.sleep(0.01)
+            for _ in range(3):
+                self.assertEqual(self._get('learners').data, first)
+        self.assertEqual(start_refresh.call_count, 1)
+
+    def test_writes_serve_stale_then_refresh(self):
+        # Refresh inline, keeping the test transaction's connection open
+        with mock.patch('apps.analytics.result_cache.start_refresh', side_effect=refresh), \
+                mock.patch('apps.analytics.result_cache.connection'):
+            self.assertEqual(len(self._get('learners').data), 1)
+            User.objects.create_user(username='rc_newcomer', password='pass', role='learner')
+            stale = self._get('learners')
+            self.assertEqual((len(stale.data), stale['X-Data-Stale']), (1, '1'))
+            fresh = self._get('learners')
+            self.assertEqual((len(fresh.data), fresh['X-Data-Stale']), (2, '0'))
+
+            quiz = Quiz.objects.create(module=Module.objects.create(title='RC', description='Desc', duration=10), title='Q')
+            self.assertEqual(self._get(f'{self.learner.pk}/risk').data['triggers'], [])
+            for _ in range(2):
+                QuizAttempt.objects.create(user=self.learner, quiz=quiz, score=20, passed=False)
+            self.assertTrue(self._get(f'{self.learner.pk}/risk').data['data_stale'])
+            codes = [t['code'] for t in self._get(f'{self.learner.pk}/risk').data['triggers']]
+        self.assertEqual(codes, ['REPEATED_FAIL'])
+
+    def test_learner_writes_leave_cohort_payloads_alone(self):
+        cohort = current_version()
+        quiz = Quiz.objects.create(module=Module.objects.create(title='RC', description='Desc', duration=10), title='Q')
+        self.assertNotEqual(current_version(), cohort)  # Curriculum edits reach everything
+
+        cohort, learner = current_version(), current_version(self.learner.pk)
+        QuizAttempt.objects.create(user=self.learner, quiz=quiz, score=20, passed=False)
+        self.assertEqual(current_version(), cohort)
+        self.assertNotEqual(current_version(self.learner.pk), learner)
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        MANAGER_ANALYTICS_CACHE_TTLS={'learners': 0},
+    )
+    def test_process_local_cache_does_not_serve_stale(self):
+        with mock.patch('apps.analytics.result_cache.start_refresh') as start_refresh, \
+                mock.patch('apps.analytics.shared_cache._warned', set()), \
+                self.assertLogs('apps.analytics.shared_cache', 'WARNING'):
+            self._get('learners')
+            time.sleep(0.01)
+            User.objects.create_user(username='rc_newcomer', password='pass', role='learner')
+            response = self._get('learners')
+        self.assertEqual((len(response.data), response['X-Data-Stale']), (2, '0'))
+        start_refresh.assert_not_called()
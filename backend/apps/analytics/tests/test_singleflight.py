@@ -0,0 +1,142 @@
+"""
+Single-Flight Tests
+
+Concurrent callers in a worker share one computation; callers in other
+workers wait on the cache lock and read the published result.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.analytics.intelligence import IntelligenceEngine
+from apps.analytics import singleflight
+from apps.analytics.singleflight import _LOCK_KEY, _RESULT_KEY, flight_key, single_flight
+
+
+# Cross-worker coordination needs a cache shared between processes
+SHARED_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'lms-single-flight-tests'),
+}}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _concurrently(self, key, compute, callers=5):
+        results, errors = [], []
+        started = threading.Barrier(callers + 1)
+
+        def call():
+            started.wait()
+            try:
+                results.append(single_flight(key, compute))
+            except Exception as exc:
+                errors.append(exc)
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        # Let every caller reach the flight before the test releases it
+        time.sleep(0.1)
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_computation(self):
+        release, calls = threading.Event(), []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {"value": 42}
+
+        threads, results, errors = self._concurrently(flight_key('test', (1,)), compute)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 42}] * 5)
+        self.assertEqual(errors, [])
+        self.assertIsNone(cache.get(_LOCK_KEY.format(flight_key('test', (1,)))))
+
+    def test_failures_reach_every_waiter(self):
+        release = threading.Event()
+
+        def compute():
+            release.wait(5)
+            raise ValueError("boom")
+
+        threads, results, errors = self._concurrently(flight_key('failing'), compute, callers=3)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ["boom"] * 3)
+
+    def test_waits_for_the_worker_holding_the_lock(self):
+        key = flight_key('shared')
+        cache.add(_LOCK_KEY.format(key), 'other-worker', 60)
+        compute = mock.Mock(return_value='local')
+
+        threads, results, _ = self._concurrently(key, compute, callers=1)
+        cache.set(_RESULT_KEY.format(key, 'other-worker'), ('published',), 10)
+        threads[0].join(5)
+        self.assertEqual(results, ['published'])
+        compute.assert_not_called()
+
+    def test_computes_when_the_holder_goes_away(self):
+        key = flight_key('abandoned')
+        cache.add(_LOCK_KEY.format(key), 'other-worker', 60)
+
+        threads, results, _ = self._concurrently(key, lambda: 'local', callers=1)
+        cache.delete(_LOCK_KEY.format(key))
+        threads[0].join(5)
+        self.assertEqual(results, ['local'])
+
+    def test_waiting_backs_off_and_gives_up(self):
+        key = flight_key('stuck')
+        cache.add(_LOCK_KEY.format(key), 'other-worker', 60)
+        clock, sleeps = [0.0], []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        with mock.patch.object(singleflight.time, 'monotonic', lambda: clock[0]), \
+                mock.patch.object(singleflight.time, 'sleep', sleep):
+            self.assertIsNone(singleflight._await_other_worker(key, 'other-worker'))
+        self.assertAlmostEqual(sum(sleeps), singleflight.SINGLE_FLIGHT_WAIT)
+        self.assertLessEqual(max(sleeps), singleflight.MAX_POLL_INTERVAL)
+        self.assertLess(len(sleeps), 20)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_coalesces_in_worker_only(self):
+        key = flight_key('local')
+        # Another worker's LocMem "lock" is invisible here; never wait on one
+        cache.add(_LOCK_KEY.format(key), 'this-worker-only', 60)
+        with mock.patch('apps.analytics.shared_cache._warned', set()), \
+                self.assertLogs('apps.analytics.shared_cache', 'WARNING'):
+            self.assertEqual(single_flight(key, lambda: 'local'), 'local')
+
+    def test_parameters_are_part_of_the_key(self):
+        self.assertNotEqual(flight_key('x', (1,)), flight_key('x', (2,)))
+        self.assertEqual(flight_key('x', (), {'a': 1, 'b': 2}), flight_key('x', (), {'b': 2, 'a': 1}))
+
+
+class CoalescedEngineTests(TestCase):
+
+    def test_team_snapshot_runs_single_flight(self):
+        cache.clear()
+        with override_settings(ANALYTICS_SINGLE_FLIGHT=True), \
+                mock.patch('apps.analytics.singleflight.single_flight', wraps=single_flight) as flight:
+            snapshot = IntelligenceEngine.get_team_snapshot()
+        flight.assert_called_once()
+        self.assertIn('at_risk_count', snapshot)
@@ -5,7 +5,10 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from .intelligence import IntelligenceEngine
 from .cognitive_intelligence import LearnerIntelligenceEngine
+from .heatmaps import get_heatmap
 from .models import ManagerAction
+from .result_cache import cached_result
+from apps.modules.models import Resource
 
 User = get_user_model()
 
@@ -15,12 +18,18 @@ class ManagerAnalyticsViewSet(viewsets.ViewSet):
     def _is_manager(self, request):
         return request.user.is_staff or getattr(request.user, 'role', '') in ['manager', 'admin']
 
+    def _cached_response(self, endpoint, compute, learner_id=None):
+        payload, age, stale = cached_result(endpoint, compute, learner_id)
+        if isinstance(payload, dict):
+            payload = dict(payload, data_freshness_seconds=age, data_stale=stale)
+        return Response(payload, headers={'X-Data-Freshness-Seconds': str(age), 'X-Data-Stale': str(int(stale))})
+
     @action(detail=False, methods=['get'], url_path='team-summary')
     def team_summary(self, request):
         """Section 1: Team Activity Snapshot"""
         if not self._is_manager(request):
             return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
-        return Response(IntelligenceEngine.get_team_snapshot())
+        return self._cached_response('team-summary', IntelligenceEngine.get_team_snapshot)
 
     @action(detail=False, methods=['get'], url_path='learners')
     def learners_list(self, request):
@@ -29,8 +38,7 @@ class ManagerAnalyticsViewSet(viewsets.ViewSet):
             return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
         
         learners = User.objects.filter(is_staff=False, role='learner')
-        data = [IntelligenceEngine.get_learner_snapshot(l) for l in learners]
-        return Response(data)
+        return self._cached_response('learners', lambda: IntelligenceEngine.get_learner_snapshots(learners))
 
     @action(detail=True, methods=['get'], url_path='details')
     def learner_details(self, request, pk=None):
@@ -39,7 +47,7 @@ class ManagerAnalyticsViewSet(viewsets.ViewSet):
             return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
         
         learner = get_object_or_404(User, pk=pk)
-        return Response(IntelligenceEngine.get_learner_details(learner))
+        return self._cached_response('details', lambda: IntelligenceEngine.get_learner_details(learner), learner.pk)
 
     @action(detail=True, methods=['get'], url_path='risk')
     def learner_risk(self, request, pk=None):
@@ -48,7 +56,7 @@ class ManagerAnalyticsViewSet(viewsets.ViewSet):
             return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
         
         learner = get_object_or_404(User, pk=pk)
-        return Response(IntelligenceEngine.get_risk_assessment(learner))
+        return self._cached_response('risk', lambda: IntelligenceEngine.get_risk_assessment(learner), learner.pk)
 
     @action(detail=False, methods=['post'], url_path='record-action')
     def record_action(self, request):
@@ -71,6 +79,15 @@ class ManagerAnalyticsViewSet(viewsets.ViewSet):
         
         return Response({"status": "action_recorded", "id": action.id})
 
+    @action(detail=False, methods=['get'], url_path=r'resources/(?P<resource_id>\d+)/heatmap')
+    def resource_heatmap(self, request, resource_id=None):
+        """Per-segment viewer counts and drop-off point for one resource"""
+        if not self._is_manager(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
+
+        resource = get_object_or_404(Resource, pk=resource_id)
+        return Response(get_heatmap(resource.id))
+
     @action(detail=False, methods=['get'], url_path='intelligence-overview')
     def intelligence_overview(self, request):
         """
@@ -80,5 +97,4 @@ class ManagerAnalyticsViewSet(viewsets.ViewSet):
         if not self._is_manager(request):
             return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
         
-        overview = LearnerIntelligenceEngine.get_intelligence_overview()
-        return Response(overview)
+        return self._cached_response('intelligence-overview', LearnerIntelligenceEngine.get_intelligence_overview)
@@ -0,0 +1,211 @@
+"""
+Pulse Admission Control
+
+Bounds write volume by active learners rather than by client behaviour.
+Per worker, the last accepted pulse time is tracked per (user, resource):
+
+- a pulse arriving less than TELEMETRY_ADMISSION_MIN_INTERVAL seconds after
+  the last accepted one is held and merged into the next accepted pulse;
+- the focus credited by an accepted pulse is capped at the wall-clock time
+  elapsed since the previous acceptance (plus a little slack), and at
+  TELEMETRY_ADMISSION_MAX_DELTA for a pulse with no history;
+- completion pulses are never held.
+
+Held pulses whose interval has passed without a follow-up are released on
+the next admission call (by any user) or by a releaser thread that checks
+every TELEMETRY_ADMISSION_MIN_INTERVAL seconds, and every hold is released
+at interpreter exit. Their idempotency keys are already claimed, so a hold
+must always end up delivered: released pulses that fail to deliver are kept
+and retried ahead of the next release.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def merge_pulses(earlier, later):
+    """Combine two pulses for the same resource into one with the same net effect."""
+    merged = dict(later)
+    merged['duration_delta'] = earlier['duration_delta'] + later['duration_delta']
+    if later['watch_time'] is None and earlier['watch_time'] is not None:
+        # Absolute watch time followed by a delta
+        merged['watch_time'] = earlier['watch_time'] + later['duration_delta']
+    if later['last_position'] is None:
+        merged['last_position'] = earlier['last_position']
+    merged['completed'] = earlier['completed'] or later['completed']
+    return merged
+
+
+def cap_delta(pulse, limit):
+    """Limit the focus a pulse credits. Absolute watch time is left untouched."""
+    if pulse['duration_delta'] <= limit:
+        return pulse
+    capped = dict(pulse)
+    capped['duration_delta'] = max(0, int(limit))
+    return capped
+
+
+class _Slot:
+    __slots__ = ('user_id', 'accepted_at', 'held', 'held_at')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.accepted_at = None
+        self.held = None
+        self.held_at = None
+
+
+class AdmissionController:
+    """LRU of (user_id, resource_id) -> _Slot, bounded at `max_keys`."""
+
+    def __init__(self, min_interval, slack, max_delta, max_keys):
+        self.min_interval = min_interval
+        self.slack = slack
+        self.max_delta = max_delta
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()
+        self._due = deque()  # (release_at, key, held_at) in hold order
+
+    def _accept(self, slot, pulse, now):
+        if slot.held is not None:
+            pulse = merge_pulses(slot.held, pulse)
+            slot.held = slot.held_at = None
+        if slot.accepted_at is None:
+            limit = self.max_delta
+        else:
+            limit = min(now - slot.accepted_at + self.slack, self.max_delta)
+        slot.accepted_at = now
+        return cap_delta(pulse, limit)
+
+    def admit(self, user_id, pulses, now=None):
+        """
+        Returns (admitted pulses for `user_id`, {other_user_id: [released pulses]}).
+        Pulses neither admitted nor released are held.
+        """
+        now = time.monotonic() if now is None else now
+        admitted, released = [], {}
+        with self._lock:
+            for pulse in pulses:
+                key = (user_id, pulse['resource_id'])
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._slots[key] = _Slot(user_id)
+                else:
+                    self._slots.move_to_end(key)
+
+                recent = slot.accepted_at is not None and now - slot.accepted_at < self.min_interval
+                if recent and not pulse['completed']:
+                    if slot.held is None:
+                        slot.held, slot.held_at = pulse, now
+                        self._due.append((slot.accepted_at + self.min_interval, key, now))
+                    else:
+                        slot.held = merge_pulses(slot.held, pulse)
+                    continue
+                admitted.append(self._accept(slot, pulse, now))
+
+            self._release(now, user_id, admitted, released)
+        return admitted, released
+
+    def _release(self, now, user_id, admitted, released, force=False):
+        # Release holds whose interval passed with no follow-up pulse (all of them when forced)
+        while self._due and (force or self._due[0][0] <= now):
+            _, key, held_at = self._due.popleft()
+            slot = self._slots.get(key)
+            if slot is None or slot.held is None or slot.held_at != held_at:
+                continue  # Already merged into a later acceptance
+            pulse = self._accept(slot, slot.held, now)
+            target = admitted if slot.user_id == user_id else released.setdefault(slot.user_id, [])
+            target.append(pulse)
+
+        # Bound memory; an evicted hold is released rather than dropped
+        while len(self._slots) > self.max_keys:
+            _, slot = self._slots.popitem(last=False)
+            if slot.held is not None:
+                target = admitted if slot.user_id == user_id else released.setdefault(slot.user_id, [])
+                target.append(slot.held)
+
+    def release_due(self, now=None, force=False):
+        """Holds due for release (every hold when forced) as {user_id: [pulses]}."""
+        now = time.monotonic() if now is None else now
+        released = {}
+        with self._lock:
+            self._release(now, None, [], released, force)
+        return released
+
+
+_controller = None
+_controller_lock = threading.Lock()
+_exit_hook_registered = False
+# Released pulses whose delivery failed, {user_id: [pulse, ...]}, oldest first
+_undelivered = {}
+_undelivered_lock = threading.Lock()
+
+
+def get_admission():
+    """Process-wide AdmissionController, with its releaser thread and exit hook."""
+    global _controller, _exit_hook_registered
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                controller = AdmissionController(
+                    min_interval=settings.TELEMETRY_ADMISSION_MIN_INTERVAL,
+                    slack=settings.TELEMETRY_ADMISSION_SLACK,
+                    max_delta=settings.TELEMETRY_ADMISSION_MAX_DELTA,
+                    max_keys=settings.TELEMETRY_ADMISSION_MAX_KEYS,
+                )
+                threading.Thread(
+                    target=_release_loop, args=(controller,), name='pulse-admission', daemon=True,
+                ).start()
+                if not _exit_hook_registered:
+                    atexit.register(release_held, force=True)
+                    _exit_hook_registered = True
+                _controller = controller
+    return _controller
+
+
+def release_held(force=False):
+    """Deliver holds that are due (every hold when forced). Returns the number of pulses delivered."""
+    controller = _controller
+    with _undelivered_lock:
+        batches = dict(_undelivered)
+        _undelivered.clear()
+    if controller is not None:
+        for user_id, pulses in controller.release_due(force=force).items():
+            batches[user_id] = batches.get(user_id, []) + pulses
+    if not batches:
+        return 0
+
+    from .spool import spool_mode
+    from .telemetry import deliver_pulses
+    try:
+        deliver_pulses(batches, spool_mode())
+    except Exception:
+        logger.exception("[Telemetry] Releasing held pulses failed; retrying on the next release")
+        with _undelivered_lock:
+            for user_id, pulses in batches.items():
+                _undelivered[user_id] = pulses + _undelivered.get(user_id, [])
+        return 0
+    return sum(len(pulses) for pulses in batches.values())
+
+
+def _release_loop(controller):
+    from django.db import close_old_connections
+    # Runs until the controller is replaced
+    while True:
+        time.sleep(controller.min_interval)
+        if _controller is not controller:
+            return
+        release_held()
+        close_old_connections()
+
+
+def admission_enabled():
+    return getattr(settings, 'TELEMETRY_ADMISSION', False)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class ModulesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.modules'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,96 @@
+"""
+Beacon Intake
+
+navigator.sendBeacon cannot set headers and fires while the tab is closing,
+so the final pulse arrives as a text/plain POST with the access token in the
+body. Parsing here is deliberately minimal: no DRF parsers or serializers;
+the token signature is checked, one query confirms its user still exists
+and is active (as JWTAuthentication does), and the pulses go through
+normalize_pulse into the normal apply_pulses pipeline.
+
+Payload (UTF-8, newline separated):
+    line 1   JWT access token
+    line 2+  one pulse per line, either a JSON object with the usual pulse
+             fields or the compact form
+             module_id,resource_id,duration_delta,watch_time,last_position,completed,idempotency_key
+             where trailing or empty fields mean "not sent".
+"""
+
+import json
+
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .telemetry import MAX_BATCH_PULSES, InvalidPulse, normalize_pulse
+
+# sendBeacon payloads are capped at 64KB by browsers
+MAX_BEACON_BYTES = 64 * 1024
+
+COMPACT_FIELDS = (
+    'module_id', 'resource_id', 'duration_delta', 'watch_time', 'last_position', 'completed', 'idempotency_key',
+)
+
+
+class InvalidBeacon(ValueError):
+    """Raised when a beacon payload is malformed."""
+
+
+class BeaconAuthError(InvalidBeacon):
+    """Raised when the beacon token is missing, invalid or expired."""
+
+
+def authenticate_token(raw):
+    """Verify an access token and return the primary key of its active user."""
+    try:
+        token = AccessToken(raw)
+    except TokenError as exc:
+        raise BeaconAuthError(str(exc))
+    try:
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise BeaconAuthError("Token contained no recognizable user identification")
+    # Deactivated or deleted users keep valid tokens until they expire
+    pk = get_user_model().objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id, 'is_active': True},
+    ).values_list('pk', flat=True).first()
+    if pk is None:
+        raise BeaconAuthError("User not found or inactive")
+    return pk
+
+
+def _parse_line(line):
+    if line.startswith('{'):
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise InvalidPulse("Malformed JSON pulse")
+    values = line.split(',')
+    if len(values) > len(COMPACT_FIELDS):
+        raise InvalidPulse("Too many fields in compact pulse")
+    return {field: value for field, value in zip(COMPACT_FIELDS, values) if value != ''}
+
+
+def parse_beacon(body):
+    """Returns (user_id, [normalized pulse, ...])."""
+    if len(body) > MAX_BEACON_BYTES:
+        raise InvalidBeacon("Payload too large")
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        raise InvalidBeacon("Payload must be UTF-8")
+
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    if not lines:
+        raise BeaconAuthError("Missing token")
+
+    user_id = authenticate_token(lines[0])
+    if not 0 < len(lines) - 1 <= MAX_BATCH_PULSES:
+        raise InvalidBeacon(f"Expected between 1 and {MAX_BATCH_PULSES} pulses")
+    try:
+        pulses = [normalize_pulse(_parse_line(line)) for line in lines[1:]]
+    except InvalidPulse as exc:
+        raise InvalidBeacon(str(exc))
+    return user_id, pulses
@@ -0,0 +1,259 @@
+"""
+Write-Behind Pulse Buffer
+
+When TELEMETRY_WRITE_BEHIND is enabled, heartbeat pulses are coalesced in
+memory per (user, resource) and per user session, then flushed to the
+database in bulk once the buffer holds TELEMETRY_BUFFER_MAX_KEYS entries or
+TELEMETRY_BUFFER_FLUSH_SECONDS have elapsed. Thousands of tiny UPDATEs per
+minute become a handful of bulk writes through telemetry.apply_pending.
+
+The backend is pluggable via TELEMETRY_BUFFER_BACKEND. LocalPulseBuffer keeps
+state in-process; a shared-store backend (e.g. Redis) only has to implement
+the PulseBuffer contract below.
+"""
+
+import abc
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .telemetry import PendingProgress, apply_pending, fold_pulses
+
+logger = logging.getLogger(__name__)
+
+# How long the exit flush waits for a flush already in progress
+SHUTDOWN_FLUSH_SECONDS = 30
+
+
+class PulseBuffer(abc.ABC):
+    """
+    Contract for buffer backends.
+
+    `pending` maps (user_id, resource_id) -> PendingProgress and `focus` maps
+    user_id -> unflushed focus seconds.
+    """
+
+    @abc.abstractmethod
+    def add(self, pending, focus):
+        """Merge newer state into the buffer. Returns the number of buffered keys."""
+
+    @abc.abstractmethod
+    def take(self, keys):
+        """Remove and return the buffered PendingProgress for the given keys."""
+
+    @abc.abstractmethod
+    def drain(self):
+        """Remove and return everything buffered as (pending, focus)."""
+
+    @abc.abstractmethod
+    def restore(self, pending, focus):
+        """Put back state that failed to flush; it is older than anything buffered since."""
+
+    @abc.abstractmethod
+    def peek_progress(self, user_id, resource_ids):
+        """Unflushed PendingProgress per resource for one user (read path)."""
+
+    @abc.abstractmethod
+    def peek_focus(self, user_ids=None):
+        """Unflushed focus seconds per user (read path). None means every user."""
+
+
+class LocalPulseBuffer(PulseBuffer):
+    """In-process buffer. Each worker flushes its own state."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._focus = {}
+
+    def add(self, pending, focus):
+        with self._lock:
+            for key, state in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = state
+                else:
+                    current.merge(state)
+            for user_id, seconds in focus.items():
+                self._focus[user_id] = self._focus.get(user_id, 0) + seconds
+            return len(self._pending) + len(self._focus)
+
+    def take(self, keys):
+        with self._lock:
+            return {key: self._pending.pop(key) for key in keys if key in self._pending}
+
+    def drain(self):
+        with self._lock:
+            pending, focus = self._pending, self._focus
+            self._pending, self._focus = {}, {}
+        return pending, focus
+
+    def restore(self, pending, focus):
+        with self._lock:
+            for key, newer in self._pending.items():
+                if key in pending:
+                    pending[key].merge(newer)
+            for key, state in pending.items():
+                self._pending[key] = state
+            for user_id, seconds in focus.items():
+                self._focus[user_id] = self._focus.get(user_id, 0) + seconds
+
+    def peek_progress(self, user_id, resource_ids):
+        with self._lock:
+            found = {}
+            for resource_id in resource_ids:
+                state = self._pending.get((user_id, resource_id))
+                if state is not None:
+                    copy = PendingProgress(state.module_id)
+                    copy.merge(state)
+                    found[resource_id] = copy
+            return found
+
+    def peek_focus(self, user_ids=None):
+        with self._lock:
+            if user_ids is None:
+                return dict(self._focus)
+            return {u: self._focus[u] for u in user_ids if u in self._focus}
+
+
+class WriteBehind:
+    """
+    Coordinates a PulseBuffer with its flush policy: size threshold,
+    time threshold (checked on every write and by an idle flusher thread)
+    and a final flush on interpreter shutdown.
+    """
+
+    def __init__(self, backend, max_keys, flush_seconds):
+        self.backend = backend
+        self.max_keys = max_keys
+        self.flush_seconds = flush_seconds
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+        # Resources already known to be completed can be buffered even when a pulse says completed=True
+        self._known_completed = set()
+        self._flusher = None
+
+    def submit(self, user_id, pulses):
+        """
+        Buffer pulses for one user. Pulses that newly complete a resource are
+        applied immediately (together with that resource's buffered state) so
+        module status changes are never delayed.
+        Returns {resource_id: outcome} for the pulses applied synchronously.
+        """
+        pending, focus = fold_pulses(user_id, pulses)
+        urgent = [key for key, state in pending.items() if state.completed and key not in self._known_completed]
+
+        outcomes = {}
+        if urgent:
+            direct = self.backend.take(urgent)
+            for key in urgent:
+                state = pending.pop(key)
+                if key in direct:
+                    direct[key].merge(state)
+                else:
+                    direct[key] = state
+            direct_focus = {user_id: focus.pop(user_id)} if user_id in focus else {}
+            outcomes = apply_pending(direct, direct_focus)
+            self._remember_completed(outcomes)
+
+        size = self.backend.add(pending, focus) if (pending or focus) else 0
+        if size >= self.max_keys or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+        self._ensure_flusher()
+        return {resource_id: outcome for (_, resource_id), outcome in outcomes.items()}
+
+    def flush(self, timeout=None):
+        """
+        Apply everything buffered in one bulk write. Safe to call concurrently:
+        by default a flush already in progress makes this a no-op; with a
+        timeout it waits up to that many seconds for it, then flushes what
+        was buffered since.
+        """
+        if timeout is None:
+            acquired = self._flush_lock.acquire(blocking=False)
+        else:
+            acquired = self._flush_lock.acquire(timeout=timeout)
+            if not acquired:
+                logger.warning("[Telemetry] Write-behind flush still running after %ss; not flushed", timeout)
+        if not acquired:
+            return 0
+        try:
+            self._last_flush = time.monotonic()
+            pending, focus = self.backend.drain()
+            if not pending and not focus:
+                return 0
+            try:
+                outcomes = apply_pending(pending, focus)
+            except Exception:
+                logger.exception("[Telemetry] Write-behind flush failed; retaining %d entries", len(pending))
+                self.backend.restore(pending, focus)
+                return 0
+            self._remember_completed(outcomes)
+            return len(pending)
+        finally:
+            self._flush_lock.release()
+
+    def shutdown(self):
+        """Final flush at exit: waits for an in-flight flush rather than skipping it."""
+        return self.flush(timeout=SHUTDOWN_FLUSH_SECONDS)
+
+    def _remember_completed(self, outcomes):
+        if len(self._known_completed) > self.max_keys * 20:
+            self._known_completed.clear()
+        self._known_completed.update(key for key, outcome in outcomes.items() if outcome['resource_completed'])
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='pulse-write-behind', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        from django.db import close_old_connections
+        while True:
+            time.sleep(self.flush_seconds)
+            if time.monotonic() - self._last_flush >= self.flush_seconds:
+                self.flush()
+                close_old_connections()
+
+
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind():
+    """Process-wide WriteBehind, created on first use and flushed at exit."""
+    global _write_behind
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                backend = import_string(settings.TELEMETRY_BUFFER_BACKEND)()
+                _write_behind = WriteBehind(
+                    backend,
+                    max_keys=settings.TELEMETRY_BUFFER_MAX_KEYS,
+                    flush_seconds=settings.TELEMETRY_BUFFER_FLUSH_SECONDS,
+                )
+                atexit.register(_write_behind.shutdown)
+    return _write_behind
+
+
+def write_behind_enabled():
+    return getattr(settings, 'TELEMETRY_WRITE_BEHIND', False)
+
+
+def unflushed_progress(user_id, resource_ids):
+    """Read path: buffered PendingProgress per resource (empty when write-behind is off)."""
+    if not write_behind_enabled() or _write_behind is None:
+        return {}
+    return _write_behind.backend.peek_progress(user_id, resource_ids)
+
+
+def unflushed_focus(user_ids=None):
+    """Read path: buffered focus seconds per user (empty when write-behind is off)."""
+    if not write_behind_enabled() or _write_behind is None:
+        return {}
+    return _write_behind.backend.peek_focus(user_ids)
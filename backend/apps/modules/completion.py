@@ -0,0 +1,273 @@
+"""
+Module Completion Rules
+
+A module is complete when every resource is completed, the quiz is passed
+(if the module has one) and an assignment submission exists (if the module
+requires one). ModuleProgress stores that state denormalized
+(completed_resources, quiz_passed, assignment_submitted) so the check is O(1);
+the helpers here keep those counters in sync with the source tables.
+
+evaluate_completion re-derives counters and completion from the source
+tables for many (user, module) pairs at once, for repairs, imports and
+backfills: a handful of grouped queries and bulk updates per chunk.
+
+Module requirements change only when the curriculum is edited, so they are
+cached per process (RequirementsCache) and invalidated by signals. The
+invalidation reaches other workers only through a shared Django cache.
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.analytics.shared_cache import cache_is_shared, warn_process_local
+
+from .models import Module, ModuleProgress, ResourceProgress
+
+COUNTER_FIELDS = ['completed_resources', 'quiz_passed', 'assignment_submitted']
+
+
+def load_requirements(module_ids):
+    """{module_id: {"total_resources", "has_quiz", "has_assignment"}} in one query."""
+    rows = Module.objects.filter(id__in=module_ids).annotate(total_resources=Count('resources')).values(
+        'id', 'total_resources', 'has_quiz', 'has_assignment',
+    )
+    return {row.pop('id'): row for row in rows}
+
+
+class RequirementsCache:
+    """
+    In-process cache of load_requirements. Entries are tagged with a version
+    token kept in the Django cache; editing a Module, Resource or Quiz bumps
+    the token (after commit). With a shared cache backend every worker sees
+    the bump and reloads on its next lookup. With a process-local backend
+    (LocMem, the default) other workers never would, so lookups go straight
+    to the database instead.
+
+    Entries also expire after MAX_AGE seconds, which bounds how long edits
+    that bypass the signals (queryset.update, raw SQL) stay invisible.
+    A lookup costs one cache read; only missing or stale modules hit the database.
+    """
+
+    VERSION_KEY = 'lms:module-requirements-version'
+    MAX_AGE = 300
+
+    def __init__(self):
+        self._entries = {}  # module_id -> (version, loaded_at, requirements)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _version(self):
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            # Cache flushed or first start: nothing cached locally can be trusted
+            version = time.time_ns()
+            cache.add(self.VERSION_KEY, version, None)
+            version = cache.get(self.VERSION_KEY, version)
+        return version
+
+    def get_many(self, module_ids):
+        module_ids = set(module_ids)
+        if not cache_is_shared():
+            warn_process_local('Module requirements cache')
+            with self._lock:
+                self.misses += len(module_ids)
+            return load_requirements(module_ids)
+
+        version = self._version()
+        oldest = time.monotonic() - self.MAX_AGE
+        found, missing = {}, set()
+        for module_id in module_ids:
+            entry = self._entries.get(module_id)
+            if entry is not None and entry[0] == version and entry[1] >= oldest:
+                found[module_id] = entry[2]
+            else:
+                missing.add(module_id)
+        if missing:
+            loaded = load_requirements(missing)
+            loaded_at = time.monotonic()
+            with self._lock:
+                for module_id, requirements in loaded.items():
+                    self._entries[module_id] = (version, loaded_at, requirements)
+            found.update(loaded)
+        with self._lock:
+            self.hits += len(module_ids) - len(missing)
+            self.misses += len(missing)
+        return found
+
+    def invalidate(self, module_ids=None):
+        """Drop local entries now and bump the shared version once the transaction commits."""
+        with self._lock:
+            if module_ids is None:
+                self._entries.clear()
+            else:
+                for module_id in module_ids:
+                    self._entries.pop(module_id, None)
+        transaction.on_commit(lambda: cache.set(self.VERSION_KEY, time.time_ns(), None))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+requirements_cache = RequirementsCache()
+
+
+def module_requirements(module_ids):
+    """{module_id: {"total_resources", "has_quiz", "has_assignment"}}, served from the requirements cache."""
+    return requirements_cache.get_many(module_ids)
+
+
+def requirements_cache_stats():
+    """Hit/miss counters of this process' requirements cache."""
+    return requirements_cache.stats()
+
+
+def requirements_met(progress, requirements):
+    """O(1): compare a ModuleProgress' counters against its module's requirements."""
+    total = requirements['total_resources']
+    if total and progress.completed_resources < total:
+        return False
+    if requirements['has_quiz'] and not progress.quiz_passed:
+        return False
+    if requirements['has_assignment'] and not progress.assignment_submitted:
+        return False
+    return True
+
+
+def count_completion_state(pairs):
+    """
+    Recount counters from the source tables for (user_id, module_id) pairs.
+    Returns {(user_id, module_id): (completed_resources, quiz_passed, assignment_submitted)}.
+    """
+    from apps.quiz.models import QuizAttempt
+    from apps.assignments.models import Submission
+
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    user_ids = {u for u, _ in pairs}
+    module_ids = {m for _, m in pairs}
+
+    done = {
+        (u, m): n for u, m, n in ResourceProgress.objects.filter(
+            user_id__in=user_ids, resource__module_id__in=module_ids, completed=True,
+        ).values('user_id', 'resource__module_id').annotate(n=Count('id'))
+        .values_list('user_id', 'resource__module_id', 'n')
+    }
+    passed = set(QuizAttempt.objects.filter(
+        user_id__in=user_ids, quiz__module_id__in=module_ids, passed=True,
+    ).values_list('user_id', 'quiz__module_id').distinct())
+    submitted = set(Submission.objects.filter(
+        assignment__user_id__in=user_ids, assignment__module_id__in=module_ids,
+    ).values_list('assignment__user_id', 'assignment__module_id').distinct())
+
+    return {pair: (done.get(pair, 0), pair in passed, pair in submitted) for pair in pairs}
+
+
+def refresh_counters(rows):
+    """Recount and persist the counters of ModuleProgress rows in bulk."""
+    rows = list(rows)
+    if not rows:
+        return rows
+    state = count_completion_state((r.user_id, r.module_id) for r in rows)
+    for row in rows:
+        row.completed_resources, row.quiz_passed, row.assignment_submitted = state[(row.user_id, row.module_id)]
+    ModuleProgress.objects.bulk_update(rows, COUNTER_FIELDS)
+    return rows
+
+
+def mark_completed(rows, now=None):
+    """Flip rows to completed and sync the matching Assignment records."""
+    from apps.analytics.result_cache import invalidate as invalidate_results
+    from apps.assignments.models import Assignment
+
+    rows = [r for r in rows if r.status != 'completed']
+    if not rows:
+        return
+    now = now or timezone.now()
+    ModuleProgress.objects.filter(pk__in=[r.pk for r in rows]).exclude(status='completed').update(
+        status='completed', completed_at=now,
+    )
+    # Sync with Assignment model if exists (auto-enrolled learners too)
+    pairs = {(r.user_id, r.module_id) for r in rows}
+    assignment_ids = [
+        pk for pk, user_id, module_id in Assignment.objects.filter(
+            user_id__in={u for u, _ in pairs}, module_id__in={m for _, m in pairs},
+        ).values_list('pk', 'user_id', 'module_id')
+        if (user_id, module_id) in pairs
+    ]
+    Assignment.objects.filter(pk__in=assignment_ids).update(status='completed', completed_at=now)
+    invalidate_results({user_id for user_id, _ in pairs})
+    for row in rows:
+        row.status = 'completed'
+        row.completed_at = now
+
+
+def complete_if_met(rows, now=None):
+    """O(1) per row check plus one requirements query; completes rows that qualify."""
+    rows = [r for r in rows if r.status != 'completed']
+    if not rows:
+        return
+    requirements = module_requirements({r.module_id for r in rows})
+    mark_completed([r for r in rows if requirements_met(r, requirements[r.module_id])], now)
+
+
+def _evaluate_chunk(rows, apply, now):
+    state = count_completion_state((r.user_id, r.module_id) for r in rows)
+    requirements = module_requirements({r.module_id for r in rows})
+
+    stale, completing = [], []
+    for row in rows:
+        counters = state[(row.user_id, row.module_id)]
+        if counters != (row.completed_resources, row.quiz_passed, row.assignment_submitted):
+            row.completed_resources, row.quiz_passed, row.assignment_submitted = counters
+            stale.append(row)
+        # Completion is monotonic, as in check_completion: rows are never un-completed
+        if row.status != 'completed' and requirements_met(row, requirements[row.module_id]):
+            completing.append(row)
+
+    if apply:
+        with transaction.atomic():
+            ModuleProgress.objects.bulk_update(stale, COUNTER_FIELDS)
+            mark_completed(completing, now)
+    return len(stale), len(completing), len({r.pk for r in stale} | {r.pk for r in completing})
+
+
+def evaluate_completion(pairs='all', apply=True, batch_size=2000):
+    """
+    Recount and complete ModuleProgress rows for (user_id, module_id) pairs,
+    or every row with pairs='all'. Pairs without a ModuleProgress row are skipped.
+    Each chunk costs a constant number of queries. With apply=False nothing is
+    written (dry run).
+    Returns {"evaluated", "counters_updated", "completed", "changed"}; changed
+    counts rows with stale counters, a missed completion or both.
+    """
+    rows = ModuleProgress.objects.only(
+        'id', 'user_id', 'module_id', 'status', *COUNTER_FIELDS,
+    ).order_by('pk')
+    if pairs != 'all':
+        pairs = set(pairs)
+        if not pairs:
+            return {"evaluated": 0, "counters_updated": 0, "completed": 0, "changed": 0}
+        rows = rows.filter(user_id__in={u for u, _ in pairs}, module_id__in={m for _, m in pairs})
+
+    now = timezone.now()
+    totals = {"evaluated": 0, "counters_updated": 0, "completed": 0, "changed": 0}
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            return totals
+        last_pk = chunk[-1].pk
+        if pairs != 'all':
+            chunk = [r for r in chunk if (r.user_id, r.module_id) in pairs]
+        updated, completed, changed = _evaluate_chunk(chunk, apply, now) if chunk else (0, 0, 0)
+        totals["evaluated"] += len(chunk)
+        totals["counters_updated"] += updated
+        totals["completed"] += completed
+        totals["changed"] += changed
@@ -0,0 +1,80 @@
+"""
+Watched Coverage Bitmaps
+
+ResourceProgress.coverage records which parts of a resource were actually
+watched: one bit per SEGMENT_SECONDS segment, packed little-endian into a
+bytes field (bit i = byte i // 8, bit i % 8). A pulse reporting
+last_position and duration_delta covers [last_position - delta, last_position),
+and bitmaps merge with bitwise OR, so replaying the same minute adds nothing.
+
+In memory a bitmap is a Python int, so folding pulses and merging is a
+single OR; the stored size is bounded by MAX_SEGMENTS bits per resource.
+"""
+
+SEGMENT_SECONDS = 5
+# 6 hours of media per resource, at most 540 bytes
+MAX_SEGMENTS = 6 * 3600 // SEGMENT_SECONDS
+
+
+def segment_mask(start, end):
+    """Bits for the segments overlapping [start, end) seconds (0 for an empty range)."""
+    start = max(0, start)
+    end = min(end, MAX_SEGMENTS * SEGMENT_SECONDS)
+    if end <= start:
+        return 0
+    first = start // SEGMENT_SECONDS
+    last = (end - 1) // SEGMENT_SECONDS
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def pulse_mask(pulse):
+    """Coverage reported by one pulse: the delta seconds ending at its position."""
+    if pulse['last_position'] is None or not pulse['duration_delta']:
+        return 0
+    return segment_mask(pulse['last_position'] - pulse['duration_delta'], pulse['last_position'])
+
+
+def to_mask(bitmap):
+    return int.from_bytes(bytes(bitmap or b''), 'little')
+
+
+def to_bitmap(mask):
+    return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+
+def merge(bitmap, mask):
+    """OR a mask into a stored bitmap. Returns the new bitmap."""
+    return to_bitmap(to_mask(bitmap) | mask)
+
+
+def covered_seconds(bitmap):
+    return to_mask(bitmap).bit_count() * SEGMENT_SECONDS
+
+
+def coverage_ratio(bitmap, duration_seconds):
+    """Share of [0, duration_seconds) watched, 0.0 - 1.0."""
+    if duration_seconds <= 0:
+        return 0.0
+    span = segment_mask(0, duration_seconds)
+    return (to_mask(bitmap) & span).bit_count() / span.bit_count()
+
+
+def is_covered(bitmap, start, end):
+    """True when every segment of [start, end) was watched."""
+    span = segment_mask(start, end)
+    return to_mask(bitmap) & span == span
+
+
+def covered_ranges(bitmap):
+    """Watched ranges as [(start_seconds, end_seconds), ...]."""
+    mask = to_mask(bitmap)
+    ranges, segment = [], 0
+    while mask:
+        skip = (mask & -mask).bit_length() - 1
+        mask >>= skip
+        segment += skip
+        run = (~mask & (mask + 1)).bit_length() - 1
+        ranges.append((segment * SEGMENT_SECONDS, (segment + run) * SEGMENT_SECONDS))
+        mask >>= run
+        segment += run
+    return ranges
@@ -0,0 +1,132 @@
+"""
+Pulse Deduplication
+
+Clients stamp each pulse with an idempotency key (`idempotency_key`, or the
+`_trace` timestamp Telemetry.track already sends, which a retry resends
+unchanged). Seen keys are claimed with cache.add in the shared Django cache,
+so a retry routed to another gunicorn worker is still dropped. With a
+process-local cache (the LocMem default) they fall back to a per-worker
+time-expiring LRU, and only retries reaching the same worker are caught.
+Neither touches the database.
+
+Keys are claimed before a pulse is applied and released if applying fails,
+so a retry after a failed write is still accepted.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.analytics.shared_cache import cache_is_shared, warn_process_local
+
+
+class ExpiringKeySet:
+    """
+    Bounded set of keys that expire `ttl` seconds after insertion.
+
+    Entries live in insertion order, which with a fixed TTL is also expiry
+    order, so expiring and evicting only ever pop from the front.
+    """
+
+    def __init__(self, ttl, max_keys):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> expires_at (monotonic)
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            key, expires_at = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            entries.popitem(last=False)
+
+    def claim(self, key):
+        """Add `key`. Returns False if it was already present (a duplicate)."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._entries:
+                return False
+            self._entries[key] = now + self.ttl
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            return True
+
+    def release(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedKeySet:
+    """ExpiringKeySet's claim/release held in the shared cache, visible to every worker."""
+
+    PREFIX = 'lms:pulse-seen:'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def _cache_key(self, key):
+        # Client tokens are arbitrary strings; hash them into a backend-safe key
+        return self.PREFIX + hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def claim(self, key):
+        return cache.add(self._cache_key(key), 1, self.ttl)
+
+    def release(self, keys):
+        cache.delete_many([self._cache_key(key) for key in keys])
+
+
+_seen = None
+_seen_lock = threading.Lock()
+
+
+def get_seen_pulses():
+    if cache_is_shared():
+        return SharedKeySet(settings.TELEMETRY_DEDUPE_TTL_SECONDS)
+    warn_process_local('Pulse dedupe')
+    global _seen
+    if _seen is None:
+        with _seen_lock:
+            if _seen is None:
+                _seen = ExpiringKeySet(
+                    ttl=settings.TELEMETRY_DEDUPE_TTL_SECONDS,
+                    max_keys=settings.TELEMETRY_DEDUPE_MAX_KEYS,
+                )
+    return _seen
+
+
+def claim_pulses(user_id, pulses):
+    """
+    Split pulses into (fresh, duplicate_indexes, claimed_keys). Pulses without
+    a key are always fresh; a key repeated within the same batch counts as a
+    duplicate of its first occurrence.
+    """
+    seen = get_seen_pulses()
+    fresh, duplicates, claimed = [], [], []
+    for index, pulse in enumerate(pulses):
+        token = pulse.get('idempotency_key')
+        if token is None:
+            fresh.append(pulse)
+            continue
+        key = (user_id, pulse['resource_id'], token)
+        if seen.claim(key):
+            fresh.append(pulse)
+            claimed.append(key)
+        else:
+            duplicates.append(index)
+    return fresh, duplicates, claimed
+
+
+def release_pulses(claimed):
+    if claimed:
+        get_seen_pulses().release(claimed)
@@ -0,0 +1,147 @@
+"""
+Telemetry Event Log
+
+With TELEMETRY_EVENT_LOG='ingest', heartbeat ingestion only appends
+TelemetryEvent rows (one bulk INSERT per request) and never touches the
+mutable progress tables. `rollup()` folds events not yet `applied`, in id
+order, into ResourceProgress / ModuleProgress / LearningSession through the
+same apply_pending path the direct writes use, and flags them `applied` in
+the same transaction. Selecting on the flag rather than an id high-water
+mark means an event whose insert commits late (after rows with higher ids
+were rolled up) is still picked up by the next rollup.
+
+With 'record', events are still appended but flagged `applied`, since the
+direct path has already written them; the log is then history only.
+
+`sessionized` is the same kind of marker for sessionization.py: events are
+inserted with it set while the write path credits sessions inline, and
+left clear for `manage.py sessionize_telemetry` otherwise.
+
+Events are bucketed by `day` so old buckets can be pruned wholesale once
+the rollup has passed them, and aggregates such as focus time can be
+recomputed from the log instead of from mutable rows.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.analytics.models import TelemetryCursor, TelemetryEvent
+from apps.analytics.sessionization import inline_sessions_enabled
+from .telemetry import apply_pending, fold_pulses
+
+ROLLUP_CURSOR = 'rollup'
+
+
+def event_log_mode():
+    return getattr(settings, 'TELEMETRY_EVENT_LOG', 'off')
+
+
+def record_events(user_id, pulses, applied, now=None):
+    """Append accepted pulses for one user in a single bulk INSERT."""
+    now = now or timezone.now()
+    sessionized = inline_sessions_enabled()
+    events = []
+    for pulse in pulses:
+        occurred_at = pulse.get('occurred_at') or now
+        events.append(TelemetryEvent(
+            user_id=user_id,
+            module_id=pulse['module_id'],
+            resource_id=pulse['resource_id'],
+            day=timezone.localdate(occurred_at),
+            occurred_at=occurred_at,
+            duration_delta=pulse['duration_delta'],
+            watch_time=pulse['watch_time'],
+            last_position=pulse['last_position'],
+            completed=pulse['completed'],
+            applied=applied,
+            sessionized=sessionized,
+        ))
+    TelemetryEvent.objects.bulk_create(events)
+    return len(events)
+
+
+def _as_pulse(event):
+    return {
+        'module_id': event.module_id,
+        'resource_id': event.resource_id,
+        'duration_delta': event.duration_delta,
+        'watch_time': event.watch_time,
+        'last_position': event.last_position,
+        'completed': event.completed,
+    }
+
+
+def rollup(batch_size=5000, lag_seconds=None):
+    """
+    Fold the next batch of unapplied events into the progress tables.
+
+    Only events received at least `lag_seconds` ago are taken, so a batch
+    mostly sees concurrent inserts in their id order; late commits are
+    applied by a later rollup either way. Concurrent rollups serialize on
+    the cursor row, which also records the highest id applied.
+    Returns the number of events consumed.
+    """
+    if lag_seconds is None:
+        lag_seconds = settings.TELEMETRY_ROLLUP_LAG_SECONDS
+    now = timezone.now()
+
+    with transaction.atomic():
+        cursor, _ = TelemetryCursor.objects.get_or_create(name=ROLLUP_CURSOR)
+        cursor = TelemetryCursor.objects.select_for_update().get(pk=cursor.pk)
+
+        events = list(
+            TelemetryEvent.objects.filter(
+                applied=False, received_at__lte=now - timedelta(seconds=lag_seconds),
+            ).order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        # 1. Fold per user in log order
+        pending, focus = {}, {}
+        for event in events:
+            fold_pulses(event.user_id, [_as_pulse(event)], pending, focus)
+
+        # 2. One bulk apply for the whole batch, flagged in the same transaction
+        apply_pending(pending, focus, now)
+        TelemetryEvent.objects.filter(pk__in=[e.pk for e in events]).update(applied=True)
+
+        cursor.position = max(cursor.position, events[-1].id)
+        cursor.save(update_fields=['position', 'updated_at'])
+    return len(events)
+
+
+def rollup_all(batch_size=5000, lag_seconds=None):
+    """Drain the log up to the lag horizon. Returns the number of events consumed."""
+    total = 0
+    while True:
+        consumed = rollup(batch_size, lag_seconds)
+        total += consumed
+        if consumed < batch_size:
+            return total
+
+
+def prune_events(keep_days):
+    """Delete day buckets older than `keep_days`; events not yet applied or sessionized are kept."""
+    cutoff = timezone.localdate() - timedelta(days=keep_days)
+    deleted, _ = TelemetryEvent.objects.filter(day__lt=cutoff, applied=True, sessionized=True).delete()
+    return deleted
+
+
+def focus_by_user(since, until=None, user_ids=None, user_range=None):
+    """
+    Focus seconds per user recomputed from the log rather than from LearningSession.
+    `user_range` is a (first_id, last_id_exclusive) shard, filtered as bounds, not an IN list.
+    """
+    events = TelemetryEvent.objects.filter(day__gte=timezone.localdate(since), occurred_at__gte=since)
+    if until is not None:
+        events = events.filter(occurred_at__lt=until)
+    if user_ids is not None:
+        events = events.filter(user_id__in=user_ids)
+    if user_range is not None:
+        events = events.filter(user_id__gte=user_range[0], user_id__lt=user_range[1])
+    return dict(events.values('user_id').annotate(total=Sum('duration_delta')).values_list('user_id', 'total'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.modules.completion import evaluate_completion
+from apps.modules.models import ModuleProgress
+
+
+class Command(BaseCommand):
+    help = 'Re-derives completion counters and status for module progress rows in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Evaluate every ModuleProgress row')
+        parser.add_argument('--user', type=int, action='append', default=[], help='Limit to these user ids')
+        parser.add_argument('--module', type=int, action='append', default=[], help='Limit to these module ids')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows evaluated per chunk')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            pairs = 'all'
+        elif options['user'] or options['module']:
+            rows = ModuleProgress.objects.all()
+            if options['user']:
+                rows = rows.filter(user_id__in=options['user'])
+            if options['module']:
+                rows = rows.filter(module_id__in=options['module'])
+            pairs = set(rows.values_list('user_id', 'module_id'))
+        else:
+            raise CommandError('Pass --all or at least one --user / --module')
+
+        result = evaluate_completion(pairs, apply=not options['dry_run'], batch_size=options['batch_size'])
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(
+            f"[Completion] Evaluated {result['evaluated']} rows. {verb} counters on {result['counters_updated']}, "
+            f"completing {result['completed']}"
+        )
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Completion Evaluation Complete ---'))
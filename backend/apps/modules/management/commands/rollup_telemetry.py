@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.modules.eventlog import prune_events, rollup_all
+
+
+class Command(BaseCommand):
+    help = 'Folds the append-only telemetry event log into progress, module and session tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Events applied per transaction')
+        parser.add_argument('--lag', type=float, default=settings.TELEMETRY_ROLLUP_LAG_SECONDS,
+                            help='Only roll up events received at least this many seconds ago')
+        parser.add_argument('--loop', action='store_true', help='Keep running, rolling up every --interval seconds')
+        parser.add_argument('--interval', type=float, default=5.0)
+        parser.add_argument('--prune-days', type=int, default=None,
+                            help='Afterwards, delete rolled-up day buckets older than this many days')
+
+    def handle(self, *args, **options):
+        while True:
+            consumed = rollup_all(options['batch_size'], options['lag'])
+            if consumed:
+                self.stdout.write(f'[Rollup] Applied {consumed} telemetry events')
+            if options['prune_days'] is not None:
+                pruned = prune_events(options['prune_days'])
+                if pruned:
+                    self.stdout.write(f'[Rollup] Pruned {pruned} events older than {options["prune_days"]} days')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Telemetry Rollup Complete ---'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.modules.spool import drain_all, inspect_segments
+
+
+class Command(BaseCommand):
+    help = 'Inspects the local telemetry spool and replays its segments into the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inspect', action='store_true', help='List segments on disk (default)')
+        parser.add_argument('--replay', action='store_true',
+                            help='Drain every segment not held open by a running worker')
+        parser.add_argument('--dir', default=None, help='Spool directory (defaults to TELEMETRY_SPOOL_DIR)')
+
+    def handle(self, *args, **options):
+        if options['replay']:
+            applied, skipped = drain_all(options['dir'])
+            self.stdout.write(f'[Spool] Replayed {applied} records')
+            if skipped:
+                self.stdout.write(self.style.WARNING(f'[Spool] Skipped {skipped} segments still open by a worker'))
+
+        if options['inspect'] or not options['replay']:
+            segments = inspect_segments(options['dir'])
+            for segment in segments:
+                self.stdout.write(
+                    f"{segment['segment']}  {segment['bytes']} bytes  {segment['records']} records  "
+                    f"{segment['drained_bytes']} drained"
+                )
+            self.stdout.write(f'[Spool] {len(segments)} segments pending')
+
+        self.stdout.write(self.style.SUCCESS('--- [LMS] Telemetry Spool Complete ---'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counters(apps, schema_editor):
+    ModuleProgress = apps.get_model('modules', 'ModuleProgress')
+    ResourceProgress = apps.get_model('modules', 'ResourceProgress')
+    QuizAttempt = apps.get_model('quiz', 'QuizAttempt')
+    Submission = apps.get_model('assignments', 'Submission')
+
+    done = {
+        (u, m): n for u, m, n in ResourceProgress.objects.filter(completed=True)
+        .values('user_id', 'resource__module_id').annotate(n=Count('id'))
+        .values_list('user_id', 'resource__module_id', 'n')
+    }
+    passed = set(QuizAttempt.objects.filter(passed=True).values_list('user_id', 'quiz__module_id').distinct())
+    submitted = set(Submission.objects.values_list('assignment__user_id', 'assignment__module_id').distinct())
+
+    rows = list(ModuleProgress.objects.all())
+    for row in rows:
+        pair = (row.user_id, row.module_id)
+        row.completed_resources = done.get(pair, 0)
+        row.quiz_passed = pair in passed
+        row.assignment_submitted = pair in submitted
+    ModuleProgress.objects.bulk_update(
+        rows, ['completed_resources', 'quiz_passed', 'assignment_submitted'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modules', '0005_resourceprogress_updated_at'),
+        ('quiz', '0001_initial'),
+        ('assignments', '0004_alter_assignment_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='assignment_submitted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='completed_resources',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='quiz_passed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modules', '0006_moduleprogress_completion_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourceprogress',
+            name='coverage',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
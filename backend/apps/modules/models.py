@@ -55,6 +55,11 @@ class ModuleProgress(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     last_accessed = models.DateTimeField(auto_now=True)
 
+    # Denormalized completion state, kept in sync by the pulse path and signals
+    completed_resources = models.PositiveIntegerField(default=0)
+    quiz_passed = models.BooleanField(default=False)
+    assignment_submitted = models.BooleanField(default=False)
+
     class Meta:
         unique_together = ('user', 'module')
 
@@ -62,53 +67,32 @@ class ModuleProgress(models.Model):
         return f"{self.user.username} - {self.module.title} ({self.status})"
 
     def check_completion(self):
-        """Principled completion check for the module."""
-        from apps.quiz.models import QuizAttempt, Quiz
-        from apps.assignments.models import Assignment, Submission
-        from django.utils import timezone
-
-        # 1. Check Resources
-        total_resources = self.module.resources.count()
-        completed_resources = ResourceProgress.objects.filter(
-            user=self.user, 
-            resource__module=self.module, 
-            completed=True
-        ).count()
-        
-        resources_done = total_resources == 0 or completed_resources >= total_resources
-        if not resources_done: return False
-
-        # 2. Check Quiz
-        if self.module.has_quiz:
-            quiz = Quiz.objects.filter(module=self.module).first()
-            if not quiz: return False # Config error
-            if not QuizAttempt.objects.filter(user=self.user, quiz=quiz, passed=True).exists():
-                return False
-
-        # 3. Check Assignment
-        if self.module.has_assignment:
-            assignment = Assignment.objects.filter(user=self.user, module=self.module).first()
-            if not assignment: return False
-            if not Submission.objects.filter(assignment=assignment).exists():
-                return False
+        """
+        Principled completion check for the module.
+        O(1) over the denormalized counters; only the module requirements are read.
+        """
+        from .completion import module_requirements, requirements_met, mark_completed
+
+        requirements = module_requirements([self.module_id])[self.module_id]
+        if not requirements_met(self, requirements):
+            return False
 
         # All met
-        if self.status != 'completed':
-            self.status = 'completed'
-            self.completed_at = timezone.now()
-            self.save()
-            # Sync with Assignment model if exists (auto-enrolled learners too)
-            Assignment.objects.filter(user=self.user, module=self.module).update(
-                status='completed', completed_at=timezone.now()
-            )
+        mark_completed([self])
         return True
 
+    def refresh_counters(self):
+        """Recount the denormalized completion state from the source tables."""
+        from .completion import refresh_counters
+        refresh_counters([self])
+
 class ResourceProgress(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='resource_progress', on_delete=models.CASCADE)
     resource = models.ForeignKey(Resource, related_name='progress', on_delete=models.CASCADE)
     completed = models.BooleanField(default=False)
     watch_time_seconds = models.IntegerField(default=0)  # Total time watched
     last_position_seconds = models.IntegerField(default=0)  # Resume position
+    coverage = models.BinaryField(default=b'', blank=True)  # Watched segments bitmap (see coverage.py)
     completed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -117,3 +101,9 @@ class ResourceProgress(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.resource.title}"
+
+    @property
+    def covered_seconds(self):
+        """Distinct seconds actually watched, at segment granularity."""
+        from .coverage import covered_seconds
+        return covered_seconds(self.coverage)
@@ -0,0 +1,148 @@
+"""
+Offline Backlog Replay
+
+Pulses that failed to send are kept by the client (telemetry.js) and
+replayed in one request as NDJSON, optionally gzip-compressed
+(Content-Encoding: gzip). The body is decompressed and parsed line by line
+from the request stream, never loaded whole.
+
+Each line is a normal pulse plus `ts`, the client epoch milliseconds at
+which it was produced. Pulses are ordered by `ts`, deduplicated by their
+idempotency keys, and each pulse's focus credit is capped at the client
+time elapsed since the previous pulse for the same resource. The whole
+backlog is then applied through the regular pipeline in one bulk write.
+
+Live pulses sent after the backlog was recorded may already have been
+written, so replayed absolute fields never move a row backwards: watch_time
+is raised to the current value at least, and last_position is only kept when
+the pulse is newer than the row's last update (keep_newer_state).
+"""
+
+import gzip
+import json
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from apps.analytics import counters
+from .admission import cap_delta
+from .buffer import unflushed_progress
+from .models import ResourceProgress
+from .telemetry import InvalidPulse, normalize_pulse
+
+MAX_REPLAY_PULSES = 5000
+# Decompressed size guard (gzip bombs); ~200 bytes per pulse line is generous
+MAX_REPLAY_BYTES = MAX_REPLAY_PULSES * 256
+MAX_LINE_BYTES = 4096
+MAX_REPLAY_AGE = timedelta(days=7)
+CLOCK_SKEW = timedelta(minutes=5)
+# Credit allowed beyond the client-side gap between two pulses
+GAP_SLACK_SECONDS = 5
+FIRST_PULSE_MAX_DELTA = 30
+
+
+class InvalidReplay(ValueError):
+    """Raised when a replay body cannot be read."""
+
+
+def _lines(stream, compressed):
+    """Yield decoded lines from the (optionally gzip) stream, enforcing the size guards."""
+    raw = gzip.GzipFile(fileobj=stream, mode='rb') if compressed else stream
+    read = 0
+    try:
+        for line in iter(lambda: raw.readline(MAX_LINE_BYTES + 1), b''):
+            read += len(line)
+            if read > MAX_REPLAY_BYTES or len(line) > MAX_LINE_BYTES:
+                raise InvalidReplay("Backlog too large")
+            line = line.strip()
+            if line:
+                yield line.decode('utf-8')
+    except (OSError, EOFError, zlib.error, UnicodeDecodeError):
+        raise InvalidReplay("Body is not valid (gzip-compressed) UTF-8 NDJSON")
+
+
+def _occurred_at(data, now):
+    try:
+        ts = datetime.fromtimestamp(int(data['ts']) / 1000, tz=dt_timezone.utc)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        raise InvalidPulse("'ts' must be epoch milliseconds")
+    if ts > now + CLOCK_SKEW or ts < now - MAX_REPLAY_AGE:
+        raise InvalidPulse("'ts' is outside the replay window")
+    return min(ts, now)
+
+
+def parse_backlog(stream, compressed):
+    """
+    Returns (pulses sorted by occurred_at, [{"line", "error"}, ...]).
+    Malformed lines are skipped and reported rather than failing the backlog.
+    """
+    now = timezone.now()
+    pulses, errors = [], []
+    for number, line in enumerate(_lines(stream, compressed), start=1):
+        if len(pulses) >= MAX_REPLAY_PULSES:
+            raise InvalidReplay(f"At most {MAX_REPLAY_PULSES} pulses per replay")
+        try:
+            data = json.loads(line)
+            pulse = normalize_pulse(data)
+            pulse['occurred_at'] = _occurred_at(data, now)
+        except (ValueError, InvalidPulse) as exc:
+            errors.append({"line": number, "error": str(exc)})
+            continue
+        pulses.append(pulse)
+    pulses.sort(key=lambda p: p['occurred_at'])
+    return pulses, errors
+
+
+def cap_by_client_time(pulses):
+    """
+    Cap each pulse's credited focus at the client-side gap since the previous
+    pulse for the same resource (pulses must be in time order).
+    """
+    last_seen = {}
+    capped = []
+    for pulse in pulses:
+        previous = last_seen.get(pulse['resource_id'])
+        if previous is None:
+            limit = FIRST_PULSE_MAX_DELTA
+        else:
+            limit = (pulse['occurred_at'] - previous).total_seconds() + GAP_SLACK_SECONDS
+        last_seen[pulse['resource_id']] = pulse['occurred_at']
+        capped.append(cap_delta(pulse, limit))
+    return capped
+
+
+def keep_newer_state(user_id, pulses):
+    """
+    Resolve the absolute fields of replayed pulses against what is already
+    stored (rows, uncompacted watch shards and unflushed write-behind state)
+    so they never lower it. Deltas, coverage and completion pass through.
+    """
+    resource_ids = {p['resource_id'] for p in pulses}
+    rows = {
+        row['resource_id']: row for row in ResourceProgress.objects.filter(
+            user_id=user_id, resource_id__in=resource_ids,
+        ).values('resource_id', 'watch_time_seconds', 'updated_at')
+    }
+    watch_time = {resource_id: row['watch_time_seconds'] for resource_id, row in rows.items()}
+    if counters.sharded_counters_enabled():
+        for (_, resource_id), seconds in counters.totals(counters.WATCH, [user_id], resource_ids).items():
+            watch_time[resource_id] = watch_time.get(resource_id, 0) + seconds
+    # Buffered live state arrived after the backlog was recorded
+    unflushed = unflushed_progress(user_id, resource_ids)
+    live_position = {resource_id for resource_id, state in unflushed.items() if state.last_position is not None}
+    for resource_id, state in unflushed.items():
+        watch_time[resource_id] = state.resolve_watch_time(watch_time.get(resource_id, 0))
+
+    resolved = []
+    for pulse in pulses:
+        resource_id = pulse['resource_id']
+        current = watch_time.get(resource_id, 0)
+        if pulse['watch_time'] is not None and pulse['watch_time'] < current:
+            pulse = dict(pulse, watch_time=current)
+        if pulse['last_position'] is not None:
+            row = rows.get(resource_id)
+            if resource_id in live_position or (row is not None and pulse['occurred_at'] <= row['updated_at']):
+                pulse = dict(pulse, last_position=None)
+        resolved.append(pulse)
+    return resolved
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from .models import Module, Resource, ModuleProgress, ResourceProgress
+from apps.analytics import counters
+from .buffer import unflushed_progress
+from .coverage import covered_seconds, merge, to_bitmap
 
 class ResourceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,7 +21,7 @@ class ResourceProgressSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ResourceProgress
-        fields = ['id', 'resource_id', 'completed', 'completed_at', 'watch_time_seconds', 'last_position_seconds']
+        fields = ['id', 'resource_id', 'completed', 'completed_at', 'watch_time_seconds', 'last_position_seconds', 'covered_seconds']
 
 class ModuleProgressSerializer(serializers.ModelSerializer):
     module_title = serializers.CharField(source='module.title', read_only=True)
@@ -31,8 +34,37 @@ class ModuleProgressSerializer(serializers.ModelSerializer):
     def get_resources_progress(self, obj):
         # Efficiently fetch resource progress for this user/module
         resources = obj.module.resources.all()
-        progress = ResourceProgress.objects.filter(user=obj.user, resource__in=resources)
-        return ResourceProgressSerializer(progress, many=True).data
+        progress = list(ResourceProgress.objects.filter(user=obj.user, resource__in=resources))
+        data = ResourceProgressSerializer(progress, many=True).data
+
+        # Add sharded watch time that has not been compacted yet
+        if counters.sharded_counters_enabled():
+            sharded = counters.totals(counters.WATCH, [obj.user_id], [r.id for r in resources])
+            for item in data:
+                item['watch_time_seconds'] += sharded.get((obj.user_id, item['resource_id']), 0)
+
+        # Merge write-behind state that has not been flushed yet
+        unflushed = unflushed_progress(obj.user_id, [r.id for r in resources])
+        stored = {p.resource_id: p.coverage for p in progress}
+        for item in data:
+            state = unflushed.pop(item['resource_id'], None)
+            if state:
+                item['watch_time_seconds'] = state.resolve_watch_time(item['watch_time_seconds'])
+                if state.last_position is not None:
+                    item['last_position_seconds'] = state.last_position
+                if state.coverage:
+                    item['covered_seconds'] = covered_seconds(merge(stored[item['resource_id']], state.coverage))
+        for resource_id, state in unflushed.items():
+            data.append({
+                'id': None,
+                'resource_id': resource_id,
+                'completed': False,
+                'completed_at': None,
+                'watch_time_seconds': state.resolve_watch_time(0),
+                'last_position_seconds': state.last_position or 0,
+                'covered_seconds': covered_seconds(to_bitmap(state.coverage)),
+            })
+        return data
 
 class ResourceCreateSerializer(serializers.ModelSerializer):
     class Meta:
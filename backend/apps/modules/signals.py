@@ -0,0 +1,78 @@
+"""
+Keeps the denormalized completion state on ModuleProgress in sync with
+the events that change it. Bulk writes in the pulse path bypass signals
+and maintain the counters themselves (see telemetry.py).
+"""
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.assignments.models import Submission
+from apps.quiz.models import Quiz, QuizAttempt
+from .completion import refresh_counters, requirements_cache
+from .models import Module, ModuleProgress, Resource, ResourceProgress
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_requirements(sender, instance, **kwargs):
+    # Curriculum edits change what completing a module takes
+    requirements_cache.invalidate([instance.pk if sender is Module else instance.module_id])
+
+
+@receiver(post_save, sender=ModuleProgress)
+def initialize_counters(sender, instance, created, raw=False, **kwargs):
+    # Progress can start after the quiz was passed or work was submitted
+    if created and not raw:
+        instance.refresh_counters()
+
+
+@receiver(post_save, sender=QuizAttempt)
+def record_quiz_pass(sender, instance, created, **kwargs):
+    if created and instance.passed:
+        ModuleProgress.objects.filter(user_id=instance.user_id, module__quiz=instance.quiz_id).update(quiz_passed=True)
+
+
+@receiver(post_save, sender=Submission)
+def record_submission(sender, instance, created, **kwargs):
+    if created:
+        assignment = instance.assignment
+        ModuleProgress.objects.filter(
+            user_id=assignment.user_id, module_id=assignment.module_id,
+        ).update(assignment_submitted=True)
+
+
+@receiver(post_save, sender=ResourceProgress)
+def recount_saved_resource(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # The pulse path writes in bulk and keeps the counters itself; this covers admin, seed commands and .save()
+    if raw or (created and not instance.completed):
+        return
+    if update_fields is not None and 'completed' not in update_fields:
+        return
+    refresh_counters(ModuleProgress.objects.filter(user_id=instance.user_id, module__resources=instance.resource_id))
+
+
+@receiver(post_delete, sender=ResourceProgress)
+def release_completed_resource(sender, instance, **kwargs):
+    if instance.completed:
+        ModuleProgress.objects.filter(
+            user_id=instance.user_id, module__resources=instance.resource_id, completed_resources__gt=0,
+        ).update(completed_resources=F('completed_resources') - 1)
+
+
+@receiver(post_delete, sender=QuizAttempt)
+@receiver(post_delete, sender=Submission)
+def recount_after_delete(sender, instance, **kwargs):
+    if sender is QuizAttempt:
+        rows = ModuleProgress.objects.filter(user_id=instance.user_id, module__quiz=instance.quiz_id)
+    else:
+        rows = ModuleProgress.objects.filter(
+            user_id=instance.assignment.user_id, module_id=instance.assignment.module_id,
+        )
+    for row in rows:
+        row.refresh_counters()
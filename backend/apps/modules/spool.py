@@ -0,0 +1,343 @@
+"""
+Telemetry Spool
+
+A local, append-only segment log that keeps heartbeat ingestion independent
+of database latency and availability.
+
+TELEMETRY_SPOOL modes:
+    off       pulses go straight to the pipeline (default)
+    fallback  pulses go to the pipeline; if the database errors they are
+              spooled instead of failing the request
+    always    pulses are only appended to the spool; a drainer thread per
+              worker replays them into the database in bulk
+
+Each worker appends JSON lines ({"u": user_id, "p": [pulse, ...]}) to its own
+segment file under TELEMETRY_SPOOL_DIR, flushing every write to the OS and
+fsyncing at most every TELEMETRY_SPOOL_FSYNC_SECONDS (group commit). The
+drainer rotates the active segment and replays closed segments in chunks.
+Each chunk is applied in the same transaction that advances the segment's
+TelemetryCursor (a byte offset), so a crash mid-drain replays nothing twice.
+Fully drained segments are deleted.
+
+A chunk that fails while the database is reachable (a value the columns
+reject, a user or resource deleted since) is retried one record at a time;
+records that still fail are appended to quarantine/<segment> under the spool
+directory and skipped, so one poisoned record cannot stall the spool. The
+quarantine files use the segment format: once fixed, moving one back into
+the spool directory replays it. Only an unavailable database (OperationalError,
+InterfaceError) leaves the cursor where it is for a later drain.
+
+`manage.py telemetry_spool --inspect / --replay` lists segments and drains
+leftovers, e.g. from a worker that died.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, transaction
+
+from apps.analytics.models import TelemetryCursor
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single worker, no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.log'
+CHUNK_RECORDS = 500
+QUARANTINE_DIR = 'quarantine'
+
+# Worth retrying later; anything else is a property of the records themselves
+DATABASE_UNAVAILABLE = (OperationalError, InterfaceError)
+
+
+def spool_mode():
+    return getattr(settings, 'TELEMETRY_SPOOL', 'off')
+
+
+def _cursor_name(path):
+    return f'spool:{os.path.basename(path)}'
+
+
+def _encode(user_id, pulses):
+    def default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"Cannot spool {type(value).__name__}")
+    return json.dumps({"u": user_id, "p": pulses}, default=default, separators=(',', ':')) + '\n'
+
+
+def _decode(line):
+    record = json.loads(line)
+    for pulse in record['p']:
+        if pulse.get('occurred_at'):
+            pulse['occurred_at'] = datetime.fromisoformat(pulse['occurred_at'])
+    return record['u'], record['p']
+
+
+def list_segments(directory=None):
+    directory = directory or settings.TELEMETRY_SPOOL_DIR
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory) if n.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(directory, n) for n in names]
+
+
+class _SegmentLock:
+    """Exclusive, non-blocking advisory lock on a segment (no-op without fcntl)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'rb')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.handle.close()
+                return False
+        return True
+
+    def __exit__(self, *exc):
+        if not self.handle.closed:
+            self.handle.close()
+
+
+def _apply_records(records):
+    from .telemetry import dispatch_pulses, validate_pulses
+
+    batches = {}
+    for user_id, pulses in records:
+        accepted, _, rejected = validate_pulses(pulses)
+        for item in rejected:
+            logger.warning("[Telemetry] Spooled pulse rejected for user %s: %s", user_id, item)
+        batches.setdefault(user_id, []).extend(accepted)
+    # Committed with the cursor, before the segment can be deleted
+    dispatch_pulses(batches, durable=True)
+
+
+def _quarantine(path, failed):
+    """Append records that cannot be applied to quarantine/<segment>."""
+    directory = os.path.join(os.path.dirname(path), QUARANTINE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, os.path.basename(path)), 'a') as quarantine:
+        for (user_id, pulses), reason in failed:
+            logger.error("[Telemetry] Quarantined spool record for user %s from %s: %s", user_id, path, reason)
+            quarantine.write(_encode(user_id, pulses))
+        quarantine.flush()
+        os.fsync(quarantine.fileno())
+
+
+def _apply_chunk(path, records, end_offset):
+    """Validate and apply one chunk and advance the segment cursor, atomically."""
+    with transaction.atomic():
+        cursor, _ = TelemetryCursor.objects.get_or_create(name=_cursor_name(path))
+        cursor = TelemetryCursor.objects.select_for_update().get(pk=cursor.pk)
+        if cursor.position >= end_offset:
+            return  # Another drainer got here first
+
+        # Foreign keys are checked at commit, too late to isolate the record: screen users here
+        known = set(get_user_model().objects.filter(pk__in={u for u, _ in records}).values_list('pk', flat=True))
+        failed = [(record, "user no longer exists") for record in records if record[0] not in known]
+        records = [record for record in records if record[0] in known]
+        try:
+            with transaction.atomic():
+                _apply_records(records)
+        except DATABASE_UNAVAILABLE:
+            raise
+        except Exception:
+            logger.warning("[Telemetry] Spool chunk in %s failed; retrying record by record", path, exc_info=True)
+            for record in records:
+                try:
+                    with transaction.atomic():
+                        _apply_records([record])
+                except DATABASE_UNAVAILABLE:
+                    raise
+                except Exception as exc:
+                    failed.append((record, repr(exc)))
+        if failed:
+            _quarantine(path, failed)
+
+        cursor.position = end_offset
+        cursor.save(update_fields=['position', 'updated_at'])
+
+
+def drain_segment(path):
+    """
+    Replay a closed segment from its cursor onwards and delete it when done.
+    Returns the number of records applied, or None if another process holds it.
+    """
+    with _SegmentLock(path) as locked:
+        if not locked:
+            return None
+        position = TelemetryCursor.objects.filter(name=_cursor_name(path)).values_list('position', flat=True).first() or 0
+
+        applied = 0
+        with open(path, 'rb') as segment:
+            segment.seek(position)
+            records, offset = [], position
+            for raw in segment:
+                offset += len(raw)
+                if not raw.endswith(b'\n'):
+                    logger.warning("[Telemetry] Dropping torn record at the end of %s", path)
+                    break
+                try:
+                    records.append(_decode(raw))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("[Telemetry] Skipping corrupt spool record in %s", path)
+                if len(records) >= CHUNK_RECORDS:
+                    _apply_chunk(path, records, offset)
+                    applied += len(records)
+                    records = []
+            # Also advances past trailing corrupt/torn bytes
+            _apply_chunk(path, records, offset)
+            applied += len(records)
+
+        os.remove(path)
+        TelemetryCursor.objects.filter(name=_cursor_name(path)).delete()
+    return applied
+
+
+def drain_all(directory=None):
+    """Drain every closed segment. Returns (records applied, segments skipped as still open)."""
+    applied = skipped = 0
+    for path in list_segments(directory):
+        count = drain_segment(path)
+        if count is None:
+            skipped += 1
+        else:
+            applied += count
+    return applied, skipped
+
+
+def inspect_segments(directory=None):
+    """[{"segment", "bytes", "records", "drained_bytes"}] for every segment on disk."""
+    cursors = dict(TelemetryCursor.objects.filter(name__startswith='spool:').values_list('name', 'position'))
+    report = []
+    for path in list_segments(directory):
+        with open(path, 'rb') as segment:
+            records = sum(1 for _ in segment)
+        report.append({
+            "segment": os.path.basename(path),
+            "bytes": os.path.getsize(path),
+            "records": records,
+            "drained_bytes": cursors.get(_cursor_name(path), 0),
+        })
+    return report
+
+
+class Spool:
+    """One worker's writer (active segment) and drainer thread."""
+
+    def __init__(self, directory, fsync_seconds, drain_seconds, segment_bytes):
+        self.directory = directory
+        self.fsync_seconds = fsync_seconds
+        self.drain_seconds = drain_seconds
+        self.segment_bytes = segment_bytes
+        self.prefix = f'{socket.gethostname()}-{os.getpid()}'
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._file = None
+        self._path = None
+        self._last_sync = 0.0
+        self._drainer = None
+        self._wake = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self):
+        self._sequence += 1
+        # Time-ordered names so segments drain in write order
+        name = f'{time.time_ns():020d}-{self.prefix}-{self._sequence:06d}{SEGMENT_SUFFIX}'
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, 'ab')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()  # Releases the segment lock
+            self._file = None
+
+    def append(self, batches):
+        """Append {user_id: [pulse, ...]} as one write; durable after the next group fsync."""
+        data = ''.join(_encode(user_id, pulses) for user_id, pulses in batches.items() if pulses).encode()
+        if not data:
+            return
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_seconds:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+            if self._file.tell() >= self.segment_bytes:
+                self._close()
+        self._ensure_drainer()
+        self._wake.set()
+
+    def rotate(self):
+        with self._lock:
+            self._close()
+
+    def drain(self):
+        """Close the active segment and replay every unlocked segment. Returns records applied."""
+        self.rotate()
+        applied, _ = drain_all(self.directory)
+        return applied
+
+    def _ensure_drainer(self):
+        if self._drainer is not None:
+            return
+        self._drainer = threading.Thread(target=self._drain_loop, name='telemetry-spool-drainer', daemon=True)
+        self._drainer.start()
+
+    def _drain_loop(self):
+        backoff = self.drain_seconds
+        while True:
+            self._wake.wait(backoff)
+            self._wake.clear()
+            time.sleep(self.drain_seconds)  # Let a burst accumulate into one segment
+            try:
+                self.drain()
+                backoff = self.drain_seconds
+            except DatabaseError:
+                logger.warning("[Telemetry] Spool drain deferred: database unavailable")
+                backoff = min(backoff * 2, 60)
+            except Exception:
+                logger.exception("[Telemetry] Spool drain failed")
+                backoff = min(backoff * 2, 60)
+            finally:
+                close_old_connections()
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = Spool(
+                    directory=settings.TELEMETRY_SPOOL_DIR,
+                    fsync_seconds=settings.TELEMETRY_SPOOL_FSYNC_SECONDS,
+                    drain_seconds=settings.TELEMETRY_SPOOL_DRAIN_SECONDS,
+                    segment_bytes=settings.TELEMETRY_SPOOL_SEGMENT_BYTES,
+                )
+    return _spool
@@ -0,0 +1,578 @@
+"""
+Pulse Ingestion Pipeline
+
+Heartbeats from ModulePlayer land here, either one at a time through
+UpdateResourceProgressView or in bulk through PulseBatchView.
+
+Pulses are folded per (user, resource) into a PendingProgress and applied
+with a fixed number of queries, independent of how many pulses, resources
+or modules a batch carries.
+"""
+
+import threading
+from contextlib import nullcontext
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from apps.analytics import counters
+from apps.analytics.counters import sharded_counters_enabled
+from apps.analytics.heatmaps import invalidate_heatmaps
+from apps.analytics.result_cache import invalidate as invalidate_results
+from apps.analytics.models import LearningSession
+from apps.analytics.sessionization import inline_sessions_enabled
+from apps.analytics.sessions import SESSION_WINDOW, OpenSessionIndex
+from . import coverage
+from .completion import complete_if_met, refresh_counters
+from .coverage import pulse_mask
+from .models import ModuleProgress, Resource, ResourceProgress
+from .upsert import supports_upsert, upsert_module_progress, upsert_resource_progress
+
+MAX_BATCH_PULSES = 500
+# Upper bound for duration_delta, watch_time and last_position (seconds); larger
+# values are client bugs or tampering and would overflow the integer columns
+MAX_PULSE_SECONDS = 24 * 3600
+# Largest primary key (BigAutoField)
+MAX_ID = 2 ** 63 - 1
+
+# SQLite (local dev fallback) admits a single writer; queue in-process
+# instead of failing concurrent heartbeats with "database table is locked".
+_sqlite_write_lock = threading.Lock()
+
+
+def _write_lock():
+    return _sqlite_write_lock if connection.vendor == 'sqlite' else nullcontext()
+
+
+class InvalidPulse(ValueError):
+    """Raised when a pulse payload cannot be interpreted."""
+
+
+def _to_int(data, field, default=None):
+    value = data.get(field)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidPulse(f"'{field}' must be an integer")
+
+
+def _in_range(pulse, field, minimum, maximum):
+    value = pulse[field]
+    if value is not None and not minimum <= value <= maximum:
+        raise InvalidPulse(f"'{field}' must be between {minimum} and {maximum}")
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ('', '0', 'false', 'no')
+    return bool(value)
+
+
+def _to_key(value):
+    if value is None or value == '':
+        return None
+    value = str(value)
+    if len(value) > 64:
+        raise InvalidPulse("'idempotency_key' must be at most 64 characters")
+    return value
+
+
+def normalize_pulse(data, module_id=None, resource_id=None):
+    """
+    Validate a raw pulse payload into the canonical pulse dict.
+    URL kwargs (module_id / resource_id) take precedence over body fields.
+    """
+    if not hasattr(data, 'get'):
+        raise InvalidPulse("Pulse must be an object")
+
+    pulse = {
+        'module_id': module_id if module_id is not None else _to_int(data, 'module_id'),
+        'resource_id': resource_id if resource_id is not None else _to_int(data, 'resource_id'),
+        'duration_delta': _to_int(data, 'duration_delta', 0),
+        'watch_time': _to_int(data, 'watch_time'),
+        'last_position': _to_int(data, 'last_position'),
+        'completed': _to_bool(data.get('completed', False)),
+        # Retries resend the same key; see dedupe.py
+        'idempotency_key': _to_key(data.get('idempotency_key', data.get('_trace'))),
+    }
+    if pulse['module_id'] is None or pulse['resource_id'] is None:
+        raise InvalidPulse("'module_id' and 'resource_id' are required")
+    # Out-of-range values never reach the SQL (or the spool)
+    for field in ('module_id', 'resource_id'):
+        _in_range(pulse, field, 1, MAX_ID)
+    for field in ('duration_delta', 'watch_time', 'last_position'):
+        _in_range(pulse, field, 0, MAX_PULSE_SECONDS)
+    return pulse
+
+
+class PendingProgress:
+    """
+    Net effect of one or more pulses on a single ResourceProgress row.
+
+    Mirrors the per-pulse rules: a delta increments watch time, an absolute
+    watch_time overwrites it (discarding earlier deltas), the latest position
+    wins and completion is sticky. Watched coverage (a coverage.py bitmask)
+    accumulates with OR.
+    """
+    __slots__ = ('module_id', 'delta', 'watch_time', 'last_position', 'completed', 'coverage')
+
+    def __init__(self, module_id):
+        self.module_id = module_id
+        self.delta = 0
+        self.watch_time = None
+        self.last_position = None
+        self.completed = False
+        self.coverage = 0
+
+    def add_pulse(self, pulse):
+        if pulse['watch_time'] is not None:
+            self.watch_time = pulse['watch_time']
+            self.delta = 0
+        elif pulse['duration_delta']:
+            self.delta += pulse['duration_delta']
+        if pulse['last_position'] is not None:
+            self.last_position = pulse['last_position']
+        self.completed = self.completed or pulse['completed']
+        self.coverage |= pulse_mask(pulse)
+
+    def merge(self, later):
+        """Fold another pending state that happened after this one."""
+        if later.watch_time is not None:
+            self.watch_time = later.watch_time
+            self.delta = later.delta
+        else:
+            self.delta += later.delta
+        if later.last_position is not None:
+            self.last_position = later.last_position
+        self.completed = self.completed or later.completed
+        self.coverage |= later.coverage
+
+    def resolve_watch_time(self, stored):
+        """Watch time once this state is applied on top of the stored value."""
+        base = self.watch_time if self.watch_time is not None else stored
+        return base + self.delta
+
+
+def fold_pulses(user_id, pulses, pending=None, focus=None):
+    """
+    Merge pulses (in arrival order) into `pending` keyed by (user_id, resource_id)
+    and `focus` keyed by user_id. Returns both mappings.
+    """
+    pending = {} if pending is None else pending
+    focus = {} if focus is None else focus
+    for pulse in pulses:
+        key = (user_id, pulse['resource_id'])
+        state = pending.get(key)
+        if state is None:
+            state = pending[key] = PendingProgress(pulse['module_id'])
+        state.add_pulse(pulse)
+        if pulse['duration_delta']:
+            focus[user_id] = focus.get(user_id, 0) + pulse['duration_delta']
+    return pending, focus
+
+
+def _fetch_by_pair(model, fk, keys, lock=False):
+    """Load rows for a set of (user_id, <fk>) pairs with one query."""
+    user_ids = {u for u, _ in keys}
+    other_ids = {o for _, o in keys}
+    rows = model.objects.filter(user_id__in=user_ids, **{f'{fk}__in': other_ids})
+    if lock:
+        rows = rows.select_for_update()
+    pairs = ((r, (r.user_id, getattr(r, fk))) for r in rows)
+    return {key: r for r, key in pairs if key in keys}
+
+
+def _get_or_create_by_pair(model, fk, keys, lock=False, **defaults):
+    """Returns (rows, created_keys)."""
+    rows = _fetch_by_pair(model, fk, keys, lock)
+    missing = [model(user_id=u, **{fk: o}, **defaults) for (u, o) in keys if (u, o) not in rows]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        rows = _fetch_by_pair(model, fk, keys, lock)
+    return rows, {(m.user_id, getattr(m, fk)) for m in missing}
+
+
+def _apply_resource_progress(pending, now):
+    """Returns ({key: completed}, keys newly completed by this write)."""
+    keys = set(pending)
+    # Lock when a completion may flip (counted exactly once) or coverage is read-modify-written
+    lock = any(state.completed or state.coverage for state in pending.values())
+    rows, _ = _get_or_create_by_pair(ResourceProgress, 'resource_id', keys, lock=lock)
+    completed, newly_completed, widened = {}, set(), set()
+
+    # Untouched columns are written back as F() so concurrent writers are never clobbered
+    for key, state in pending.items():
+        row = rows[key]
+        if state.watch_time is not None:
+            row.watch_time_seconds = state.watch_time + state.delta
+        elif state.delta:
+            row.watch_time_seconds = F('watch_time_seconds') + state.delta
+        else:
+            row.watch_time_seconds = F('watch_time_seconds')
+
+        if state.last_position is not None:
+            row.last_position_seconds = state.last_position
+        else:
+            row.last_position_seconds = F('last_position_seconds')
+
+        merged = coverage.merge(row.coverage, state.coverage) if state.coverage else None
+        if merged is not None and merged != bytes(row.coverage):
+            row.coverage = merged
+            widened.add(key[1])
+        else:
+            row.coverage = F('coverage')
+
+        completed[key] = row.completed or state.completed
+        if state.completed and not row.completed:
+            row.completed = True
+            row.completed_at = now
+            newly_completed.add(key)
+        else:
+            row.completed = F('completed')
+            row.completed_at = F('completed_at')
+        row.updated_at = now
+
+    ResourceProgress.objects.bulk_update(
+        rows.values(),
+        ['watch_time_seconds', 'last_position_seconds', 'coverage', 'completed', 'completed_at', 'updated_at'],
+    )
+    invalidate_heatmaps(widened)
+    return completed, newly_completed
+
+
+def _apply_module_progress(increments, now):
+    """
+    Touch ModuleProgress for every (user_id, module_id) in `increments` and
+    add newly completed resources to the completion counters.
+    Returns (rows, keys whose completion state may have changed).
+    """
+    rows, created = _get_or_create_by_pair(
+        ModuleProgress, 'module_id', set(increments), lock=any(increments.values()), status='in_progress',
+    )
+
+    # New rows are counted from the source tables, which already include this batch
+    refresh_counters(rows[key] for key in created)
+
+    existing = {key: row for key, row in rows.items() if key not in created}
+    if existing:
+        # Same rule as the single pulse: first engagement flips not_started -> in_progress
+        ModuleProgress.objects.bulk_update([
+            ModuleProgress(
+                pk=row.pk,
+                completed_resources=F('completed_resources') + increments[key],
+                status=Case(When(status='not_started', then=Value('in_progress')), default=F('status')),
+                last_accessed=now,
+            ) for key, row in existing.items()
+        ], ['completed_resources', 'status', 'last_accessed'])
+
+    moved = [row.pk for key, row in existing.items() if increments[key]]
+    if moved:
+        # Rows are locked, so re-reading yields the exact post-increment counters
+        for row in ModuleProgress.objects.filter(pk__in=moved):
+            rows[(row.user_id, row.module_id)] = row
+    for key, row in existing.items():
+        if row.status == 'not_started':
+            row.status = 'in_progress'
+
+    changed = set(created) | {key for key, n in increments.items() if n}
+    return rows, changed
+
+
+def _apply_session_focus(focus, now):
+    """
+    Credit focus time to each user's open session, opening one if needed.
+    Open sessions come from OpenSessionIndex; only misses query LearningSession.
+    """
+    if not focus:
+        return
+    cutoff = now - SESSION_WINDOW
+    sessions = {
+        user_id: LearningSession(pk=session_id, user_id=user_id)
+        for user_id, session_id in OpenSessionIndex.lookup(focus.keys(), now).items()
+    }
+
+    sharded = sharded_counters_enabled()
+    if sessions and sharded:
+        # Index entries expire with their session; no session row is touched
+        counters.increment(counters.FOCUS, {(u, s.pk): focus[u] for u, s in sessions.items()}, now)
+    elif sessions:
+        for user_id, session in sessions.items():
+            session.focus_duration_seconds = F('focus_duration_seconds') + focus[user_id]
+            session.end_time = now
+        # Filtering the queryset skips index entries whose session expired or vanished
+        updated = LearningSession.objects.filter(
+            user_id__in=sessions.keys(), start_time__gte=cutoff,
+        ).bulk_update(sessions.values(), ['focus_duration_seconds', 'end_time'])
+        if updated < len(sessions):
+            alive = set(LearningSession.objects.filter(
+                pk__in=[s.pk for s in sessions.values()], start_time__gte=cutoff,
+            ).values_list('pk', flat=True))
+            stale = [user_id for user_id, s in sessions.items() if s.pk not in alive]
+            OpenSessionIndex.forget(stale)
+            for user_id in stale:
+                del sessions[user_id]
+
+    misses = [user_id for user_id in focus if user_id not in sessions]
+    if not misses:
+        return
+
+    recent = LearningSession.objects.filter(
+        user_id__in=misses, start_time__gte=cutoff,
+    ).order_by('user_id', '-start_time')
+    found = {}
+    for session in recent:
+        found.setdefault(session.user_id, session)
+
+    if found and sharded:
+        counters.increment(counters.FOCUS, {(u, s.pk): focus[u] for u, s in found.items()}, now)
+    elif found:
+        for user_id, session in found.items():
+            session.focus_duration_seconds = F('focus_duration_seconds') + focus[user_id]
+            session.end_time = now
+        LearningSession.objects.bulk_update(found.values(), ['focus_duration_seconds', 'end_time'])
+
+    new_sessions = [
+        LearningSession(user_id=user_id, focus_duration_seconds=focus[user_id], end_time=now)
+        for user_id in misses if user_id not in found
+    ]
+    if new_sessions:
+        new_sessions = LearningSession.objects.bulk_create(new_sessions)
+        invalidate_results([s.user_id for s in new_sessions])
+
+    # A rolled-back batch may leave a dangling id behind; the filtered update above absorbs it
+    OpenSessionIndex.remember(list(found.values()) + new_sessions, now)
+
+
+def _apply_upsert(pending, now):
+    """Single-resource fast path: two INSERT ... ON CONFLICT statements instead of get_or_create."""
+    [((user_id, resource_id), state)] = pending.items()
+    resource = upsert_resource_progress(user_id, resource_id, state, now)
+    if resource['coverage_changed']:
+        invalidate_heatmaps([resource_id])
+    row, created = upsert_module_progress(user_id, state.module_id, int(resource['newly_completed']), now)
+    if created:
+        # New rows are counted from the source tables, which already include this pulse
+        refresh_counters([row])
+
+    key = (user_id, state.module_id)
+    changed = {key} if created or resource['newly_completed'] else set()
+    return {(user_id, resource_id): resource['completed']}, {key: row}, changed
+
+
+def _shard_watch_deltas(pending, now):
+    """
+    Move delta-only watch time into counter shards (the row keeps its value).
+    The player sends its running total as an absolute watch_time with every
+    pulse: one at or above the folded total already stored (row plus shards)
+    becomes a delta of the difference, so it is sharded too. Only a lower
+    one overwrites the row, and then the earlier shards are dropped.
+
+    Two applies for the same resource racing between the folded read and the
+    increment both credit the difference, and compaction keeps that excess
+    (it only sums shards into the row). The player's next running total
+    corrects it: it is credited against the inflated folded total, or
+    overwrites it when lower. Retries of one pulse never get here twice;
+    they are dropped by the idempotency-key dedupe (dedupe.py).
+    Returns the pending states left to write to the rows.
+    """
+    absolute = {key for key, state in pending.items() if state.watch_time is not None}
+    folded = {}
+    if absolute:
+        rows = _fetch_by_pair(ResourceProgress, 'resource_id', absolute)
+        shards = counters.totals(counters.WATCH, {u for u, _ in absolute}, {r for _, r in absolute})
+        folded = {key: row.watch_time_seconds + shards.get(key, 0) for key, row in rows.items()}
+
+    deltas, overwritten, remaining = {}, set(), {}
+    for key, state in pending.items():
+        delta = state.delta
+        if state.watch_time is not None:
+            if key not in folded:
+                # First write for this resource: nothing stored or sharded yet
+                remaining[key] = state
+                continue
+            if state.watch_time < folded[key]:
+                overwritten.add(key)
+                remaining[key] = state
+                continue
+            delta += state.watch_time - folded[key]
+        if delta or state.watch_time is not None:
+            # Callers may retry with their own state, so it is copied rather than mutated
+            state, original = PendingProgress(state.module_id), state
+            state.merge(original)
+            state.watch_time = None
+            state.delta = 0
+            if delta:
+                deltas[key] = delta
+        remaining[key] = state
+    counters.discard(counters.WATCH, overwritten)
+    counters.increment(counters.WATCH, deltas, now)
+    return remaining
+
+
+def apply_pending(pending, focus, now=None):
+    """
+    Apply folded pulses in one transaction.
+
+    Returns {(user_id, resource_id): {"resource_completed", "module_status"}}.
+    """
+    if not pending and not focus:
+        return {}
+    now = now or timezone.now()
+
+    with _write_lock(), transaction.atomic():
+        if sharded_counters_enabled():
+            pending = _shard_watch_deltas(pending, now)
+        if len(pending) == 1 and supports_upsert():
+            completed, module_rows, changed = _apply_upsert(pending, now)
+        else:
+            completed, newly_completed = _apply_resource_progress(pending, now) if pending else ({}, set())
+
+            increments = {}
+            for (user_id, resource_id), state in pending.items():
+                key = (user_id, state.module_id)
+                increments[key] = increments.get(key, 0) + ((user_id, resource_id) in newly_completed)
+            module_rows, changed = _apply_module_progress(increments, now) if increments else ({}, set())
+
+        if inline_sessions_enabled():
+            _apply_session_focus(focus, now)
+        # Pulses that move no counter cannot complete a module: no completion queries at all
+        complete_if_met([module_rows[key] for key in changed], now)
+        invalidate_results({user_id for user_id, _ in changed})
+
+    return {
+        key: {
+            "resource_completed": completed[key],
+            "module_status": module_rows[(key[0], state.module_id)].status,
+        }
+        for key, state in pending.items()
+    }
+
+
+def dispatch_pulses(batches, durable=False):
+    """
+    Route validated pulses ({user_id: [pulse, ...]}) to the configured sink:
+    the event log, the write-behind buffer or a direct bulk apply.
+    durable=True bypasses the write-behind buffer, for callers that discard
+    their own copy of the pulses once this returns (the spool drainer).
+    Returns {(user_id, resource_id): outcome} for pulses applied synchronously.
+    """
+    from .buffer import get_write_behind, write_behind_enabled
+    from .eventlog import event_log_mode, record_events
+
+    batches = {user_id: pulses for user_id, pulses in batches.items() if pulses}
+    mode = event_log_mode()
+    if mode == 'ingest':
+        # Insert-only: the rollup applies these to the progress tables
+        for user_id, pulses in batches.items():
+            record_events(user_id, pulses, applied=False)
+        return {}
+
+    if write_behind_enabled() and not durable:
+        applied = {}
+        for user_id, pulses in batches.items():
+            outcomes = get_write_behind().submit(user_id, pulses)
+            applied.update(((user_id, resource_id), outcome) for resource_id, outcome in outcomes.items())
+    else:
+        pending, focus = {}, {}
+        for user_id, pulses in batches.items():
+            fold_pulses(user_id, pulses, pending, focus)
+        applied = apply_pending(pending, focus) if pending else {}
+
+    if mode == 'record':
+        for user_id, pulses in batches.items():
+            record_events(user_id, pulses, applied=True)
+    return applied
+
+
+def validate_pulses(pulses):
+    """
+    Check each pulse's resource exists and belongs to its module, in one query.
+    Returns (accepted, positions of accepted in `pulses`, rejected).
+    """
+    resource_ids = {p['resource_id'] for p in pulses}
+    owners = dict(Resource.objects.filter(pk__in=resource_ids).values_list('pk', 'module_id'))
+
+    accepted, positions, rejected = [], [], []
+    for index, pulse in enumerate(pulses):
+        if owners.get(pulse['resource_id']) != pulse['module_id']:
+            rejected.append({"index": index, "resource_id": pulse['resource_id'], "error": "Resource not found"})
+        else:
+            accepted.append(pulse)
+            positions.append(index)
+    return accepted, positions, rejected
+
+
+def deliver_pulses(batches, mode):
+    """
+    dispatch_pulses, or append to the local spool when `mode` is 'always'
+    (or 'fallback' and the database fails). Returns dispatch_pulses' outcomes.
+    """
+    from .spool import get_spool
+    if mode == 'always':
+        get_spool().append(batches)
+        return {}
+    try:
+        return dispatch_pulses(batches)
+    except DatabaseError:
+        if mode != 'fallback':
+            raise
+        get_spool().append(batches)
+        return {}
+
+
+def apply_pulses(user_id, pulses, admission=True):
+    """
+    Apply normalized pulses for one user.
+
+    Pulses whose resource does not exist or does not belong to the given
+    module are rejected rather than failing the whole batch. Pulses whose
+    idempotency key was already seen are dropped (dedupe.py). With
+    TELEMETRY_ADMISSION enabled, over-frequent pulses are held and merged
+    into the next accepted one (admission.py). The rest go through
+    dispatch_pulses, or to the local spool (spool.py) when TELEMETRY_SPOOL
+    is 'always' or the database fails in 'fallback' mode; spooled pulses are
+    validated when drained. Anything not applied synchronously is reported as buffered.
+    Backlog replays pass admission=False and cap credit by client time instead.
+    Returns {"applied": {resource_id: outcome}, "buffered": [...], "duplicates": [...], "rejected": [...]}.
+    """
+    from .spool import spool_mode
+    mode = spool_mode()
+
+    if mode == 'always':
+        accepted, positions, rejected = list(pulses), list(range(len(pulses))), []
+    else:
+        try:
+            accepted, positions, rejected = validate_pulses(pulses)
+        except DatabaseError:
+            if mode != 'fallback':
+                raise
+            accepted, positions, rejected = list(pulses), list(range(len(pulses))), []
+            mode = 'always'
+
+    from .dedupe import claim_pulses, release_pulses
+    accepted, duplicates, claimed = claim_pulses(user_id, accepted)
+
+    from .admission import admission_enabled, get_admission
+    if admission and admission_enabled():
+        admitted, batches = get_admission().admit(user_id, accepted)
+    else:
+        admitted, batches = accepted, {}
+    batches[user_id] = admitted
+
+    try:
+        outcomes = deliver_pulses(batches, mode)
+    except Exception:
+        # Let the client's retry through
+        release_pulses(claimed)
+        raise
+    applied = {resource_id: outcome for (owner, resource_id), outcome in outcomes.items() if owner == user_id}
+
+    return {
+        "applied": applied,
+        "buffered": sorted({p['resource_id'] for p in accepted} - set(applied)),
+        "duplicates": [positions[i] for i in duplicates],
+        "rejected": rejected,
+    }
@@ -13,6 +13,14 @@ User = get_user_model()
 def api_client():
     return APIClient()
 
+@pytest.fixture(autouse=True)
+def clear_cache(monkeypatch):
+    # Open-session index and other pipeline state live in the cache
+    from django.core.cache import cache
+    from apps.modules import dedupe
+    cache.clear()
+    monkeypatch.setattr(dedupe, '_seen', None)
+
 @pytest.fixture
 def learner(db):
     return User.objects.create_user(username='tester', password='pass', role='learner')
@@ -106,3 +114,1028 @@ def test_idempotent_pulse_with_absolute_time(api_client, learner, module, resour
     api_client.post(url, {'watch_time': 100}, format='json')
     res_progress.refresh_from_db()
     assert res_progress.watch_time_seconds == 100
+
+@pytest.fixture
+def second_resource(db, module):
+    return Resource.objects.create(module=module, title="Vid 2", type="video", url="http://y.t/v2")
+
+@pytest.mark.django_db
+class TestPulseBatch:
+
+    def test_batch_matches_single_pulse_semantics(self, api_client, learner, module, resource, second_resource):
+        """
+        Verify a batch folds deltas, absolute resyncs, positions and completion per resource.
+        """
+        api_client.force_authenticate(user=learner)
+        pulses = [
+            {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15},
+            {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15, 'last_position': 30},
+            {'module_id': module.id, 'resource_id': second_resource.id, 'watch_time': 100},
+            {'module_id': module.id, 'resource_id': second_resource.id, 'duration_delta': 15, 'completed': True},
+        ]
+        response = api_client.post(reverse('pulse_batch'), {'pulses': pulses}, format='json')
+        assert response.status_code == 200
+        assert response.data['applied'] == 4
+
+        first = ResourceProgress.objects.get(user=learner, resource=resource)
+        second = ResourceProgress.objects.get(user=learner, resource=second_resource)
+        assert (first.watch_time_seconds, first.last_position_seconds, first.completed) == (30, 30, False)
+        assert (second.watch_time_seconds, second.completed) == (115, True)
+
+        session = LearningSession.objects.get(user=learner)
+        assert session.focus_duration_seconds == 45
+        assert ModuleProgress.objects.get(user=learner, module=module).status == 'in_progress'
+
+    def test_batch_completes_module(self, api_client, learner, module, resource, second_resource):
+        api_client.force_authenticate(user=learner)
+        pulses = [
+            {'module_id': module.id, 'resource_id': r.id, 'completed': True}
+            for r in (resource, second_resource)
+        ]
+        api_client.post(reverse('pulse_batch'), {'pulses': pulses}, format='json')
+        assert ModuleProgress.objects.get(user=learner, module=module).status == 'completed'
+
+    def test_batch_query_count_is_constant(self, api_client, learner, module, resource, second_resource):
+        """
+        Verify query count does not grow with the number of pulses or resources.
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('pulse_batch')
+        # Single-resource pulses take the upsert path, so compare multi-resource batches
+        warm_up = [{'module_id': module.id, 'resource_id': r.id, 'duration_delta': 15} for r in (resource, second_resource)]
+        api_client.post(url, {'pulses': warm_up}, format='json')
+
+        with CaptureQueriesContext(connection) as small:
+            api_client.post(url, {'pulses': warm_up}, format='json')
+
+        extra = Resource.objects.create(module=module, title="Vid 3", type="video", url="http://y.t/v3")
+        ResourceProgress.objects.create(user=learner, resource=extra)
+        with CaptureQueriesContext(connection) as large:
+            api_client.post(url, {'pulses': [
+                {'module_id': module.id, 'resource_id': r.id, 'duration_delta': 15}
+                for r in (resource, second_resource, extra) for _ in range(10)
+            ]}, format='json')
+
+        assert len(large) == len(small)
+        assert ResourceProgress.objects.get(user=learner, resource=extra).watch_time_seconds == 150
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 180
+
+    def test_batch_rejects_foreign_resource(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        other = Module.objects.create(title="Other", description="Desc", duration=5)
+        response = api_client.post(reverse('pulse_batch'), {'pulses': [
+            {'module_id': other.id, 'resource_id': resource.id, 'duration_delta': 15},
+        ]}, format='json')
+        assert response.status_code == 200
+        assert response.data['applied'] == 0
+        assert not ResourceProgress.objects.filter(user=learner).exists()
+
+    def test_out_of_range_values_are_rejected(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        for field in ('watch_time', 'last_position', 'duration_delta'):
+            response = api_client.post(url, {field: 10 ** 20}, format='json')
+            assert response.status_code == 400
+            assert field in response.data['error']
+        response = api_client.post(reverse('pulse_batch'), {'pulses': [
+            {'module_id': module.id, 'resource_id': 10 ** 20, 'duration_delta': 15},
+        ]}, format='json')
+        assert response.status_code == 400
+        assert not ResourceProgress.objects.filter(user=learner).exists()
+
+    def test_batch_validates_payload(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        response = api_client.post(reverse('pulse_batch'), {'pulses': [
+            {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 'invalid'},
+        ]}, format='json')
+        assert response.status_code == 400
+
+@pytest.fixture
+def write_behind(settings, monkeypatch):
+    from apps.modules import buffer
+    settings.TELEMETRY_WRITE_BEHIND = True
+    instance = buffer.WriteBehind(buffer.LocalPulseBuffer(), max_keys=100, flush_seconds=3600)
+    monkeypatch.setattr(buffer, '_write_behind', instance)
+    return instance
+
+@pytest.mark.django_db
+class TestWriteBehind:
+
+    def test_pulses_coalesce_until_flush(self, api_client, learner, module, resource, write_behind):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        for _ in range(4):
+            response = api_client.post(url, {'duration_delta': 15, 'last_position': 60}, format='json')
+            assert response.data['status'] == 'buffered'
+
+        assert not ResourceProgress.objects.filter(user=learner).exists()
+
+        # Read path merges unflushed deltas
+        progress = api_client.get(reverse('module_progress', kwargs={'pk': module.id}))
+        assert progress.data['resources_progress'][0]['watch_time_seconds'] == 60
+
+        assert write_behind.flush() == 1
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert (res_progress.watch_time_seconds, res_progress.last_position_seconds) == (60, 60)
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 60
+
+    def test_completion_bypasses_buffer(self, api_client, learner, module, resource, write_behind):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        response = api_client.post(url, {'duration_delta': 15, 'completed': True}, format='json')
+        assert response.data['status'] == 'synchronized'
+        assert response.data['module_status'] == 'completed'
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 30
+
+        # Resource is now known completed, so repeated completed=True heartbeats are buffered
+        response = api_client.post(url, {'duration_delta': 15, 'completed': True}, format='json')
+        assert response.data['status'] == 'buffered'
+
+    def test_size_threshold_triggers_flush(self, api_client, learner, module, resource, write_behind):
+        write_behind.max_keys = 1
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+    def test_shutdown_waits_for_in_flight_flush(self, api_client, learner, module, resource, write_behind):
+        import threading
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        # The flusher thread is mid-flush when the interpreter exits
+        write_behind._flush_lock.acquire()
+        threading.Timer(0.2, write_behind._flush_lock.release).start()
+        assert write_behind.flush() == 0
+        assert write_behind.shutdown() == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+    def test_backends_must_implement_the_contract(self):
+        from apps.modules.buffer import PulseBuffer
+
+        class Partial(PulseBuffer):
+            def add(self, pending, focus):
+                return 0
+
+        with pytest.raises(TypeError):
+            Partial()
+
+@pytest.mark.django_db
+def test_open_session_index_skips_session_lookup(api_client, learner, module, resource):
+    """
+    Verify the second pulse credits the open session without querying for it.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    api_client.force_authenticate(user=learner)
+    url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+    api_client.post(url, {'duration_delta': 15}, format='json')
+
+    with CaptureQueriesContext(connection) as queries:
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+    session_selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'analytics_learningsession' in q['sql']]
+    assert session_selects == []
+    assert LearningSession.objects.get(user=learner).focus_duration_seconds == 30
+
+@pytest.mark.django_db
+def test_open_session_index_recovers_from_deleted_session(api_client, learner, module, resource):
+    api_client.force_authenticate(user=learner)
+    url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+    api_client.post(url, {'duration_delta': 15}, format='json')
+
+    # Bypass signals so the index still points at the removed session
+    LearningSession.objects.filter(user=learner)._raw_delete(LearningSession.objects.db)
+    api_client.post(url, {'duration_delta': 15}, format='json')
+    assert LearningSession.objects.get(user=learner).focus_duration_seconds == 15
+
+@pytest.mark.django_db
+class TestCompletionCounters:
+
+    def test_counters_follow_pulses(self, api_client, learner, module, resource, second_resource):
+        api_client.force_authenticate(user=learner)
+        for r in (resource, second_resource):
+            url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': r.id})
+            api_client.post(url, {'completed': True}, format='json')
+            api_client.post(url, {'completed': True}, format='json')
+
+        mod_progress = ModuleProgress.objects.get(user=learner, module=module)
+        assert mod_progress.completed_resources == 2
+        assert mod_progress.status == 'completed'
+
+    def test_idle_pulse_makes_no_completion_queries(self, api_client, learner, module, resource):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            api_client.post(url, {'duration_delta': 15}, format='json')
+
+        sql = ' '.join(q['sql'] for q in queries)
+        assert 'COUNT(' not in sql
+        assert 'quiz_quizattempt' not in sql and 'assignments_submission' not in sql
+
+    def test_quiz_pass_sets_flag_and_completes(self, api_client, learner, module, resource):
+        from apps.quiz.models import Quiz, QuizAttempt
+
+        module.has_quiz = True
+        module.save()
+        quiz = Quiz.objects.create(module=module, title="Q")
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'completed': True}, format='json')
+
+        mod_progress = ModuleProgress.objects.get(user=learner, module=module)
+        assert mod_progress.status == 'in_progress'
+
+        QuizAttempt.objects.create(user=learner, quiz=quiz, score=90, passed=True)
+        mod_progress.refresh_from_db()
+        assert mod_progress.quiz_passed
+        assert mod_progress.check_completion()
+        mod_progress.refresh_from_db()
+        assert mod_progress.status == 'completed'
+
+    def test_new_progress_counts_prior_activity(self, learner, module, resource):
+        from apps.quiz.models import Quiz, QuizAttempt
+
+        quiz = Quiz.objects.create(module=module, title="Q")
+        QuizAttempt.objects.create(user=learner, quiz=quiz, score=90, passed=True)
+        ResourceProgress.objects.create(user=learner, resource=resource, completed=True)
+
+        mod_progress = ModuleProgress.objects.create(user=learner, module=module)
+        assert (mod_progress.completed_resources, mod_progress.quiz_passed) == (1, True)
+
+    def test_saved_resource_progress_updates_counters(self, learner, module, resource):
+        mod_progress = ModuleProgress.objects.create(user=learner, module=module)
+        res_progress = ResourceProgress.objects.create(user=learner, resource=resource, completed=True)
+        mod_progress.refresh_from_db()
+        assert mod_progress.completed_resources == 1
+
+        res_progress.completed = False
+        res_progress.save()
+        mod_progress.refresh_from_db()
+        assert mod_progress.completed_resources == 0
+
+    @pytest.fixture
+    def shared_cache(self, settings, tmp_path):
+        # Visible to every process, unlike the LocMem default
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path),
+        }}
+
+    def test_requirements_cache_hits_and_invalidates(self, module, resource, shared_cache, django_assert_num_queries):
+        from apps.modules.completion import module_requirements, requirements_cache_stats
+
+        before = requirements_cache_stats()
+        assert module_requirements([module.id])[module.id]['total_resources'] == 1
+        with django_assert_num_queries(0):
+            module_requirements([module.id])
+        stats = requirements_cache_stats()
+        assert (stats['hits'] - before['hits'], stats['misses'] - before['misses']) == (1, 1)
+
+        Resource.objects.create(module=module, title="Doc", type="pdf", url="http://y.t/d")
+        assert module_requirements([module.id])[module.id]['total_resources'] == 2
+        module.has_quiz = True
+        module.save()
+        assert module_requirements([module.id])[module.id]['has_quiz']
+
+    def test_requirements_cache_entries_expire(self, module, resource, shared_cache, monkeypatch):
+        from apps.modules.completion import RequirementsCache, module_requirements
+
+        assert module_requirements([module.id])[module.id]['total_resources'] == 1
+        # An edit that bypasses the signals
+        Resource.objects.bulk_create([Resource(module=module, title="Doc", type="pdf", url="http://y.t/d")])
+        assert module_requirements([module.id])[module.id]['total_resources'] == 1
+        monkeypatch.setattr(RequirementsCache, 'MAX_AGE', 0)
+        assert module_requirements([module.id])[module.id]['total_resources'] == 2
+
+    def test_requirements_read_through_with_process_local_cache(self, module, resource, django_assert_num_queries):
+        from apps.modules.completion import module_requirements
+
+        module_requirements([module.id])
+        # Another worker's edit would never reach this process' LocMem cache
+        with django_assert_num_queries(1):
+            module_requirements([module.id])
+
+    def test_bulk_evaluator_repairs_drifted_rows(self, learner, module, resource, second_resource):
+        from apps.modules.completion import evaluate_completion
+
+        other = User.objects.create_user(username='other', password='pass', role='learner')
+        for user in (learner, other):
+            ModuleProgress.objects.create(user=user, module=module)
+        # Imported rows bypass the signals, leaving the counters stale
+        ResourceProgress.objects.bulk_create([
+            ResourceProgress(user=learner, resource=resource, completed=True),
+            ResourceProgress(user=learner, resource=second_resource, completed=True),
+            ResourceProgress(user=other, resource=resource, completed=True),
+        ])
+
+        assert evaluate_completion('all', apply=False) == {
+            "evaluated": 2, "counters_updated": 2, "completed": 1, "changed": 2,
+        }
+        assert ModuleProgress.objects.get(user=learner, module=module).status == 'not_started'
+
+        assert evaluate_completion({(learner.id, module.id)}) == {
+            "evaluated": 1, "counters_updated": 1, "completed": 1, "changed": 1,
+        }
+        row = ModuleProgress.objects.get(user=learner, module=module)
+        assert (row.status, row.completed_resources) == ('completed', 2)
+        assert ModuleProgress.objects.get(user=other, module=module).completed_resources == 0
+
+    def test_bulk_evaluator_query_count_is_constant(self, learner, module, resource, django_assert_max_num_queries):
+        from apps.modules.completion import evaluate_completion
+
+        users = User.objects.bulk_create([User(username=f'u{i}', role='learner') for i in range(20)])
+        ModuleProgress.objects.bulk_create([ModuleProgress(user=u, module=module) for u in users])
+        ResourceProgress.objects.bulk_create([ResourceProgress(user=u, resource=resource, completed=True) for u in users])
+
+        with django_assert_max_num_queries(12):
+            result = evaluate_completion('all')
+        assert result["completed"] == 20
+        assert not ModuleProgress.objects.exclude(status='completed').exists()
+
+@pytest.mark.django_db
+class TestUpsertPath:
+
+    def test_single_pulse_uses_two_progress_statements(self, api_client, learner, module, resource):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15, 'last_position': 40}, format='json')
+
+        # Same watched range again: no coverage change, so no follow-up UPDATE
+        with CaptureQueriesContext(connection) as queries:
+            api_client.post(url, {'duration_delta': 15, 'last_position': 40}, format='json')
+
+        progress_sql = [q['sql'] for q in queries if 'progress' in q['sql'].split('(')[0]]
+        assert len(progress_sql) == 2
+        assert all('ON CONFLICT' in sql for sql in progress_sql)
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert (res_progress.watch_time_seconds, res_progress.last_position_seconds) == (30, 40)
+
+    def test_upsert_completion_is_counted_once(self, api_client, learner, module, resource, second_resource):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        for _ in range(3):
+            response = api_client.post(url, {'completed': True, 'watch_time': 50}, format='json')
+        assert response.data['resource_completed'] is True
+
+        mod_progress = ModuleProgress.objects.get(user=learner, module=module)
+        assert mod_progress.completed_resources == 1
+        assert mod_progress.status == 'in_progress'
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert res_progress.completed_at is not None
+        assert res_progress.watch_time_seconds == 50
+
+
+@pytest.mark.django_db
+class TestEventLog:
+
+    @pytest.fixture
+    def ingest(self, settings):
+        settings.TELEMETRY_EVENT_LOG = 'ingest'
+
+    def test_ingest_is_insert_only(self, api_client, learner, module, resource, ingest):
+        from apps.analytics.models import TelemetryEvent
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('pulse_batch')
+        pulses = [{'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15}] * 3
+        response = api_client.post(url, {'pulses': pulses}, format='json')
+
+        assert response.data['buffered'] == [resource.id]
+        assert TelemetryEvent.objects.filter(user=learner, applied=False).count() == 3
+        assert not ResourceProgress.objects.filter(user=learner).exists()
+        assert not LearningSession.objects.filter(user=learner).exists()
+
+    def test_rollup_applies_events_once(self, api_client, learner, module, resource, ingest):
+        from apps.analytics.sessions import SESSION_WINDOW
+        from apps.modules.eventlog import focus_by_user, rollup_all
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        api_client.post(url, {'duration_delta': 15, 'completed': True}, format='json')
+
+        assert rollup_all(lag_seconds=0) == 2
+        assert rollup_all(lag_seconds=0) == 0
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert res_progress.watch_time_seconds == 30
+        assert res_progress.completed is True
+        assert ModuleProgress.objects.get(user=learner, module=module).status == 'completed'
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 30
+        assert focus_by_user(timezone.now() - SESSION_WINDOW) == {learner.id: 30}
+        # Shard bounds are half-open: the learner is the last id of one shard, not the next
+        assert focus_by_user(timezone.now() - SESSION_WINDOW, user_range=(1, learner.id + 1)) == {learner.id: 30}
+        assert focus_by_user(timezone.now() - SESSION_WINDOW, user_range=(learner.id + 1, learner.id + 2)) == {}
+
+    def test_record_mode_is_not_rolled_up_again(self, api_client, learner, module, resource, settings):
+        from apps.modules.eventlog import rollup_all
+
+        settings.TELEMETRY_EVENT_LOG = 'record'
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        # Already applied at ingest, so the rollup never selects it
+        assert rollup_all(lag_seconds=0) == 0
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+    def test_late_commit_below_cursor_is_rolled_up(self, api_client, learner, module, resource, ingest):
+        from apps.analytics.models import TelemetryCursor
+        from apps.modules.eventlog import ROLLUP_CURSOR, rollup_all
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        # A concurrent batch with higher ids was rolled up before this insert committed
+        TelemetryCursor.objects.create(name=ROLLUP_CURSOR, position=10 ** 9)
+
+        assert rollup_all(lag_seconds=0) == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+        assert TelemetryCursor.objects.get(name=ROLLUP_CURSOR).position == 10 ** 9
+
+
+@pytest.mark.django_db
+class TestPulseDedupe:
+
+    def test_retried_pulse_is_counted_once(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15, '_trace': 1700000000000}, format='json')
+        response = api_client.post(url, {'duration_delta': 15, '_trace': 1700000000000}, format='json')
+        assert response.data['status'] == 'duplicate'
+        api_client.post(url, {'duration_delta': 15, '_trace': 1700000015000}, format='json')
+
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 30
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 30
+
+    def test_duplicates_within_batch_are_dropped(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        pulse = {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15, 'idempotency_key': 'a'}
+        response = api_client.post(reverse('pulse_batch'), {'pulses': [pulse, pulse]}, format='json')
+
+        assert response.data['duplicates'] == [1]
+        assert response.data['applied'] == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+    def test_failed_apply_releases_key(self, api_client, learner, module, resource, monkeypatch):
+        from apps.modules import telemetry
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        original = telemetry.apply_pending
+
+        def failing(*args, **kwargs):
+            raise RuntimeError("db down")
+        monkeypatch.setattr(telemetry, 'apply_pending', failing)
+        with pytest.raises(RuntimeError):
+            api_client.post(url, {'duration_delta': 15, '_trace': 42}, format='json')
+
+        monkeypatch.setattr(telemetry, 'apply_pending', original)
+        response = api_client.post(url, {'duration_delta': 15, '_trace': 42}, format='json')
+        assert response.data['status'] == 'synchronized'
+
+    def test_retry_on_another_worker_is_dropped(self, api_client, learner, module, resource, settings, tmp_path, monkeypatch):
+        from apps.modules import dedupe
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path),
+        }}
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15, '_trace': 1700000000000}, format='json')
+        # A different worker starts with an empty local LRU
+        monkeypatch.setattr(dedupe, '_seen', None)
+        response = api_client.post(url, {'duration_delta': 15, '_trace': 1700000000000}, format='json')
+        assert response.data['status'] == 'duplicate'
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+    def test_keys_expire_and_stay_bounded(self, monkeypatch):
+        from apps.modules import dedupe
+
+        clock = [1000.0]
+        monkeypatch.setattr(dedupe.time, 'monotonic', lambda: clock[0])
+        seen = dedupe.ExpiringKeySet(ttl=60, max_keys=2)
+        assert seen.claim('a') and not seen.claim('a')
+        seen.claim('b')
+        seen.claim('c')
+        assert len(seen) == 2 and seen.claim('a')
+        clock[0] += 61
+        assert seen.claim('b')
+        assert len(seen) == 1
+
+
+@pytest.mark.django_db
+class TestBeaconIntake:
+
+    @pytest.fixture
+    def beacon(self):
+        from django.test import Client
+        client = Client(enforce_csrf_checks=True)
+
+        def post(body):
+            return client.post(reverse('pulse_beacon'), data=body, content_type='text/plain')
+        return post
+
+    def _token(self, user):
+        from rest_framework_simplejwt.tokens import AccessToken
+        return str(AccessToken.for_user(user))
+
+    def test_compact_and_ndjson_lines(self, beacon, learner, module, resource):
+        body = (
+            f"{self._token(learner)}\n"
+            f"{module.id},{resource.id},15,,40,0,t1\n"
+            f'{{"module_id": {module.id}, "resource_id": {resource.id}, "duration_delta": 5, "completed": true}}\n'
+        )
+        response = beacon(body)
+        assert response.status_code == 204
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert (res_progress.watch_time_seconds, res_progress.last_position_seconds) == (20, 40)
+        assert res_progress.completed is True
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 20
+
+    def test_rejects_bad_token_and_payload(self, beacon, learner, module, resource):
+        assert beacon(f"not-a-token\n{module.id},{resource.id},15").status_code == 401
+        assert beacon("").status_code == 401
+        assert beacon(f"{self._token(learner)}\n{module.id},{resource.id},-5").status_code == 400
+        assert not ResourceProgress.objects.filter(user=learner).exists()
+
+    def test_rejects_inactive_or_deleted_user(self, beacon, learner, module, resource):
+        token = self._token(learner)
+        learner.is_active = False
+        learner.save()
+        assert beacon(f"{token}\n{module.id},{resource.id},15").status_code == 401
+        learner.delete()
+        assert beacon(f"{token}\n{module.id},{resource.id},15").status_code == 401
+        assert not ResourceProgress.objects.exists()
+
+    def test_malformed_content_length_is_rejected(self, learner, module, resource):
+        from django.test import Client
+        body = f"{self._token(learner)}\n{module.id},{resource.id},15"
+        response = Client().generic('POST', reverse('pulse_beacon'), body, content_type='text/plain', CONTENT_LENGTH='abc')
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestAdmissionControl:
+
+    @pytest.fixture
+    def clock(self, settings, monkeypatch):
+        from apps.modules import admission
+
+        settings.TELEMETRY_ADMISSION = True
+        monkeypatch.setattr(admission, '_controller', None)
+        now = [1000.0]
+        monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+        return now
+
+    def test_over_frequent_pulses_are_merged(self, api_client, learner, module, resource, clock):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        clock[0] += 2
+        response = api_client.post(url, {'duration_delta': 15, 'last_position': 20}, format='json')
+        assert response.data['status'] == 'buffered'
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+        clock[0] += 13
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        # 30s claimed over 15s of wall clock: credit capped at elapsed + slack
+        assert res_progress.watch_time_seconds == 15 + 20
+        assert res_progress.last_position_seconds == 20
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 35
+
+    def test_inflated_delta_is_capped(self, api_client, learner, module, resource, clock):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        clock[0] += 15
+        api_client.post(url, {'duration_delta': 3600}, format='json')
+
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15 + 20
+
+    def test_completion_is_never_held_and_holds_are_released(self, api_client, learner, module, resource, second_resource, clock):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        other = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': second_resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        clock[0] += 1
+        api_client.post(url, {'last_position': 50}, format='json')
+        clock[0] += 1
+        response = api_client.post(other, {'completed': True}, format='json')
+        assert response.data['resource_completed'] is True
+
+        # No follow-up pulse for the first resource: its hold is released by later traffic
+        clock[0] += 30
+        api_client.post(other, {'duration_delta': 15}, format='json')
+        assert ResourceProgress.objects.get(user=learner, resource=resource).last_position_seconds == 50
+
+    def test_holds_are_released_without_more_traffic(self, api_client, learner, module, resource, clock):
+        from apps.modules.admission import release_held
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        clock[0] += 1
+        api_client.post(url, {'last_position': 50}, format='json')
+
+        # The tab's last pulse: the releaser thread delivers it once due
+        assert release_held() == 0
+        clock[0] += 10
+        assert release_held() == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).last_position_seconds == 50
+
+        # At exit every hold is delivered, due or not
+        clock[0] += 1
+        api_client.post(url, {'last_position': 70}, format='json')
+        assert release_held(force=True) == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).last_position_seconds == 70
+
+
+@pytest.mark.django_db
+class TestBacklogReplay:
+
+    def _post(self, api_client, lines, compress=True):
+        import gzip
+        import json
+
+        body = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+        headers = {}
+        if compress:
+            body = gzip.compress(body)
+            headers['HTTP_CONTENT_ENCODING'] = 'gzip'
+        return api_client.generic('POST', reverse('pulse_replay'), body, content_type='application/x-ndjson', **headers)
+
+    def test_backlog_applied_in_time_order_with_dedupe(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        start = int(timezone.now().timestamp() * 1000) - 3600 * 1000
+        pulse = {'module_id': module.id, 'resource_id': resource.id}
+        lines = [
+            {**pulse, 'duration_delta': 15, 'last_position': 30, 'ts': start + 30000, '_trace': start + 30000},
+            {**pulse, 'duration_delta': 15, 'last_position': 15, 'ts': start + 15000, '_trace': start + 15000},
+            {**pulse, 'duration_delta': 15, 'last_position': 30, 'ts': start + 30000, '_trace': start + 30000},
+            {**pulse, 'duration_delta': 15, 'ts': 'yesterday'},
+        ]
+        response = self._post(api_client, lines)
+
+        assert response.status_code == 200
+        assert response.data['applied'] == 2
+        assert response.data['duplicates'] == 1
+        assert [item['line'] for item in response.data['invalid']] == [4]
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert (res_progress.watch_time_seconds, res_progress.last_position_seconds) == (30, 30)
+
+    def test_credit_capped_by_client_gaps(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        start = int(timezone.now().timestamp() * 1000) - 600 * 1000
+        pulse = {'module_id': module.id, 'resource_id': resource.id}
+        lines = [
+            {**pulse, 'duration_delta': 15, 'ts': start},
+            {**pulse, 'duration_delta': 900, 'ts': start + 15000},
+        ]
+        self._post(api_client, lines, compress=False)
+
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15 + 20
+
+    def test_replay_never_lowers_newer_live_state(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'watch_time': 300, 'last_position': 300}, format='json')
+
+        now = int(timezone.now().timestamp() * 1000)
+        pulse = {'module_id': module.id, 'resource_id': resource.id}
+        lines = [
+            {**pulse, 'watch_time': 60, 'last_position': 60, 'ts': now - 240000, '_trace': now - 240000},
+            {**pulse, 'duration_delta': 15, 'completed': True, 'ts': now - 225000, '_trace': now - 225000},
+        ]
+        assert self._post(api_client, lines).status_code == 200
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert (res_progress.watch_time_seconds, res_progress.last_position_seconds) == (315, 300)
+        assert res_progress.completed is True
+
+    def test_rejects_corrupt_gzip(self, api_client, learner):
+        api_client.force_authenticate(user=learner)
+        response = api_client.generic(
+            'POST', reverse('pulse_replay'), b'not gzip at all', content_type='application/x-ndjson',
+            HTTP_CONTENT_ENCODING='gzip',
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestShardedCounters:
+
+    @pytest.fixture
+    def sharded(self, settings):
+        from apps.modules.upsert import supports_upsert
+        if not supports_upsert():
+            pytest.skip("Sharded counters need INSERT ... ON CONFLICT")
+        settings.TELEMETRY_SHARDED_COUNTERS = True
+        settings.TELEMETRY_COUNTER_SHARDS = 4
+
+    def test_focus_goes_to_shards_and_compacts(self, api_client, learner, module, resource, sharded):
+        from apps.analytics.counters import compact_all, pending_focus
+        from apps.analytics.models import CounterShard
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        for _ in range(4):
+            api_client.post(url, {'duration_delta': 15}, format='json')
+
+        session = LearningSession.objects.get(user=learner)
+        # First pulse opens the session; later ones only touch shards
+        assert session.focus_duration_seconds == 15
+        assert pending_focus([learner.id]) == {learner.id: 45}
+        assert CounterShard.objects.filter(kind='watch').exists()
+
+        compact_all()
+        session.refresh_from_db()
+        assert session.focus_duration_seconds == 60
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 60
+        assert not CounterShard.objects.exists()
+
+    def test_absolute_watch_time_discards_shards(self, api_client, learner, module, resource, sharded):
+        from apps.analytics.counters import compact_all
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        progress = api_client.get(reverse('module_progress', kwargs={'pk': module.id})).data
+        assert progress['resources_progress'][0]['watch_time_seconds'] == 30
+
+        api_client.post(url, {'duration_delta': 15, 'watch_time': 100}, format='json')
+        compact_all()
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 100
+
+    def test_running_total_resync_stays_sharded(self, api_client, learner, module, resource, sharded):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.analytics.counters import compact_all
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15, 'watch_time': 15}, format='json')
+        # ModulePlayer resends its growing total with every pulse
+        with CaptureQueriesContext(connection) as queries:
+            api_client.post(url, {'duration_delta': 15, 'watch_time': 30}, format='json')
+        assert not any(q['sql'].startswith('DELETE') for q in queries)
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+
+        # A lower total is a real resync: it overwrites and drops the shards
+        api_client.post(url, {'duration_delta': 15, 'watch_time': 20}, format='json')
+        compact_all()
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 20
+
+
+@pytest.mark.django_db
+class TestSessionization:
+
+    @pytest.fixture
+    def event_sessions(self, settings):
+        settings.TELEMETRY_EVENT_LOG = 'record'
+        settings.TELEMETRY_SESSION_MODE = 'events'
+        settings.TELEMETRY_SESSION_GAP_SECONDS = 300
+
+    def _replay(self, api_client, module, resource, offsets):
+        import json
+        start = int(timezone.now().timestamp() * 1000) - 3 * 3600 * 1000
+        body = ''.join(
+            json.dumps({'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15, 'ts': start + offset * 1000}) + '\n'
+            for offset in offsets
+        )
+        api_client.generic('POST', reverse('pulse_replay'), body.encode(), content_type='application/x-ndjson')
+
+    def test_write_path_skips_sessions(self, api_client, learner, module, resource, event_sessions):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+        assert not LearningSession.objects.filter(user=learner).exists()
+
+    def test_sessions_split_on_idle_gap_and_resume_incrementally(self, api_client, learner, module, resource, event_sessions):
+        from apps.analytics.sessionization import sessionize_all
+
+        api_client.force_authenticate(user=learner)
+        # Two bursts 20 minutes apart
+        self._replay(api_client, module, resource, [0, 15, 30, 1230, 1245])
+        assert sessionize_all(lag_seconds=0) == 5
+
+        sessions = list(LearningSession.objects.filter(user=learner).order_by('start_time'))
+        assert [s.focus_duration_seconds for s in sessions] == [45, 30]
+        assert (sessions[0].end_time - sessions[0].start_time).total_seconds() == 45
+
+        # A later batch continuing the second burst extends it instead of opening a new session
+        self._replay(api_client, module, resource, [1260])
+        assert sessionize_all(lag_seconds=0) == 1
+        assert list(LearningSession.objects.filter(user=learner).order_by('start_time').values_list(
+            'focus_duration_seconds', flat=True)) == [45, 45]
+
+
+    def test_late_commit_below_cursor_is_sessionized(self, api_client, learner, module, resource, event_sessions):
+        from apps.analytics.models import TelemetryCursor
+        from apps.analytics.sessionization import SESSIONIZE_CURSOR, sessionize_all
+
+        api_client.force_authenticate(user=learner)
+        self._replay(api_client, module, resource, [0, 15])
+        # A concurrent batch with higher ids was sessionized before these inserts committed
+        TelemetryCursor.objects.create(name=SESSIONIZE_CURSOR, position=10 ** 9)
+
+        assert sessionize_all(lag_seconds=0) == 2
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 30
+        assert sessionize_all(lag_seconds=0) == 0
+
+    def test_sessionize_refuses_inline_mode(self, api_client, learner, module, resource, settings):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from apps.analytics.sessionization import sessionize_all
+
+        settings.TELEMETRY_EVENT_LOG = 'record'
+        api_client.force_authenticate(user=learner)
+        self._replay(api_client, module, resource, [0, 15])
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 30
+
+        assert sessionize_all(lag_seconds=0) == 0
+        with pytest.raises(CommandError):
+            call_command('sessionize_telemetry', lag=0)
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 30
+
+@pytest.mark.django_db
+class TestCoverageBitmap:
+
+    def test_replayed_minute_adds_no_coverage(self, api_client, learner, module, resource):
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        for position in (15, 30, 15, 30, 60):
+            api_client.post(url, {'duration_delta': 15, 'last_position': position}, format='json')
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert res_progress.watch_time_seconds == 75
+        assert res_progress.covered_seconds == 45
+
+        from apps.modules.coverage import covered_ranges, is_covered
+        assert covered_ranges(res_progress.coverage) == [(0, 30), (45, 60)]
+        assert not is_covered(res_progress.coverage, 0, 60)
+
+        progress = api_client.get(reverse('module_progress', kwargs={'pk': module.id})).data
+        assert progress['resources_progress'][0]['covered_seconds'] == 45
+
+    def test_batch_ors_coverage(self, api_client, learner, module, resource, second_resource):
+        api_client.force_authenticate(user=learner)
+        pulses = [
+            {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 10, 'last_position': 10},
+            {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 10, 'last_position': 30},
+            {'module_id': module.id, 'resource_id': second_resource.id, 'duration_delta': 5, 'last_position': 5},
+        ]
+        api_client.post(reverse('pulse_batch'), {'pulses': pulses}, format='json')
+        api_client.post(reverse('pulse_batch'), {'pulses': pulses[:1]}, format='json')
+
+        res_progress = ResourceProgress.objects.get(user=learner, resource=resource)
+        assert res_progress.covered_seconds == 20
+        assert ResourceProgress.objects.get(user=learner, resource=second_resource).covered_seconds == 5
+
+
+@pytest.mark.django_db
+class TestTelemetrySpool:
+
+    @pytest.fixture
+    def spool_dir(self, settings, tmp_path, monkeypatch):
+        from apps.modules import spool
+        settings.TELEMETRY_SPOOL_DIR = str(tmp_path)
+        monkeypatch.setattr(spool, '_spool', None)
+        # Drain explicitly instead of from the background thread
+        monkeypatch.setattr(spool.Spool, '_ensure_drainer', lambda self: None)
+        return tmp_path
+
+    def test_always_mode_spools_then_drains(self, api_client, learner, module, resource, settings, spool_dir):
+        from apps.modules.spool import drain_all, get_spool, list_segments
+        settings.TELEMETRY_SPOOL = 'always'
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        for _ in range(3):
+            assert api_client.post(url, {'duration_delta': 15}, format='json').data['status'] == 'buffered'
+        # Pulses for a missing resource are only rejected when drained
+        api_client.post(reverse('pulse_batch'), {'pulses': [
+            {'module_id': module.id, 'resource_id': resource.id + 99, 'duration_delta': 15},
+        ]}, format='json')
+        assert not ResourceProgress.objects.exists()
+
+        get_spool().rotate()
+        assert drain_all() == (4, 0)
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 45
+        assert LearningSession.objects.get(user=learner).focus_duration_seconds == 45
+        assert list_segments() == []
+
+    def test_drain_commits_past_write_behind(self, api_client, learner, module, resource, settings, spool_dir, write_behind):
+        from apps.modules.spool import drain_all, get_spool
+        settings.TELEMETRY_SPOOL = 'always'
+
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        api_client.post(url, {'duration_delta': 15}, format='json')
+        get_spool().rotate()
+
+        assert drain_all() == (1, 0)
+        # The segment is gone, so its pulse must already be in the database
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+        assert write_behind.backend.drain() == ({}, {})
+
+    def test_fallback_spools_on_database_error(self, api_client, learner, module, resource, settings, spool_dir, monkeypatch):
+        from django.db import OperationalError
+        from apps.modules import telemetry
+        from apps.modules.spool import get_spool
+        settings.TELEMETRY_SPOOL = 'fallback'
+
+        def unavailable(batches):
+            raise OperationalError("server closed the connection unexpectedly")
+        api_client.force_authenticate(user=learner)
+        url = reverse('resource_complete', kwargs={'module_id': module.id, 'resource_id': resource.id})
+        with monkeypatch.context() as m:
+            m.setattr(telemetry, 'dispatch_pulses', unavailable)
+            response = api_client.post(url, {'duration_delta': 15}, format='json')
+        assert response.status_code == 200
+        assert response.data['status'] == 'buffered'
+
+        assert api_client.post(url, {'duration_delta': 15}, format='json').data['status'] == 'synchronized'
+        assert get_spool().drain() == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 30
+
+    def test_drain_resumes_from_cursor_and_skips_torn_tail(self, learner, module, resource, spool_dir):
+        import os
+        from apps.analytics.models import TelemetryCursor
+        from apps.modules.spool import _encode, drain_segment
+
+        pulse = {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15,
+                 'watch_time': None, 'last_position': None, 'completed': False, 'idempotency_key': None}
+        first = _encode(learner.id, [pulse]).encode()
+        path = os.path.join(spool_dir, '0001-host-1-000001.log')
+        with open(path, 'wb') as segment:
+            segment.write(first + _encode(learner.id, [pulse]).encode() + b'{"u": 1, "p": [')
+        # A previous drain committed the first record before crashing
+        TelemetryCursor.objects.create(name='spool:0001-host-1-000001.log', position=len(first))
+
+        assert drain_segment(path) == 1
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
+        assert not os.path.exists(path)
+        assert not TelemetryCursor.objects.filter(name__startswith='spool:').exists()
+
+    def test_poisoned_records_are_quarantined(self, learner, module, resource, spool_dir):
+        import os
+        from apps.modules.spool import _decode, _encode, drain_all, list_segments
+
+        def pulse(**fields):
+            return {'module_id': module.id, 'resource_id': resource.id, 'duration_delta': 15, 'watch_time': None,
+                    'last_position': None, 'completed': False, 'idempotency_key': None, **fields}
+        with open(os.path.join(spool_dir, '0001-host-1-000001.log'), 'w') as segment:
+            segment.write(_encode(learner.id, [pulse(watch_time=10 ** 20)]))  # Overflows the column
+            segment.write(_encode(learner.id + 999, [pulse()]))  # User deleted since
+            segment.write(_encode(learner.id, [pulse()]))
+        with open(os.path.join(spool_dir, '0002-host-1-000002.log'), 'w') as segment:
+            segment.write(_encode(learner.id, [pulse()]))
+
+        assert drain_all() == (4, 0)
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 30
+        assert list_segments() == []
+        with open(os.path.join(spool_dir, 'quarantine', '0001-host-1-000001.log')) as quarantine:
+            assert [_decode(line)[0] for line in quarantine] == [learner.id + 999, learner.id]
+
+    def test_management_command_inspects_and_replays(self, learner, module, resource, settings, spool_dir):
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.modules.telemetry import normalize_pulse, apply_pulses
+        from apps.modules.spool import get_spool
+        settings.TELEMETRY_SPOOL = 'always'
+
+        apply_pulses(learner.id, [normalize_pulse({'duration_delta': 15}, module.id, resource.id)])
+        get_spool().rotate()
+
+        out = StringIO()
+        call_command('telemetry_spool', '--inspect', stdout=out)
+        assert '1 records' in out.getvalue()
+        call_command('telemetry_spool', '--replay', stdout=out)
+        assert '[Spool] Replayed 1 records' in out.getvalue()
+        assert ResourceProgress.objects.get(user=learner, resource=resource).watch_time_seconds == 15
@@ -0,0 +1,127 @@
+"""
+Upsert Write Path
+
+INSERT ... ON CONFLICT ... DO UPDATE ... RETURNING statements for the two
+progress rows a pulse touches. One statement creates or increments the
+ResourceProgress row and one creates or touches the ModuleProgress row, so
+a single-resource pulse needs no get_or_create round trips and never races
+into IntegrityError retries. Coverage bitmaps are OR-merged with a follow-up
+UPDATE only when the pulse adds new segments.
+
+Supported on PostgreSQL and SQLite >= 3.35 (RETURNING); other backends use
+the ORM bulk path in telemetry.py.
+"""
+
+from django.db import connection
+
+from . import coverage
+from .models import ModuleProgress, ResourceProgress
+
+
+def supports_upsert():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35, 0)
+
+
+def _columns(model, *names):
+    return {name: connection.ops.quote_name(model._meta.get_field(name).column) for name in names}
+
+
+def upsert_resource_progress(user_id, resource_id, state, now):
+    """
+    Apply one PendingProgress. Returns {"completed", "newly_completed", "coverage_changed"}.
+    """
+    table = connection.ops.quote_name(ResourceProgress._meta.db_table)
+    col = _columns(
+        ResourceProgress, 'id', 'user', 'resource', 'completed', 'watch_time_seconds',
+        'last_position_seconds', 'coverage', 'completed_at', 'updated_at',
+    )
+    stamp = connection.ops.adapt_datetimefield_value(now)
+
+    if state.watch_time is not None:
+        watch_time, watch_expr = state.watch_time + state.delta, f'EXCLUDED.{col["watch_time_seconds"]}'
+    elif state.delta:
+        watch_time, watch_expr = state.delta, f'{table}.{col["watch_time_seconds"]} + EXCLUDED.{col["watch_time_seconds"]}'
+    else:
+        watch_time, watch_expr = 0, f'{table}.{col["watch_time_seconds"]}'
+
+    if state.last_position is not None:
+        position_expr = f'EXCLUDED.{col["last_position_seconds"]}'
+    else:
+        position_expr = f'{table}.{col["last_position_seconds"]}'
+
+    sql = f"""
+        INSERT INTO {table} ({col['user']}, {col['resource']}, {col['completed']}, {col['watch_time_seconds']},
+                             {col['last_position_seconds']}, {col['coverage']}, {col['completed_at']}, {col['updated_at']})
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT ({col['user']}, {col['resource']}) DO UPDATE SET
+            {col['watch_time_seconds']} = {watch_expr},
+            {col['last_position_seconds']} = {position_expr},
+            {col['completed']} = {table}.{col['completed']} OR EXCLUDED.{col['completed']},
+            {col['completed_at']} = CASE WHEN {table}.{col['completed']} THEN {table}.{col['completed_at']}
+                                         ELSE EXCLUDED.{col['completed_at']} END,
+            {col['updated_at']} = EXCLUDED.{col['updated_at']}
+        RETURNING {col['id']}, {col['completed']}, {col['coverage']}, CASE WHEN {col['completed_at']} = %s THEN 1 ELSE 0 END
+    """
+    params = [
+        user_id, resource_id, state.completed, watch_time, state.last_position or 0,
+        coverage.to_bitmap(state.coverage), stamp if state.completed else None, stamp, stamp,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        pk, completed, stored, stamped = cursor.fetchone()
+        # Bytes have no portable SQL OR; the row is locked by the upsert, so merge here
+        stored = coverage.to_mask(stored)
+        merged = stored | state.coverage
+        if merged != stored:
+            cursor.execute(
+                f"UPDATE {table} SET {col['coverage']} = %s WHERE {col['id']} = %s",
+                [coverage.to_bitmap(merged), pk],
+            )
+    # completed_at only equals this statement's timestamp if this statement completed the row
+    return {
+        "completed": bool(completed),
+        "newly_completed": bool(state.completed and stamped),
+        # Either new bits were merged, or the row was just inserted with exactly this pulse's bits
+        # (an existing row already holding exactly these bits is indistinguishable; invalidating it is harmless)
+        "coverage_changed": bool(state.coverage) and (merged != stored or stored == state.coverage),
+    }
+
+
+def upsert_module_progress(user_id, module_id, completed_increment, now):
+    """
+    Create or touch ModuleProgress and bump its resource counter.
+    Returns (ModuleProgress with the post-write state, created).
+    """
+    table = connection.ops.quote_name(ModuleProgress._meta.db_table)
+    col = _columns(
+        ModuleProgress, 'id', 'user', 'module', 'status', 'started_at', 'last_accessed', 'completed_at',
+        'completed_resources', 'quiz_passed', 'assignment_submitted',
+    )
+    stamp = connection.ops.adapt_datetimefield_value(now)
+
+    sql = f"""
+        INSERT INTO {table} ({col['user']}, {col['module']}, {col['status']}, {col['started_at']},
+                             {col['last_accessed']}, {col['completed_at']}, {col['completed_resources']},
+                             {col['quiz_passed']}, {col['assignment_submitted']})
+        VALUES (%s, %s, 'in_progress', %s, %s, NULL, %s, %s, %s)
+        ON CONFLICT ({col['user']}, {col['module']}) DO UPDATE SET
+            {col['status']} = CASE WHEN {table}.{col['status']} = 'not_started' THEN 'in_progress'
+                                   ELSE {table}.{col['status']} END,
+            {col['last_accessed']} = EXCLUDED.{col['last_accessed']},
+            {col['completed_resources']} = {table}.{col['completed_resources']} + EXCLUDED.{col['completed_resources']}
+        RETURNING {col['id']}, {col['status']}, {col['completed_resources']}, {col['quiz_passed']},
+                  {col['assignment_submitted']}, CASE WHEN {col['started_at']} = %s THEN 1 ELSE 0 END
+    """
+    params = [user_id, module_id, stamp, stamp, completed_increment, False, False, stamp]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        pk, status, completed_resources, quiz_passed, assignment_submitted, created = cursor.fetchone()
+
+    row = ModuleProgress(
+        pk=pk, user_id=user_id, module_id=module_id, status=status,
+        completed_resources=completed_resources,
+        quiz_passed=bool(quiz_passed), assignment_submitted=bool(assignment_submitted),
+    )
+    return row, bool(created)
@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import ModuleListCreateView, ModuleDetailView, ModuleProgressView, UpdateResourceProgressView, UpdateVideoProgressView, ResourceCreateView, AssignModuleView
+from .views import ModuleListCreateView, ModuleDetailView, ModuleProgressView, UpdateResourceProgressView, UpdateVideoProgressView, PulseBatchView, PulseBeaconView, PulseReplayView, ResourceCreateView, AssignModuleView
 
 urlpatterns = [
     path('', ModuleListCreateView.as_view(), name='module_list_create'),
+    path('pulses/batch/', PulseBatchView.as_view(), name='pulse_batch'),
+    path('pulses/beacon/', PulseBeaconView.as_view(), name='pulse_beacon'),
+    path('pulses/replay/', PulseReplayView.as_view(), name='pulse_replay'),
     path('<int:pk>/', ModuleDetailView.as_view(), name='module_detail'),
     path('<int:pk>/progress/', ModuleProgressView.as_view(), name='module_progress'),
     path('<int:module_id>/resources/<int:resource_id>/complete/', UpdateResourceProgressView.as_view(), name='resource_complete'),
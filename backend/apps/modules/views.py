@@ -60,8 +60,13 @@ class ModuleProgressView(generics.RetrieveAPIView):
         progress, created = ModuleProgress.objects.get_or_create(user=self.request.user, module=module)
         return progress
 
-from apps.analytics.models import LearningSession
-from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from .beacon import MAX_BEACON_BYTES, BeaconAuthError, InvalidBeacon, parse_beacon
+from .replay import InvalidReplay, cap_by_client_time, keep_newer_state, parse_backlog
+from .telemetry import InvalidPulse, MAX_BATCH_PULSES, apply_pulses, normalize_pulse
 
 class UpdateResourceProgressView(APIView):
     """
@@ -73,65 +78,128 @@ class UpdateResourceProgressView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
 
-    def _get_or_create_session(self, user):
-        one_hour_ago = timezone.now() - timezone.timedelta(hours=1)
-        session = LearningSession.objects.filter(
-            user=user, 
-            start_time__gte=one_hour_ago
-        ).order_by('-start_time').first()
-        
-        if not session:
-            session = LearningSession.objects.create(user=user)
-        return session
-
     def post(self, request, module_id, resource_id):
-        resource = generics.get_object_or_404(Resource, pk=resource_id, module_id=module_id)
-        res_progress, created = ResourceProgress.objects.get_or_create(user=request.user, resource=resource)
-        mod_progress, _ = ModuleProgress.objects.get_or_create(user=request.user, module_id=module_id)
-
-        # 1. Update State (Absolute vs Incremental)
-        pulse_delta = request.data.get('duration_delta')
-        absolute_watch_time = request.data.get('watch_time')
-        last_position = request.data.get('last_position')
-        force_complete = request.data.get('completed', False)
-
-        if pulse_delta:
-            # Atomic focus increment
-            res_progress.watch_time_seconds = F('watch_time_seconds') + int(pulse_delta)
-            
-            # Update Learning Session
-            session = self._get_or_create_session(request.user)
-            session.focus_duration_seconds = F('focus_duration_seconds') + int(pulse_delta)
-            session.end_time = timezone.now()
-            session.save()
-
-        if absolute_watch_time is not None:
-            res_progress.watch_time_seconds = int(absolute_watch_time)
-        
-        if last_position is not None:
-            res_progress.last_position_seconds = int(last_position)
+        try:
+            pulse = normalize_pulse(request.data, module_id=module_id, resource_id=resource_id)
+        except InvalidPulse as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.headers.get('Idempotency-Key'):
+            pulse['idempotency_key'] = request.headers['Idempotency-Key'][:64]
+
+        # Single pulse = batch of one, so both endpoints share the same semantics
+        result = apply_pulses(request.user.id, [pulse])
+        if result['rejected']:
+            raise Http404
+        if result['duplicates']:
+            # Retry of a pulse already counted
+            return Response({
+                "status": "duplicate",
+                "resource_completed": None,
+                "module_status": None
+            })
+        if resource_id in result['buffered']:
+            # Write-behind or spool: accepted but not yet applied, module status unchanged by this pulse
+            return Response({
+                "status": "buffered",
+                "resource_completed": None,
+                "module_status": None
+            })
+
+        outcome = result['applied'][resource_id]
+        return Response({
+            "status": "synchronized", 
+            "resource_completed": outcome['resource_completed'],
+            "module_status": outcome['module_status']
+        })
 
-        # 2. Completion Logic
-        if force_complete and not res_progress.completed:
-            res_progress.completed = True
-            res_progress.completed_at = timezone.now()
-        
-        res_progress.save()
+class PulseBatchView(APIView):
+    """
+    Batched Heartbeat Endpoint.
+    Accepts {"pulses": [{module_id, resource_id, duration_delta, watch_time, last_position, completed}, ...]}
+    and applies them in one transaction with a constant number of queries.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-        # Update last_accessed on module
-        if mod_progress.status == 'not_started':
-            mod_progress.status = 'in_progress'
-        mod_progress.save()
+    def post(self, request):
+        raw = request.data.get('pulses') if hasattr(request.data, 'get') else request.data
+        if not isinstance(raw, list) or not raw:
+            return Response({"error": "'pulses' must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw) > MAX_BATCH_PULSES:
+            return Response({"error": f"At most {MAX_BATCH_PULSES} pulses per batch"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 3. Principled Completion Check
-        is_module_done = mod_progress.check_completion()
+        try:
+            pulses = [normalize_pulse(item) for item in raw]
+        except InvalidPulse as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
+        result = apply_pulses(request.user.id, pulses)
         return Response({
-            "status": "synchronized", 
-            "resource_completed": res_progress.completed,
-            "module_status": mod_progress.status
+            "status": "synchronized",
+            "applied": len(pulses) - len(result['rejected']) - len(result['duplicates']),
+            "buffered": result['buffered'],
+            "duplicates": result['duplicates'],
+            "results": [
+                {"resource_id": resource_id, **outcome}
+                for resource_id, outcome in result['applied'].items()
+            ],
+            "rejected": result['rejected']
         })
 
+class PulseReplayView(APIView):
+    """
+    Offline Backlog Replay.
+    Accepts NDJSON pulses with client `ts` (epoch ms), gzip-compressed when sent
+    with Content-Encoding: gzip, streamed and applied in one bulk write (see replay.py).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        stream = request.stream
+        if stream is None:
+            return Response({"error": "Empty backlog"}, status=status.HTTP_400_BAD_REQUEST)
+        compressed = request.headers.get('Content-Encoding', '').lower() == 'gzip'
+        try:
+            pulses, invalid = parse_backlog(stream, compressed)
+        except InvalidReplay as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        pulses = keep_newer_state(request.user.id, cap_by_client_time(pulses))
+        result = apply_pulses(request.user.id, pulses, admission=False)
+        return Response({
+            "status": "synchronized",
+            "applied": len(pulses) - len(result['rejected']) - len(result['duplicates']),
+            "duplicates": len(result['duplicates']),
+            "rejected": [{"resource_id": r['resource_id'], "error": r['error']} for r in result['rejected']],
+            "invalid": invalid
+        })
+
+@method_decorator(csrf_exempt, name='dispatch')
+class PulseBeaconView(View):
+    """
+    sendBeacon Intake (see beacon.py for the payload format).
+    Plain Django view: the token travels in the body, so no DRF authentication,
+    parsing or serialization runs. Beacons ignore responses, so replies are bare.
+    """
+    http_method_names = ['post']
+
+    def post(self, request):
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return HttpResponse('Invalid Content-Length', status=400, content_type='text/plain')
+        if content_length > MAX_BEACON_BYTES:
+            return HttpResponse(status=413)
+        try:
+            user_id, pulses = parse_beacon(request.body)
+        except BeaconAuthError:
+            return HttpResponse(status=401)
+        except InvalidBeacon as exc:
+            return HttpResponse(str(exc), status=400, content_type='text/plain')
+
+        apply_pulses(user_id, pulses)
+        return HttpResponse(status=204)
+
 class UpdateVideoProgressView(UpdateResourceProgressView):
     """Alias for backward compatibility with existing frontend heartbeat if needed."""
     pass
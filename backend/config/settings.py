@@ -149,8 +149,12 @@ SIMPLE_JWT = {
 }
 
 # CORS Configuration
+from corsheaders.defaults import default_headers
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
+# Gzip backlog replays and explicit pulse idempotency keys
+CORS_ALLOW_HEADERS = (*default_headers, 'content-encoding', 'idempotency-key')
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -159,6 +163,75 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+# Cache
+# Version tokens and cross-worker locks (apps/analytics/shared_cache.py) need a
+# cache every worker shares. The LocMem default is per process, so with several
+# gunicorn workers set (as docker-compose.prod.yml does)
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://redis:6379/1
+# Dedupe claims and open-session lookups touch the cache on every pulse, so avoid
+# DatabaseCache there: each of those touches becomes SQL on the primary.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Telemetry Pipeline (apps/modules/telemetry.py)
+# Write-behind: coalesce heartbeat pulses in memory and flush in bulk
+TELEMETRY_WRITE_BEHIND = os.environ.get('TELEMETRY_WRITE_BEHIND', '0') == '1'
+TELEMETRY_BUFFER_BACKEND = os.environ.get('TELEMETRY_BUFFER_BACKEND', 'apps.modules.buffer.LocalPulseBuffer')
+TELEMETRY_BUFFER_MAX_KEYS = int(os.environ.get('TELEMETRY_BUFFER_MAX_KEYS', '500'))
+TELEMETRY_BUFFER_FLUSH_SECONDS = float(os.environ.get('TELEMETRY_BUFFER_FLUSH_SECONDS', '10'))
+# Event log: 'off', 'record' (append TelemetryEvent alongside direct writes) or
+# 'ingest' (insert-only; `manage.py rollup_telemetry` folds events into progress)
+TELEMETRY_EVENT_LOG = os.environ.get('TELEMETRY_EVENT_LOG', 'off')
+TELEMETRY_ROLLUP_LAG_SECONDS = float(os.environ.get('TELEMETRY_ROLLUP_LAG_SECONDS', '2'))
+# Idempotency: pulse keys remembered for dedupe (apps/modules/dedupe.py), across workers
+# with a shared CACHE_BACKEND, otherwise per worker (MAX_KEYS bounds that LRU)
+TELEMETRY_DEDUPE_TTL_SECONDS = float(os.environ.get('TELEMETRY_DEDUPE_TTL_SECONDS', '600'))
+TELEMETRY_DEDUPE_MAX_KEYS = int(os.environ.get('TELEMETRY_DEDUPE_MAX_KEYS', '200000'))
+# Admission control: hold pulses arriving faster than the heartbeat and cap credited focus
+TELEMETRY_ADMISSION = os.environ.get('TELEMETRY_ADMISSION', '0') == '1'
+TELEMETRY_ADMISSION_MIN_INTERVAL = float(os.environ.get('TELEMETRY_ADMISSION_MIN_INTERVAL', '10'))
+TELEMETRY_ADMISSION_SLACK = float(os.environ.get('TELEMETRY_ADMISSION_SLACK', '5'))
+TELEMETRY_ADMISSION_MAX_DELTA = int(os.environ.get('TELEMETRY_ADMISSION_MAX_DELTA', '300'))
+TELEMETRY_ADMISSION_MAX_KEYS = int(os.environ.get('TELEMETRY_ADMISSION_MAX_KEYS', '100000'))
+# Sharded counters: focus / watch-time increments spread over N rows, folded by `manage.py compact_counters`
+TELEMETRY_SHARDED_COUNTERS = os.environ.get('TELEMETRY_SHARDED_COUNTERS', '0') == '1'
+TELEMETRY_COUNTER_SHARDS = int(os.environ.get('TELEMETRY_COUNTER_SHARDS', '8'))
+# Sessions: 'inline' (write path credits the open session) or 'events' (built from the
+# event log by `manage.py sessionize_telemetry`; requires TELEMETRY_EVENT_LOG)
+TELEMETRY_SESSION_MODE = os.environ.get('TELEMETRY_SESSION_MODE', 'inline')
+TELEMETRY_SESSION_GAP_SECONDS = int(os.environ.get('TELEMETRY_SESSION_GAP_SECONDS', '300'))
+# Local append-only spool in front of the database: 'off', 'fallback' (only
+# when the database errors) or 'always' (see apps/modules/spool.py)
+TELEMETRY_SPOOL = os.environ.get('TELEMETRY_SPOOL', 'off')
+TELEMETRY_SPOOL_DIR = os.environ.get('TELEMETRY_SPOOL_DIR', str(BASE_DIR / 'var' / 'telemetry-spool'))
+TELEMETRY_SPOOL_FSYNC_SECONDS = float(os.environ.get('TELEMETRY_SPOOL_FSYNC_SECONDS', '0.2'))
+TELEMETRY_SPOOL_DRAIN_SECONDS = float(os.environ.get('TELEMETRY_SPOOL_DRAIN_SECONDS', '1'))
+TELEMETRY_SPOOL_SEGMENT_BYTES = int(os.environ.get('TELEMETRY_SPOOL_SEGMENT_BYTES', str(4 * 1024 * 1024)))
+
+# Manager Analytics (apps/analytics)
+# Engines read 7/14-day windows from LearnerDailyStats (`manage.py rollup_daily_stats`)
+LEARNER_DAILY_STATS = os.environ.get('LEARNER_DAILY_STATS', '0') == '1'
+# Intelligence overview served from LearnerIntelligenceSnapshot (`manage.py recompute_intelligence --loop`)
+INTELLIGENCE_SNAPSHOTS = os.environ.get('INTELLIGENCE_SNAPSHOTS', '0') == '1'
+# Stale-while-revalidate cache of manager endpoint payloads (apps/analytics/result_cache.py)
+MANAGER_ANALYTICS_CACHE = os.environ.get('MANAGER_ANALYTICS_CACHE', '0') == '1'
+# Per-endpoint TTL overrides in seconds, e.g. "team-summary=15,learners=120"
+MANAGER_ANALYTICS_CACHE_TTLS = {
+    endpoint: int(seconds)
+    for endpoint, seconds in (
+        item.split('=') for item in os.environ.get('MANAGER_ANALYTICS_CACHE_TTLS', '').split(',') if item
+    )
+}
+# How long past its TTL a payload may still be served while it refreshes
+MANAGER_ANALYTICS_CACHE_MAX_STALE = int(os.environ.get('MANAGER_ANALYTICS_CACHE_MAX_STALE', '300'))
+# Concurrent team snapshot / intelligence overview computations share one run (apps/analytics/singleflight.py);
+# across workers only with a shared CACHE_BACKEND, otherwise per worker
+ANALYTICS_SINGLE_FLIGHT = os.environ.get('ANALYTICS_SINGLE_FLIGHT', '0') == '1'
+
 # Observability / Logging
 LOGGING = {
     'version': 1,
@@ -36,6 +36,7 @@ const ModulePlayer = () => {
                 await Telemetry.track(id, activeResource.id, {
                     duration_delta: 15,
                     watch_time: watchTime,
+                    last_position: watchTime, // Marks [last_position - 15s, last_position) as watched
                     completed: activeResource.type === 'video' ? watchTime > 30 : true
                 });
 
@@ -50,6 +51,21 @@ const ModulePlayer = () => {
         return () => clearInterval(heartbeat);
     }, [activeResource, watchTime, id]);
 
+    // Final pulse on tab close: an in-flight axios call would be cancelled, a beacon is not
+    useEffect(() => {
+        if (!activeResource) return;
+
+        const flushOnHide = () => {
+            Telemetry.beacon(id, activeResource.id, {
+                watch_time: watchTime,
+                completed: activeResource.type === 'video' ? watchTime > 30 : true
+            });
+        };
+
+        window.addEventListener('pagehide', flushOnHide);
+        return () => window.removeEventListener('pagehide', flushOnHide);
+    }, [activeResource, watchTime, id]);
+
     // Simulated watch time increment
     useEffect(() => {
         if (!activeResource || activeResource.type !== 'video') return;
@@ -71,7 +71,8 @@ const ManagerIntelligenceDashboard = () => {
 
             const response = await api.get('/analytics/manager/intelligence-overview/');
             setData(response.data);
-            setLastUpdated(new Date());
+            // Precomputed snapshots can be older than this request
+            setLastUpdated(new Date(response.data.computed_at || Date.now()));
 
             console.log('[Intelligence] Data refreshed:', response.data);
         } catch (err) {
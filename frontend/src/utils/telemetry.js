@@ -4,25 +4,99 @@
  */
 import api from '../services/api';
 
+const BACKLOG_KEY = 'lms_pulse_backlog';
+const MAX_BACKLOG = 1000;
+
 class Telemetry {
     static async track(module_id, resource_id, data = {}) {
+        const pulse = {
+            ...data,
+            _trace: Date.now() // Idempotency key: a retried request resends the same value
+        };
         try {
-            const response = await api.post(`/modules/${module_id}/resources/${resource_id}/complete/`, {
-                ...data,
-                _trace: Date.now() // For debugging latency
-            });
+            const response = await api.post(`/modules/${module_id}/resources/${resource_id}/complete/`, pulse);
             console.debug(`[Telemetry] Pulse Synced: ${module_id}:${resource_id}`, response.data);
+            this.replayBacklog();
             return response.data;
         } catch (error) {
             console.error(`[Telemetry] Critical Analytic Failure: ${module_id}:${resource_id}`, error);
 
-            // In a production environment, we could store failed pulses 
-            // in local storage and retry on next successful heartbeat.
+            // Network / server failures are kept and replayed after the next successful pulse
+            if (!error.response || error.response.status >= 500) {
+                this._storeFailed({ module_id, resource_id, ...pulse, ts: pulse._trace });
+            }
             this._handleFailure(error);
             throw error; // Re-throw to allow component-level recovery
         }
     }
 
+    static _readBacklog() {
+        try {
+            return JSON.parse(localStorage.getItem(BACKLOG_KEY)) || [];
+        } catch {
+            return [];
+        }
+    }
+
+    static _storeFailed(pulse) {
+        const backlog = this._readBacklog();
+        backlog.push(pulse);
+        localStorage.setItem(BACKLOG_KEY, JSON.stringify(backlog.slice(-MAX_BACKLOG)));
+    }
+
+    /**
+     * Send every stored pulse in one gzip NDJSON request (/modules/pulses/replay/).
+     * Pulses keep their _trace, so a replay that is retried is not double-counted.
+     */
+    static async replayBacklog() {
+        const backlog = this._readBacklog();
+        if (!backlog.length || this._replaying) return;
+        this._replaying = true;
+
+        try {
+            const ndjson = backlog.map((pulse) => JSON.stringify(pulse)).join('\n') + '\n';
+            let body = ndjson;
+            const headers = { 'Content-Type': 'application/x-ndjson' };
+            if (typeof CompressionStream !== 'undefined') {
+                const stream = new Blob([ndjson]).stream().pipeThrough(new CompressionStream('gzip'));
+                body = await new Response(stream).blob();
+                headers['Content-Encoding'] = 'gzip';
+            }
+            await api.post('/modules/pulses/replay/', body, { headers });
+
+            // Keep anything that failed while the replay was in flight
+            const remaining = this._readBacklog().slice(backlog.length);
+            localStorage.setItem(BACKLOG_KEY, JSON.stringify(remaining));
+        } catch (error) {
+            console.warn('[Telemetry] Backlog replay deferred', error);
+        } finally {
+            this._replaying = false;
+        }
+    }
+
+    /**
+     * Fire-and-forget pulse for page unload, when an axios request would be cancelled.
+     * Uses the compact text/plain beacon format: token line, then
+     * module_id,resource_id,duration_delta,watch_time,last_position,completed,idempotency_key
+     */
+    static beacon(module_id, resource_id, data = {}) {
+        const token = localStorage.getItem('access_token');
+        if (!token || !navigator.sendBeacon) return false;
+
+        const field = (value) => (value === undefined || value === null ? '' : value);
+        const line = [
+            module_id,
+            resource_id,
+            field(data.duration_delta),
+            field(data.watch_time),
+            field(data.last_position),
+            data.completed ? 1 : 0,
+            Date.now()
+        ].join(',');
+        const body = new Blob([`${token}\n${line}\n`], { type: 'text/plain' });
+        return navigator.sendBeacon(`${api.defaults.baseURL}/modules/pulses/beacon/`, body);
+    }
+
     static _handleFailure(error) {
         if (error.response?.status === 401) {
             console.warn("[Telemetry] Pulse blocked by expired token. Data may be lost.");